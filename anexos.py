@@ -0,0 +1,259 @@
+# anexos.py
+"""
+Envio dos anexos das oportunidades (documento e conta de energia) ao Drive.
+
+O arquivo é gravado em disco em blocos e o SHA-256 é calculado na mesma
+passada. Um arquivo idêntico a um já enviado (a mesma conta reenviada
+para outra oportunidade do cliente, ou um reenvio depois de timeout)
+reaproveita o link existente em vez de subir de novo:
+
+  1. índice local hash -> id do arquivo no Drive (SQLite em cache/,
+     compartilhado pelos workers);
+  2. se não estiver no índice, consulta ao Drive pela appProperty 'sha256'
+     gravada em cada envio (desligável com DRIVE_DEDUP_CONSULTA=0).
+
+Entradas do índice confirmadas há mais de VALIDADE_CONFIRMACAO segundos
+são conferidas no Drive antes do uso (o arquivo pode ter sido excluído).
+
+Antes de ir ao Drive, cada anexo novo passa por otimizar() em um pool de
+processos: fotos são giradas conforme o EXIF, reduzidas a LADO_MAXIMO px,
+recomprimidas (JPEG ou WebP) e gravadas sem metadados; PDFs são
+recomprimidos pelo Ghostscript, quando instalado. O original é mantido
+quando a versão otimizada não fica menor (ou se a otimização falhar).
+O navegador já reduz as fotos antes do envio (static/js/script.js); o
+passo no servidor cobre navegadores antigos e arquivos fora do padrão.
+"""
+import os
+import time
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.utils import secure_filename
+
+import sheets
+
+PASTA_UPLOADS = "uploads"
+ARQUIVO_INDICE = os.environ.get(
+    "ANEXOS_INDICE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "anexos.sqlite3"),
+)
+CONSULTAR_DRIVE = os.environ.get("DRIVE_DEDUP_CONSULTA", "1") == "1"
+VALIDADE_CONFIRMACAO = 24 * 3600
+BLOCO = 1024 * 1024
+
+# Otimização: contas de energia continuam legíveis com 2000 px no lado maior
+LADO_MAXIMO = int(os.environ.get("ANEXOS_LADO_MAXIMO", "2000"))
+FORMATO_IMAGEM = os.environ.get("ANEXOS_FORMATO", "jpeg")  # "jpeg" ou "webp"
+QUALIDADE_IMAGEM = int(os.environ.get("ANEXOS_QUALIDADE", "80"))
+# Perfil do Ghostscript: /ebook = imagens a 150 dpi
+PERFIL_PDF = os.environ.get("ANEXOS_PERFIL_PDF", "/ebook")
+PROCESSOS = int(os.environ.get("ANEXOS_PROCESSOS", "2"))
+TIMEOUT_OTIMIZACAO = 60
+
+_local = threading.local()  # uma conexão SQLite por thread
+_pool = None
+
+
+# -----------------------------------------------------------------
+# Índice local hash -> arquivo no Drive
+# -----------------------------------------------------------------
+
+def _conexao():
+    conexao = getattr(_local, "conexao", None)
+    if conexao is None:
+        os.makedirs(os.path.dirname(ARQUIVO_INDICE), exist_ok=True)
+        conexao = sqlite3.connect(ARQUIVO_INDICE, timeout=5)
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute(
+            "CREATE TABLE IF NOT EXISTS arquivos ("
+            "sha256 TEXT, pasta TEXT, file_id TEXT, confirmado_em REAL, PRIMARY KEY (sha256, pasta))"
+        )
+        _local.conexao = conexao
+    return conexao
+
+
+def _buscar_indice(sha256, pasta_id):
+    linha = _conexao().execute(
+        "SELECT file_id, confirmado_em FROM arquivos WHERE sha256 = ? AND pasta = ?", (sha256, pasta_id or "")
+    ).fetchone()
+    return linha if linha else (None, 0)
+
+
+def _gravar_indice(sha256, pasta_id, file_id):
+    conexao = _conexao()
+    with conexao:
+        conexao.execute(
+            "INSERT OR REPLACE INTO arquivos (sha256, pasta, file_id, confirmado_em) VALUES (?, ?, ?, ?)",
+            (sha256, pasta_id or "", file_id, time.time()),
+        )
+
+
+# -----------------------------------------------------------------
+# Otimização (roda nos processos do pool)
+# -----------------------------------------------------------------
+
+def _otimizar_imagem(caminho, nome):
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    extensao = ".webp" if FORMATO_IMAGEM == "webp" else ".jpg"
+    destino = f"{caminho}-otimizado{extensao}"
+    try:
+        with Image.open(caminho) as original:
+            tinha_exif = bool(original.getexif())
+            # Aplica a rotação da câmera antes de descartar o EXIF
+            img = ImageOps.exif_transpose(original)
+            img.thumbnail((LADO_MAXIMO, LADO_MAXIMO), Image.LANCZOS)
+            if img.mode in ("RGBA", "LA", "P"):
+                # Sem transparência no JPEG: fundo branco, como no papel
+                img = img.convert("RGBA")
+                fundo = Image.new("RGB", img.size, "white")
+                fundo.paste(img, mask=img.getchannel("A"))
+                img = fundo
+            elif img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            if FORMATO_IMAGEM == "webp":
+                img.save(destino, "WEBP", quality=QUALIDADE_IMAGEM, method=4)
+            else:
+                img.save(destino, "JPEG", quality=QUALIDADE_IMAGEM, optimize=True, progressive=True)
+    except (UnidentifiedImageError, OSError, ValueError):
+        return caminho, nome
+
+    # Com EXIF (localização, aparelho) a versão limpa é usada mesmo se não for menor
+    if not tinha_exif and os.path.getsize(destino) >= os.path.getsize(caminho):
+        os.remove(destino)
+        return caminho, nome
+    return destino, os.path.splitext(nome)[0] + extensao
+
+
+def _otimizar_pdf(caminho, nome):
+    gs = shutil.which("gs")
+    if not gs:
+        return caminho, nome
+    destino = f"{caminho}-otimizado.pdf"
+    try:
+        subprocess.run(
+            [gs, "-sDEVICE=pdfwrite", "-dCompatibilityLevel=1.5", f"-dPDFSETTINGS={PERFIL_PDF}",
+             "-dNOPAUSE", "-dQUIET", "-dBATCH", f"-sOutputFile={destino}", caminho],
+            check=True, timeout=TIMEOUT_OTIMIZACAO, capture_output=True,
+        )
+    except (OSError, subprocess.SubprocessError):
+        if os.path.exists(destino):
+            os.remove(destino)
+        return caminho, nome
+    if os.path.getsize(destino) >= os.path.getsize(caminho):
+        os.remove(destino)
+        return caminho, nome
+    return destino, nome
+
+
+def otimizar(caminho, nome):
+    """
+    Versão menor do anexo. Retorna (caminho, nome) do arquivo a enviar, que
+    é o próprio original quando não há ganho.
+    """
+    if os.path.splitext(nome)[1].lower() == ".pdf":
+        return _otimizar_pdf(caminho, nome)
+    return _otimizar_imagem(caminho, nome)
+
+
+def _pool_otimizacao():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PROCESSOS)
+    return _pool
+
+
+# -----------------------------------------------------------------
+# Envio
+# -----------------------------------------------------------------
+
+def salvar(arquivo, caminho):
+    """Grava o upload (FileStorage) em 'caminho' em blocos. Retorna o SHA-256 do conteúdo."""
+    sha256 = hashlib.sha256()
+    with open(caminho, "wb") as destino:
+        while True:
+            bloco = arquivo.stream.read(BLOCO)
+            if not bloco:
+                break
+            sha256.update(bloco)
+            destino.write(bloco)
+    return sha256.hexdigest()
+
+
+def ja_enviado(sha256, pasta_id=None):
+    """Id do arquivo idêntico já presente no Drive, ou None."""
+    try:
+        file_id, confirmado_em = _buscar_indice(sha256, pasta_id)
+    except sqlite3.Error as e:
+        print(f"Erro ao ler índice de anexos: {e}")
+        file_id, confirmado_em = None, 0
+
+    if file_id and time.time() - confirmado_em < VALIDADE_CONFIRMACAO:
+        return file_id
+    if file_id and not sheets.arquivo_drive_existe(file_id):
+        file_id = None
+    if file_id is None and CONSULTAR_DRIVE:
+        file_id = sheets.buscar_arquivo_drive("sha256", sha256, pasta_id)
+    if file_id is None:
+        return None
+
+    try:
+        _gravar_indice(sha256, pasta_id, file_id)
+    except sqlite3.Error as e:
+        print(f"Erro ao gravar índice de anexos: {e}")
+    return file_id
+
+
+def enviar_todos(arquivos, pasta_id=None):
+    """
+    Envia os uploads ao Drive (ou reaproveita arquivos idênticos) e retorna
+    os links de visualização, na mesma ordem ("" para campos sem arquivo).
+    Os anexos novos são otimizados em paralelo no pool.
+    """
+    os.makedirs(PASTA_UPLOADS, exist_ok=True)
+    temporarios = []
+    links = [""] * len(arquivos)
+    try:
+        novos = []  # (posição, caminho, nome, sha256)
+        for posicao, arquivo in enumerate(arquivos):
+            if not arquivo or not arquivo.filename:
+                continue
+            filename = secure_filename(arquivo.filename)
+            # Prefixo único: dois envios simultâneos com o mesmo nome não se sobrescrevem
+            caminho_local = os.path.join(PASTA_UPLOADS, f"{uuid.uuid4().hex}-{filename}")
+            temporarios.append(caminho_local)
+            # O hash é o do arquivo recebido: um reenvio é reconhecido sem otimizar de novo
+            sha256 = salvar(arquivo, caminho_local)
+            file_id = ja_enviado(sha256, pasta_id)
+            if file_id:
+                links[posicao] = sheets.link_arquivo_drive(file_id)
+            else:
+                novos.append((posicao, caminho_local, filename, sha256))
+
+        futuros = [_pool_otimizacao().submit(otimizar, caminho, nome) for _, caminho, nome, _ in novos]
+        for (posicao, caminho, nome, sha256), futuro in zip(novos, futuros):
+            try:
+                caminho, nome = futuro.result(timeout=TIMEOUT_OTIMIZACAO)
+                temporarios.append(caminho)
+            except Exception as e:
+                print(f"Erro ao otimizar anexo ({nome}): {e}")
+            file_id = sheets.criar_arquivo_drive(caminho, nome, pasta_id, propriedades={"sha256": sha256})
+            try:
+                _gravar_indice(sha256, pasta_id, file_id)
+            except sqlite3.Error as e:
+                print(f"Erro ao gravar índice de anexos: {e}")
+            links[posicao] = sheets.link_arquivo_drive(file_id)
+        return links
+    finally:
+        for caminho in set(temporarios):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+
+def enviar(arquivo, pasta_id=None):
+    """Envia um upload (ver enviar_todos) e retorna o link de visualização."""
+    return enviar_todos([arquivo], pasta_id)[0]
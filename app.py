@@ -1,11 +1,25 @@
 import os
+import uuid
+import hashlib
 from datetime import datetime, timezone, timedelta
 from functools import wraps  # Importado para o decorator
 
 import permissoes
 import auth
+import senhas
 import sheets
-from flask import (Flask, render_template, request, redirect, url_for, session, send_file)
+import painel
+import assets
+import imagens
+import propostas
+import importacao
+import exportacao
+import anexos
+import cep as cep_local
+import financiamento
+import dimensionamento
+from flask import (Flask, render_template, request, redirect, url_for, session, send_file, make_response,
+                   send_from_directory, Response, stream_with_context, stream_template, jsonify)
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
@@ -13,6 +27,8 @@ from flask_limiter.util import get_remote_address
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "nada ainda")
+# Desligado só no teste de carga (carga.py), em que todos os logins vêm do mesmo IP
+app.config["RATELIMIT_ENABLED"] = os.environ.get("RATELIMIT_ENABLED", "1") == "1"
 
 limiter = Limiter(
     get_remote_address,
@@ -129,10 +145,102 @@ def tem_permissao(acao):
     nivel = session.get("acesso")
     return permissoes.verificar_permissao(nivel, acao)
 
+def permissao_required(acao):
+    """
+    Decorator para rotas que exigem uma ação da matriz de permissões.
+    Deve ser usado depois de @login_required.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not tem_permissao(acao):
+                return "Acesso negado.", 403
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
 @app.context_processor
 def inject_permissions():
     return dict(tem_permissao=tem_permissao)
 
+@app.context_processor
+def inject_assets():
+    return dict(
+        asset=assets.url,
+        asset_existe=assets.existe,
+        imagem_variantes=imagens.variantes,
+        imagem_srcset=imagens.srcset,
+        imagem_maior=imagens.maior,
+        imagem_menor=imagens.menor,
+        imagem_formatos=imagens.FORMATOS_MODERNOS,
+    )
+
+@app.route("/assets/<string:versao>/<path:filename>")
+def asset_versionado(versao, filename):
+    """Serve arquivos de static/ em endereço com hash, com cache imutável de longo prazo."""
+    if versao != assets.hash_arquivo(filename):
+        # Hash de um deploy anterior: aponta para a versão atual (sem cache longo)
+        return redirect(assets.url(filename))
+    resposta = send_from_directory(assets.PASTA_STATIC, filename)
+    resposta.headers["Cache-Control"] = assets.CACHE_IMUTAVEL
+    return resposta
+
+# -----------------------------------------------------------------
+# Unidade de trabalho (leituras memoizadas e escritas no fim da requisição)
+# -----------------------------------------------------------------
+
+@app.after_request
+def confirmar_escritas(resposta):
+    """Grava em lote as escritas da requisição; descarta se a rota falhou."""
+    if resposta.status_code >= 500:
+        sheets.descartar_unidade()
+        return resposta
+    if not sheets.confirmar_unidade():
+        return make_response("Erro ao gravar os dados na planilha. Tente novamente.", 500)
+    return resposta
+
+@app.teardown_request
+def descartar_escritas(erro=None):
+    # Exceção não tratada: nada do que a rota enfileirou é gravado
+    sheets.descartar_unidade()
+
+# -----------------------------------------------------------------
+# Cache HTTP condicional (ETag / 304)
+# -----------------------------------------------------------------
+
+def gerar_etag(*abas):
+    """
+    Validador da página atual: usuário logado + nível de acesso + URL completa
+    + versão das abas que alimentam a página + build. Não faz leitura das abas.
+    """
+    base = "|".join([
+        assets.versao_build(),
+        str(session.get("usuario_id")),
+        str(session.get("acesso")),
+        request.full_path,
+        sheets.versao_dados(*abas),
+    ])
+    return hashlib.sha1(base.encode()).hexdigest()
+
+def aplicar_cache_privado(resposta, etag=None):
+    """Resposta só pode ser guardada pelo navegador do usuário e sempre revalidada."""
+    if etag:
+        resposta.set_etag(etag, weak=True)
+    resposta.headers["Cache-Control"] = "private, no-cache"
+    resposta.vary.add("Cookie")
+    return resposta
+
+def aplicar_streaming(resposta):
+    """Pede ao proxy que repasse cada pedaço da página assim que ele é gerado."""
+    resposta.headers["X-Accel-Buffering"] = "no"
+    return resposta
+
+def resposta_nao_modificada(etag):
+    """Retorna um 304 se o navegador já tem esta versão da página, senão None."""
+    if request.if_none_match.contains_weak(etag):
+        return aplicar_cache_privado(make_response("", 304), etag)
+    return None
+
 # -----------------------------------------------------------------
 # Rotas de Autenticação e Usuário
 # -----------------------------------------------------------------
@@ -159,14 +267,22 @@ def cadastro():
                 tipo="erro"
             )
 
-        sucesso = auth.cadastrar_usuario(
-            email=email,
-            senha=senha,
-            nome=nome,
-            sobrenome=sobrenome,
-            cidade=cidade,
-            telefone=telefone
-        )
+        try:
+            sucesso = auth.cadastrar_usuario(
+                email=email,
+                senha=senha,
+                nome=nome,
+                sobrenome=sobrenome,
+                cidade=cidade,
+                telefone=telefone
+            )
+        except senhas.Sobrecarga as e:
+            app.logger.warning("Cadastro recusado por sobrecarga: %s", e)
+            return render_template(
+                "cadastro.html",
+                mensagem="Servidor ocupado. Tente novamente em instantes.",
+                tipo="erro"
+            ), 503
 
         if sucesso:
             return render_template(
@@ -196,7 +312,12 @@ def login_submit():
     email = request.form.get("email")
     senha = request.form.get("senha")
 
-    usuario = auth.validar_login(email, senha)
+    try:
+        usuario = auth.validar_login(email, senha)
+    except senhas.Sobrecarga as e:
+        # Fila de hashes cheia: responde na hora em vez de prender o worker
+        app.logger.warning("Login recusado por sobrecarga: %s", e)
+        return render_template("login.html", mensagem="Servidor ocupado. Tente novamente em instantes.", tipo="erro"), 503
 
     # Debug: log detalhado no servidor (ver saída do console/render)
     app.logger.debug("Login attempt for email=%s -> usuario=%r", email, usuario)
@@ -261,7 +382,17 @@ def perfil():
 def home():
     # O decorator @login_required já garante que "usuario_id" existe
     usuario_id = session.get("usuario_id") 
-    return render_template("index.html", usuario_id=usuario_id , active_page='inicio')
+
+    # Painel do funil: agregados prontos, sem varrer a aba de oportunidades
+    meu_painel = painel_geral = None
+    dados_painel = sheets.painel_oportunidades()
+    if dados_painel is not None:
+        meu_painel = painel.resumo(dados_painel, usuario_id)
+        if tem_permissao("gerenciar_usuarios"):
+            painel_geral = painel.resumo(dados_painel)
+
+    return render_template("index.html", usuario_id=usuario_id, meu_painel=meu_painel,
+                           painel_geral=painel_geral, active_page='inicio')
 
 # -----------------------------------------------------------------
 # Rotas de Clientes
@@ -301,17 +432,203 @@ def cadastrar_cliente():
         return render_template("cadastrarCliente.html", mensagem="Erro ao cadastrar!", tipo="erro", active_page='cadastro_cliente')
 
 
+@app.route("/clientes/importar")
+@login_required
+@permissao_required("gerenciar_usuarios")
+def importar_clientes():
+    usuarios = [
+        {"id": u.get("id"), "nome": f"{u.get('nome', '')} {u.get('sobrenome', '')}".strip(), "email": u.get("email")}
+        for u in sheets.listar_usuarios()
+    ]
+    return render_template("importarClientes.html", lote_id=uuid.uuid4().hex, usuarios=usuarios,
+                           active_page='cadastro_cliente')
+
+@app.route("/clientes/importar", methods=["POST"])
+@login_required
+@permissao_required("gerenciar_usuarios")
+def enviar_importacao_clientes():
+    """
+    Recebe o CSV/XLSX e dispara a importação em segundo plano; o andamento é
+    consultado em /clientes/importar/<lote_id>/progresso.
+    """
+    arquivo = request.files.get("arquivo")
+    if not arquivo or not arquivo.filename:
+        return jsonify({"erro": "Nenhum arquivo enviado."}), 400
+    extensao = os.path.splitext(arquivo.filename)[1].lower()
+    if extensao not in importacao.EXTENSOES:
+        return jsonify({"erro": "Envie um arquivo .csv ou .xlsx."}), 400
+
+    lote_id = request.form.get("lote_id") or uuid.uuid4().hex
+    proprietario = request.form.get("proprietario") or session["usuario_id"]
+    if proprietario != session["usuario_id"] and not sheets.listar_user_por_id(proprietario):
+        # Um id digitado errado geraria milhares de clientes sem dono
+        return jsonify({"erro": "Vendedor não encontrado."}), 400
+    # O upload vai direto para o disco (não fica inteiro em memória)
+    caminho = importacao.caminho_upload(lote_id, extensao)
+    arquivo.save(caminho)
+
+    datacad = (datetime.now(timezone.utc) - timedelta(hours=3)).strftime("%Y-%m-%d %H:%M:%S")
+    importacao.iniciar(caminho, proprietario, lote_id, datacad)
+    return jsonify({"lote_id": lote_id}), 202
+
+@app.route("/clientes/importar/<string:lote_id>/progresso")
+@login_required
+@permissao_required("gerenciar_usuarios")
+def progresso_importacao_clientes(lote_id):
+    progresso = importacao.ler_progresso(lote_id)
+    if progresso is None:
+        return jsonify({"total": 0, "lidas": 0, "finalizado": False}), 404
+    return jsonify(progresso)
+
+@app.route("/api/cep/<string:cep>")
+@login_required
+@limiter.limit("60 per minute")
+def api_cep(cep):
+    """Endereço do CEP (mesmos campos da ViaCEP), com cache local (ver cep.py)."""
+    numero = cep_local.normalizar(cep)
+    if not numero:
+        return jsonify({"erro": True, "mensagem": "Informe um CEP válido (8 dígitos)."}), 400
+    try:
+        endereco = cep_local.consultar(numero)
+    except cep_local.ErroResolvedor as e:
+        app.logger.warning("Falha ao consultar CEP %s: %s", numero, e)
+        return jsonify({"erro": True, "mensagem": "Erro ao consultar CEP. Tente novamente."}), 503
+    if not endereco:
+        return jsonify({"erro": True, "mensagem": "CEP não encontrado."}), 404
+
+    resposta = jsonify(endereco)
+    # Endereço de um CEP praticamente não muda: o navegador pode reaproveitar por um dia
+    resposta.headers["Cache-Control"] = "private, max-age=86400"
+    return resposta
+
+def _lista_numeros(nome, tipo=float):
+    """Parâmetro '12,24,36' -> [12, 24, 36] (None se ausente)."""
+    texto = request.args.get(nome)
+    if not texto:
+        return None
+    return [tipo(v) for v in texto.split(",") if v.strip()]
+
+@app.route("/api/financiamento")
+@login_required
+@limiter.limit("120 per minute")
+def api_financiamento():
+    """
+    Grade de cenários de financiamento (ver financiamento.simular).
+    Parâmetros: valor, sistema (price|sac) e, opcionais, prazos/taxas/entradas
+    separados por vírgula. Sem eles, usa as condições padrão da empresa.
+    """
+    try:
+        grade = financiamento.simular(
+            request.args.get("valor", type=float),
+            prazos=_lista_numeros("prazos", int),
+            taxas=_lista_numeros("taxas"),
+            entradas=_lista_numeros("entradas"),
+            sistema=request.args.get("sistema", "price"),
+        )
+    except ValueError as e:
+        mensagem = str(e) if isinstance(e, financiamento.ErroSimulacao) else "Parâmetros inválidos."
+        return jsonify({"erro": True, "mensagem": mensagem}), 400
+    resposta = jsonify(grade)
+    # A grade só depende dos parâmetros: o simulador reaproveita ao voltar a um produto
+    resposta.headers["Cache-Control"] = "private, max-age=3600"
+    return resposta
+
+@app.route("/api/dimensionamento")
+@login_required
+@limiter.limit("60 per minute")
+def api_dimensionamento():
+    """
+    kWp necessário e produtos do catálogo que melhor atendem (ver dimensionamento.py).
+    Parâmetros: consumos (kWh por mês, separados por vírgula), estado, municipio e,
+    opcionais, ligacao (mono|bi|tri), area (m² disponíveis) e limite.
+    """
+    try:
+        resultado = dimensionamento.classificar(
+            _lista_numeros("consumos") or [],
+            request.args.get("estado", ""),
+            municipio=request.args.get("municipio"),
+            ligacao=request.args.get("ligacao", "bi"),
+            area_disponivel=request.args.get("area", type=float),
+            limite=max(1, min(request.args.get("limite", dimensionamento.LIMITE_PADRAO, type=int), 50)),
+        )
+    except ValueError as e:
+        mensagem = str(e) if isinstance(e, dimensionamento.ErroDimensionamento) else "Parâmetros inválidos."
+        return jsonify({"erro": True, "mensagem": mensagem}), 400
+    except Exception as e:
+        app.logger.warning("Falha no dimensionamento: %s", e)
+        return jsonify({"erro": True, "mensagem": "Erro ao ler o catálogo de produtos."}), 503
+    return jsonify(resultado)
+
+def cenario_escolhido(valor):
+    """
+    Cenário de financiamento enviado pelo simulador (campos fin_*), recalculado
+    no servidor sobre o preço do produto (texto da planilha, ex.: "28.000,00").
+    None se não houver escolha válida (ver financiamento.cenario_do_formulario).
+    """
+    return financiamento.cenario_do_formulario(sheets.converter_numero(valor), request.form)
+
+LIMITE_CLIENTES = 20
+
 @app.route("/meus_clientes")
 @login_required
 def meus_clientes():
     owner_id = session["usuario_id"]
-    clientes = sheets.listar_clientes_por_owner(owner_id)
+
+    # Com mensagem pendente a página é única; não usa validador
+    etag = None
+    if "mensagem" not in session:
+        etag = gerar_etag("clientes")
+        nao_modificada = resposta_nao_modificada(etag)
+        if nao_modificada:
+            return nao_modificada
+
+    # Paginação por cursor: 'apos' é a linha do último cliente já exibido
+    apos = request.args.get("apos", 1, type=int)
+
+    # Rolagem infinita: devolve só os cartões da próxima fatia
+    if request.args.get("parcial") == "1":
+        clientes, proximo_cursor = sheets.listar_clientes_por_owner_cursor(owner_id, apos_linha=apos, limite=LIMITE_CLIENTES)
+        if clientes is None:
+            # Falha na leitura: o cliente mantém o cursor e tenta de novo
+            resposta = make_response("Erro ao carregar clientes.", 503)
+            resposta.headers["Cache-Control"] = "no-store"
+            return resposta
+        resposta = make_response(render_template("cartoesClientes.html", clientes=clientes))
+        resposta.headers["X-Proximo-Cursor"] = proximo_cursor or ""
+        return aplicar_cache_privado(resposta, etag)
 
     # Recupera mensagem da sessão, se existir
     mensagem = session.pop("mensagem", None)
     tipo = session.pop("tipo_mensagem", None)
 
-    return render_template("meusClientes.html", clientes=clientes, mensagem=mensagem, tipo=tipo , active_page='meus_clientes')
+    # A página é enviada em streaming: o topo sai na hora e os cartões à
+    # medida que a planilha responde (a leitura só começa no template)
+    clientes = sheets.pagina_clientes_por_owner(owner_id, apos_linha=apos, limite=LIMITE_CLIENTES)
+    resposta = Response(stream_template("meusClientes.html", clientes=clientes,
+                                        mensagem=mensagem, tipo=tipo , active_page='meus_clientes'))
+    return aplicar_streaming(aplicar_cache_privado(resposta, etag))
+
+
+@app.route("/api/clientes/busca")
+@login_required
+def api_buscar_clientes():
+    consulta = request.args.get("q", "").strip()
+    if not consulta:
+        return jsonify([])
+    clientes = sheets.buscar_clientes(session["usuario_id"], consulta)
+    return jsonify([
+        {
+            "id": c.get("id"),
+            "codigo": c.get("codigo"),
+            "nome": c.get("nome"),
+            "email": c.get("email"),
+            "cpf": br_cpf(c.get("cpf")),
+            "telefone": br_phone(c.get("telefone")),
+            "municipio": c.get("municipio"),
+            "estado": c.get("estado"),
+        }
+        for c in clientes
+    ])
 
 
 # -----------------------------------------------------------------
@@ -325,21 +642,27 @@ def minhas_opp():
     pagina = int(request.args.get("pagina", 1))
     limite = 10
 
-    oportunidades = sheets.listar_opp_por_owner_paginado(proprietario, pagina=pagina, limite=limite)
-    tem_proxima = len(oportunidades) == limite
+    # A querystring (página, mensagem) já faz parte do validador
+    etag = gerar_etag("oportunidades")
+    nao_modificada = resposta_nao_modificada(etag)
+    if nao_modificada:
+        return nao_modificada
+
+    # Lida só durante o streaming do template (ver meus_clientes)
+    oportunidades = sheets.pagina_opp_por_owner(proprietario, pagina=pagina, limite=limite)
 
     mensagem = request.args.get("mensagem")
     tipo = request.args.get("tipo")
 
-    return render_template(
+    resposta = Response(stream_template(
         "minhasOportunidades.html",
         oportunidades=oportunidades,
         pagina_atual=pagina,
-        tem_proxima=tem_proxima,
         mensagem=mensagem,
         tipo=tipo,
         active_page='minhas_opp'
-    )
+    ))
+    return aplicar_streaming(aplicar_cache_privado(resposta, etag))
 
 @app.route("/iniciar_fluxo_oportunidade")
 @login_required
@@ -385,13 +708,27 @@ def iniciar_fluxo_oportunidade():
 
     return redirect(url_for("nova_oportunidade"))
 
+# Falha ao ler a planilha: não é "não encontrado" nem "sem produtos"
+ERRO_LEITURA = ("Erro ao ler a planilha. Tente novamente em instantes.", 503)
+
 @app.route("/nova_oportunidade")
 @login_required
 def nova_oportunidade():
     id_opp = session.get("opp_id")
     veio_continuar = session.get("opp_continuar") == "1"
 
-    produtos = sheets.listar_produtos()
+    cliente_id_selecionado = session.get("opp_cliente_id")
+
+    # Produtos, oportunidade e cliente lidos juntos (uma ida ao Google por rodada)
+    plano = sheets.PlanoLeitura()
+    pedido_produtos = plano.tabela("produtos")
+    pedido_opp = plano.registro("oportunidades", id_opp) if veio_continuar and id_opp else None
+    pedido_cliente = plano.registro("clientes", cliente_id_selecionado) if cliente_id_selecionado else None
+    if not plano.executar():
+        # Sem a leitura, o formulário sairia sem produtos
+        return ERRO_LEITURA
+
+    produtos = pedido_produtos.valor or []
     categorias = [
         {"potencia": p.get("potencia"), "preco": p.get("preco")}
         for p in produtos if p.get("potencia")
@@ -400,9 +737,9 @@ def nova_oportunidade():
     categorias = [dict(t) for t in {tuple(d.items()) for d in categorias}]
 
     oportunidade_existente = None
-    if veio_continuar and id_opp:
-        oportunidade_existente = sheets.buscar_oportunidade_por_id(id_opp)
-        
+    if pedido_opp and pedido_opp.valor:
+        oportunidade_existente = sheets.normalizar_oportunidade(pedido_opp.valor)
+
         # Validação de segurança
         if oportunidade_existente and oportunidade_existente.get("proprietario") != session["usuario_id"]:
             session.pop("opp_id", None)
@@ -414,17 +751,11 @@ def nova_oportunidade():
     email = oportunidade_existente.get("email") if oportunidade_existente else session.get("opp_email")
 
     # Se houve seleção explícita de cliente no fluxo, buscar para exibir
-    cliente_selecionado = None
-    cliente_id_selecionado = session.get("opp_cliente_id")
-    if cliente_id_selecionado:
-        try:
-            cliente_selecionado = sheets.buscar_cliente_por_id(cliente_id_selecionado)
-            # Preferir os dados do cliente para preencher o formulário
-            if cliente_selecionado:
-                nome = cliente_selecionado.get("nome") or nome
-                email = cliente_selecionado.get("email") or email
-        except Exception:
-            app.logger.debug("Erro buscando cliente selecionado em nova_oportunidade: %s", cliente_id_selecionado)
+    cliente_selecionado = pedido_cliente.valor if pedido_cliente else None
+    if cliente_selecionado:
+        # Preferir os dados do cliente para preencher o formulário
+        nome = cliente_selecionado.get("nome") or nome
+        email = cliente_selecionado.get("email") or email
 
     return render_template(
         "novaOportunidade.html",
@@ -466,32 +797,10 @@ def cadastrar_oportunidade():
     arquivo_principal = request.files.get("arquivo")
     arquivo_conta = request.files.get("conta_energia")
 
-    link_principal = ""
-    link_conta = ""
-
-    # Upload do documento principal
-    if arquivo_principal and arquivo_principal.filename:
-        from werkzeug.utils import secure_filename
-        filename = secure_filename(arquivo_principal.filename)
-        caminho_local = os.path.join("uploads", filename)
-        os.makedirs("uploads", exist_ok=True)
-        arquivo_principal.save(caminho_local)
-
-        pasta_id = os.environ.get("GOOGLE_DRIVE_PASTA_ID")
-        link_principal = sheets.enviar_arquivo_drive(caminho_local, filename, pasta_id)
-        os.remove(caminho_local)
-
-    # Upload do comprovante de energia
-    if arquivo_conta and arquivo_conta.filename:
-        from werkzeug.utils import secure_filename
-        filename_conta = secure_filename(arquivo_conta.filename)
-        caminho_local_conta = os.path.join("uploads", filename_conta)
-        os.makedirs("uploads", exist_ok=True)
-        arquivo_conta.save(caminho_local_conta)
-
-        pasta_id = os.environ.get("GOOGLE_DRIVE_PASTA_ID")
-        link_conta = sheets.enviar_arquivo_drive(caminho_local_conta, filename_conta, pasta_id)
-        os.remove(caminho_local_conta)
+    # Documento principal e comprovante de energia: otimizados em paralelo;
+    # arquivos idênticos a um já enviado reaproveitam o link (ver anexos.py)
+    pasta_id = os.environ.get("GOOGLE_DRIVE_PASTA_ID")
+    link_principal, link_conta = anexos.enviar_todos([arquivo_principal, arquivo_conta], pasta_id)
 
     # -------------------------------
     # Processamento
@@ -530,10 +839,21 @@ def cadastrar_oportunidade():
         # Modo "novo"
         # -------------------------------
         potencia = request.form.get("potenciaReal")
+        cliente_id_selecionado = session.get("opp_cliente_id")
+
+        # Produtos e (sem cliente selecionado) clientes em uma única leitura
+        plano = sheets.PlanoLeitura()
+        pedido_produtos = plano.tabela("produtos")
+        pedido_clientes = None if cliente_id_selecionado else plano.tabela("clientes")
+        if not plano.executar():
+            # Sem produtos e clientes a oportunidade seria gravada incompleta: não grava
+            # nada e mantém o fluxo na sessão para o vendedor tentar de novo
+            return redirect(url_for("minhas_opp", tipo="erro",
+                                    mensagem="Erro ao ler a planilha; a oportunidade não foi salva. Tente novamente."))
 
         # Busca o produto correspondente à potência
         produto = None
-        for p in sheets.listar_produtos():
+        for p in pedido_produtos.valor or []:
             if str(p.get("potencia")) == str(potencia):
                 produto = p
                 break
@@ -552,12 +872,13 @@ def cadastrar_oportunidade():
         }
 
         # Prioriza cliente selecionado explicitamente no fluxo (armazenado na sessão)
-        cliente_id_selecionado = session.get("opp_cliente_id")
         if cliente_id_selecionado:
             dados_nova_oportunidade["cliente_id"] = cliente_id_selecionado
         else:
             # Fallback: busca o cliente pelo email + proprietário (compatibilidade retroativa)
-            cliente_info = sheets.buscar_cliente_por_email_e_proprietario(email, session["usuario_id"])
+            cliente_info = sheets.buscar_cliente_por_email_e_proprietario(
+                email, session["usuario_id"], clientes=pedido_clientes.valor
+            )
             if cliente_info:
                 dados_nova_oportunidade["cliente_id"] = cliente_info.get("id", "")
 
@@ -576,6 +897,17 @@ def cadastrar_oportunidade():
                 "valorParcela": produto.get("valorParcela"),
                 "valorJuros": produto.get("valorJuros"),
             })
+            # Cenário escolhido no simulador, sobre o preço do produto
+            cenario = cenario_escolhido(produto.get("preco"))
+            if cenario:
+                dados_nova_oportunidade.update({
+                    "finSistema": cenario["sistema"],
+                    "finPrazo": cenario["prazo"],
+                    "finTaxa": cenario["taxa"],
+                    "finEntrada": cenario["entrada"],
+                    "finParcela": cenario["parcela"],
+                    "finTotal": cenario["total"],
+                })
 
         sheets.salvar_oportunidade(dados_nova_oportunidade)
         msg = "Cadastro realizado com sucesso!"
@@ -596,40 +928,198 @@ def cadastrar_oportunidade():
 
     # --- Preview da proposota ---
 
+def ler_oportunidade_e_cliente(oportunidade_id):
+    """
+    Oportunidade e seu cliente em um único plano de leitura: (None, None) se
+    a oportunidade não existe, None se a leitura falhou.
+    """
+    plano = sheets.PlanoLeitura()
+    pedido_opp = plano.registro("oportunidades", oportunidade_id)
+    pedido_cliente = plano.registro("clientes", origem=pedido_opp, campo="cliente_id")
+    if not plano.executar():
+        return None
+    if not pedido_opp.valor:
+        return None, None
+    return sheets.normalizar_oportunidade(pedido_opp.valor), pedido_cliente.valor
+
 @app.route('/proposta/preview/<string:oportunidade_id>')
 @login_required
 def preview_proposta(oportunidade_id):
-    oportunidade = sheets.buscar_oportunidade_por_id(oportunidade_id)
+    etag = gerar_etag("oportunidades", "clientes")
+    nao_modificada = resposta_nao_modificada(etag)
+    if nao_modificada:
+        return nao_modificada
+
+    lidos = ler_oportunidade_e_cliente(oportunidade_id)
+    if lidos is None:
+        return ERRO_LEITURA
+    oportunidade, cliente = lidos
 
     imprimir_agora = request.args.get('imprimir') == '1'
 
     if not oportunidade:
         return "Oportunidade não encontrada.", 404
 
-    cliente = None
-    cliente_id = oportunidade.get("cliente_id")
-    if cliente_id:
-        cliente = sheets.buscar_cliente_por_id(cliente_id)
-
-    return render_template('propostaPreview.html', 
+    resposta = make_response(render_template('propostaPreview.html', 
                            oportunidade=oportunidade,
                            cliente=cliente,
                            imprimir_agora=imprimir_agora,
                            #debug = False
-                           )
+                           ))
+    return aplicar_cache_privado(resposta, etag)
 
 @app.route('/proposta/pdf/<string:oportunidade_id>')
+@login_required
 def gerar_pdf_proposta(oportunidade_id):
-
-    oportunidade = sheets.buscar_oportunidade_por_id(oportunidade_id)
+    # Sem o wkhtmltopdf instalado, mantém o fluxo antigo: preview + impressão no navegador
+    if not propostas.disponivel():
+        return redirect(url_for('preview_proposta', oportunidade_id=oportunidade_id, imprimir=1))
+
+    lidos = ler_oportunidade_e_cliente(oportunidade_id)
+    if lidos is None:
+        return ERRO_LEITURA
+    oportunidade, cliente = lidos
     if not oportunidade:
         return "Oportunidade não encontrada.", 404
 
-    html = render_template('propostaPreview.html', oportunidade=oportunidade)
+    # Só gera de novo se a linha da oportunidade ou do cliente mudou
+    versao = propostas.versao_proposta(oportunidade, cliente)
+    caminho = propostas.buscar_em_cache(oportunidade_id, versao)
+    if not caminho:
+        with assets.enderecos_locais():
+            html = render_template('propostaPreview.html',
+                                   oportunidade=oportunidade,
+                                   cliente=cliente,
+                                   gerando_pdf=True)
+        try:
+            caminho = propostas.gerar_pdf(oportunidade_id, versao, html)
+        except Exception as e:
+            app.logger.error("Falha ao gerar PDF da oportunidade %s: %s", oportunidade_id, e)
+            return redirect(url_for('preview_proposta', oportunidade_id=oportunidade_id, imprimir=1))
+
+    nome = f"proposta-{oportunidade.get('codigo') or oportunidade_id}.pdf"
+    resposta = send_file(caminho, mimetype="application/pdf", download_name=nome, etag=versao)
+    return aplicar_cache_privado(resposta)
+
+# -----------------------------------------------------------------
+# Relatórios (exportação)
+# -----------------------------------------------------------------
+
+@app.route('/relatorios')
+@login_required
+@permissao_required("gerenciar_usuarios")
+def relatorios():
+    usuarios = [
+        {"id": u.get("id"), "nome": f"{u.get('nome', '')} {u.get('sobrenome', '')}".strip(), "email": u.get("email")}
+        for u in sheets.listar_usuarios()
+    ]
+    return render_template('relatorios.html', usuarios=usuarios, active_page='relatorios')
+
+@app.route('/relatorios/exportar')
+@login_required
+@permissao_required("gerenciar_usuarios")
+def exportar_relatorio():
+    """
+    Exporta clientes ou oportunidades em CSV/XLSX, com filtros por
+    proprietário, estado e período de cadastro (de/ate em AAAA-MM-DD).
+    """
+    tabela = request.args.get("tabela", "oportunidades")
+    formato = request.args.get("formato", "csv")
+    if tabela not in exportacao.TABELAS or formato not in exportacao.FORMATOS:
+        return "Relatório inválido.", 400
+
+    filtros = {
+        "proprietario": request.args.get("proprietario") or None,
+        "estado": request.args.get("estado") or None,
+    }
+    try:
+        for campo in ("de", "ate"):
+            valor = request.args.get(campo)
+            filtros[campo] = datetime.strptime(valor, "%Y-%m-%d").date() if valor else None
+    except ValueError:
+        return "Data inválida (use AAAA-MM-DD).", 400
+
+    mimetype = ("text/csv; charset=utf-8" if formato == "csv"
+                else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    resposta = Response(stream_with_context(exportacao.exportar(tabela, formato, **filtros)), mimetype=mimetype)
+    data = (datetime.now(timezone.utc) - timedelta(hours=3)).strftime("%Y%m%d-%H%M")
+    resposta.headers["Content-Disposition"] = f"attachment; filename={tabela}-{data}.{formato}"
+    return aplicar_cache_privado(resposta)
+
+@app.route('/propostas/lote')
+@login_required
+@permissao_required("gerar_pdf")
+def propostas_lote():
+    return render_template('propostasLote.html', lote_id=uuid.uuid4().hex, active_page='minhas_opp')
+
+@app.route('/propostas/lote', methods=["POST"])
+@login_required
+@permissao_required("gerar_pdf")
+def exportar_propostas_lote():
+    """
+    Exporta várias propostas em um ZIP. Aceita ids ou códigos (um por linha ou
+    separados por vírgula). As abas são lidas uma única vez para todo o lote.
+    """
+    if not propostas.disponivel():
+        return "Geração de PDF indisponível no servidor.", 503
+
+    lote_id = request.form.get("lote_id") or uuid.uuid4().hex
+    chaves = [c.strip() for c in request.form.get("ids", "").replace(",", "\n").splitlines() if c.strip()]
+    if not chaves:
+        return "Nenhuma oportunidade informada.", 400
+
+    oportunidades = sheets.listar_oportunidades()
+    if not set(chaves) <= {str(o.get(c, "")).strip() for o in oportunidades for c in ("id", "codigo")}:
+        # Alguma chave não está na aba principal: inclui as arquivadas
+        oportunidades += sheets.listar_oportunidades_arquivadas()
+    por_chave = {}
+    for o in oportunidades:
+        por_chave[str(o.get("id", "")).strip()] = o
+        por_chave[str(o.get("codigo", "")).strip()] = o
+    clientes = {str(c.get("id", "")).strip(): c for c in sheets.listar_clientes()}
+
+    def renderizar(oportunidade, cliente):
+        # Chamada pelo gerador do ZIP, item a item, já durante o streaming
+        def html():
+            with assets.enderecos_locais():
+                return render_template('propostaPreview.html',
+                                       oportunidade=oportunidade,
+                                       cliente=cliente,
+                                       gerando_pdf=True)
+        return html
+
+    itens = []
+    vistos = set()
+    for chave in chaves:
+        oportunidade = por_chave.get(chave)
+        if not oportunidade or oportunidade.get("id") in vistos:
+            continue
+        vistos.add(oportunidade.get("id"))
+        cliente = clientes.get(str(oportunidade.get("cliente_id", "")).strip())
+        itens.append({
+            "nome": f"proposta-{oportunidade.get('codigo') or oportunidade['id']}.pdf",
+            "oportunidade_id": oportunidade["id"],
+            "versao": propostas.versao_proposta(oportunidade, cliente),
+            "html": renderizar(oportunidade, cliente),
+        })
+
+    if not itens:
+        return "Nenhuma oportunidade encontrada.", 404
+
+    resposta = Response(stream_with_context(propostas.exportar_lote(itens, lote_id)), mimetype="application/zip")
+    resposta.headers["Content-Disposition"] = f"attachment; filename=propostas-{lote_id[:8]}.zip"
+    resposta.headers["X-Lote-Id"] = lote_id
+    return aplicar_cache_privado(resposta)
+
+@app.route('/propostas/lote/<string:lote_id>/progresso')
+@login_required
+@permissao_required("gerar_pdf")
+def progresso_propostas_lote(lote_id):
+    progresso = propostas.ler_progresso(lote_id)
+    if progresso is None:
+        return jsonify({"total": 0, "concluidos": 0, "erros": [], "finalizado": False}), 404
+    return jsonify(progresso)
 
-    # PDF generation via wkhtmltopdf/pdfkit is not required for the MVP preview.
-    # Redirect to the HTML preview and trigger client-side print instead.
-    return redirect(url_for('preview_proposta', oportunidade_id=oportunidade_id, imprimir=1))
 # -----------------------------------------------------------------
 # Inicialização
 # -----------------------------------------------------------------
@@ -0,0 +1,134 @@
+# arquivamento.py
+"""
+Arquivamento de oportunidades finalizadas (job agendado, ver .render.yaml).
+
+Move as oportunidades em um dos ESTADOS_FINALIZADOS, cadastradas há mais de
+DIAS_MINIMOS dias, para as abas de arquivo 'oportunidades_AAAA' (por ano de
+datacad), na planilha PLANILHA_ARQUIVO_ID (por padrão a mesma). A aba
+principal fica só com o que ainda está em andamento, e as leituras dela
+deixam de baixar o histórico. Buscas por id e listagens por proprietário
+continuam encontrando as arquivadas (ver sheets.abas_candidatas).
+
+As linhas são primeiro copiadas (ids que já estão no arquivo não são
+copiados de novo) e só depois apagadas da aba principal, conferindo antes
+que cada linha ainda tem o mesmo id. Se o job parar no meio, a próxima
+execução termina o trabalho sem duplicar nada.
+
+Uso: python arquivamento.py [--simular]
+"""
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+
+import sheets
+
+ESTADOS_FINALIZADOS = {
+    e.strip().lower()
+    for e in os.environ.get("ARQUIVO_ESTADOS", "Aprovado,Reprovado,Cancelado,Perdido,Concluído").split(",")
+    if e.strip()
+}
+DIAS_MINIMOS = int(os.environ.get("ARQUIVO_DIAS", "180"))
+# Linhas por chamada append_rows
+LOTE = 500
+
+
+def _data(valor):
+    """datacad ('2026-10-19 14:03:00' ou '19/10/2026') -> datetime (None se inválida)."""
+    texto = str(valor or "").strip()[:10]
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(texto, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def selecionar(valores, limite):
+    """
+    Linhas a arquivar, agrupadas por ano: {ano: [(número da linha, valores)]}.
+    'valores' é o conteúdo da aba (cabeçalho na primeira linha).
+    """
+    cabecalho = [(h or "").strip().lower() for h in valores[0]]
+    col_estado, col_data = cabecalho.index("estado"), cabecalho.index("datacad")
+    por_ano = {}
+    for numero, linha in enumerate(valores[1:], start=2):
+        linha = list(linha) + [""] * (len(cabecalho) - len(linha))
+        if str(linha[col_estado]).strip().lower() not in ESTADOS_FINALIZADOS:
+            continue
+        data = _data(linha[col_data])
+        if data is None or data >= limite:
+            continue
+        por_ano.setdefault(data.year, []).append((numero, linha))
+    return por_ano
+
+
+def _aba_arquivo(ano, cabecalho):
+    """Aba de arquivo do ano, criada com o cabeçalho da aba principal se ainda não existir."""
+    nome = sheets.aba_arquivo(ano)
+    if nome in sheets.abas_arquivo():
+        return sheets.get_aba(nome)
+    aba = sheets.spreadsheet_arquivo.add_worksheet(title=nome, rows=1, cols=len(cabecalho))
+    aba.append_row(cabecalho, value_input_option="RAW")
+    sheets._linhas_das_abas(sheets.spreadsheet_arquivo, recarregar=True)
+    return aba
+
+
+def _apagar_linhas(aba, numeros):
+    """Apaga as linhas, de baixo para cima, em blocos contíguos (uma chamada batchUpdate)."""
+    pedidos = [
+        {"deleteDimension": {"range": {
+            "sheetId": aba.id, "dimension": "ROWS", "startIndex": inicio - 1, "endIndex": fim,
+        }}}
+        for inicio, fim in reversed(sheets._agrupar(numeros))
+    ]
+    if pedidos:
+        sheets.spreadsheet.batch_update({"requests": pedidos})
+
+
+def arquivar(dias=DIAS_MINIMOS, simular=False):
+    """Executa o arquivamento. Retorna {ano: linhas movidas}."""
+    principal = sheets.get_aba(sheets.ABA_OPORTUNIDADES)
+    valores = principal.get_all_values()
+    if len(valores) < 2:
+        return {}
+    cabecalho = valores[0]
+    col_id = [(h or "").strip().lower() for h in cabecalho].index("id")
+    hoje = (datetime.now(timezone.utc) - timedelta(hours=3)).replace(tzinfo=None)
+    por_ano = selecionar(valores, hoje - timedelta(days=dias))
+
+    movidas = {}
+    copiadas = {}  # número da linha -> id
+    for ano, linhas in sorted(por_ano.items()):
+        movidas[ano] = len(linhas)
+        if simular:
+            continue
+        destino = _aba_arquivo(ano, cabecalho)
+        ja_arquivados = {str(v).strip() for v in destino.col_values(col_id + 1)[1:]}
+        novas = [linha for _, linha in linhas if str(linha[col_id]).strip() not in ja_arquivados]
+        for i in range(0, len(novas), LOTE):
+            # RAW: as células ficam com o mesmo texto exibido na aba principal
+            destino.append_rows(novas[i:i + LOTE], value_input_option="RAW")
+        copiadas.update({numero: str(linha[col_id]).strip() for numero, linha in linhas})
+
+    if copiadas:
+        # A aba pode ter mudado durante a cópia: só apaga linhas que ainda têm o mesmo id
+        ids_atuais = principal.col_values(col_id + 1)
+        apagar = [n for n, id_linha in copiadas.items()
+                  if n <= len(ids_atuais) and str(ids_atuais[n - 1]).strip() == id_linha]
+        _apagar_linhas(principal, apagar)
+        sheets.marcar_alteracao(sheets.ABA_OPORTUNIDADES)
+    return movidas
+
+
+if __name__ == "__main__":
+    simular = "--simular" in sys.argv[1:]
+    try:
+        movidas = arquivar(simular=simular)
+    except Exception as e:
+        print(f"Erro no arquivamento de oportunidades: {e}")
+        sys.exit(1)
+    acao = "seriam arquivadas" if simular else "arquivadas"
+    for ano, total in sorted(movidas.items()):
+        print(f"{sheets.aba_arquivo(ano)}: {total} oportunidades {acao}")
+    if not movidas:
+        print("Nenhuma oportunidade para arquivar.")
@@ -0,0 +1,107 @@
+# assets.py
+"""
+Arquivos estáticos com impressão digital (fingerprint) no endereço.
+
+Cada arquivo de static/ é servido em /assets/<hash>/<caminho>, onde <hash> é
+derivado do conteúdo. Como o endereço muda sempre que o arquivo muda, o
+navegador pode guardá-lo por um ano sem revalidar.
+"""
+import os
+import hashlib
+import contextvars
+from contextlib import contextmanager
+from urllib.parse import quote
+from werkzeug.security import safe_join
+
+PASTA_STATIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+# Um ano: o conteúdo de um endereço com hash nunca muda
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"
+
+_hashes = {}  # caminho -> (mtime, hash)
+
+# Quando ativo, url() devolve file:// (renderização de PDF no servidor, sem HTTP)
+_enderecos_locais = contextvars.ContextVar("assets_enderecos_locais", default=False)
+
+
+@contextmanager
+def enderecos_locais():
+    """Dentro do bloco, os templates apontam os arquivos estáticos para o disco."""
+    token = _enderecos_locais.set(True)
+    try:
+        yield
+    finally:
+        _enderecos_locais.reset(token)
+
+
+def caminho_absoluto(caminho):
+    """Caminho no disco, ou None se 'caminho' tentar sair de static/."""
+    return safe_join(PASTA_STATIC, caminho)
+
+
+def existe(caminho):
+    completo = caminho_absoluto(caminho)
+    return bool(completo) and os.path.isfile(completo)
+
+
+def hash_arquivo(caminho):
+    """
+    Retorna os 12 primeiros caracteres do SHA-256 do arquivo.
+    O resultado é memoizado e só é recalculado quando o mtime muda.
+    """
+    completo = caminho_absoluto(caminho)
+    if not completo:
+        return None
+    try:
+        mtime = os.path.getmtime(completo)
+    except OSError:
+        return None
+
+    memo = _hashes.get(caminho)
+    if memo and memo[0] == mtime:
+        return memo[1]
+
+    h = hashlib.sha256()
+    with open(completo, "rb") as f:
+        for bloco in iter(lambda: f.read(65536), b""):
+            h.update(bloco)
+    digest = h.hexdigest()[:12]
+    _hashes[caminho] = (mtime, digest)
+    return digest
+
+
+def url(caminho):
+    """Endereço público do arquivo estático (com hash quando o arquivo existe)."""
+    caminho = caminho.lstrip("/")
+    if _enderecos_locais.get():
+        completo = caminho_absoluto(caminho)
+        if completo:
+            return "file://" + quote(completo)
+    digest = hash_arquivo(caminho)
+    if not digest:
+        return "/static/" + caminho
+    return f"/assets/{digest}/{caminho}"
+
+
+_versao_build = None
+
+
+def versao_build():
+    """
+    Identificador do build atual (templates + static), igual em todos os workers.
+    Entra nos validadores de página para que um deploy invalide os ETags antigos.
+    """
+    global _versao_build
+    if _versao_build is None:
+        raiz = os.path.dirname(PASTA_STATIC)
+        h = hashlib.sha256()
+        for pasta in ("templates", "static"):
+            for dirpath, dirnames, arquivos in sorted(os.walk(os.path.join(raiz, pasta))):
+                dirnames.sort()
+                for nome in sorted(arquivos):
+                    completo = os.path.join(dirpath, nome)
+                    h.update(os.path.relpath(completo, raiz).encode())
+                    with open(completo, "rb") as f:
+                        h.update(hashlib.sha256(f.read()).digest())
+        _versao_build = h.hexdigest()[:12]
+    return _versao_build
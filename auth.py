@@ -1,19 +1,20 @@
 import sheets  #centraliza Google Sheets
-import uuid
-import hashlib
-import random
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import senhas  # hash de senhas com vagas limitadas (lança senhas.Sobrecarga)
+import os
+import time
+import fcntl
+import threading
 
 def cadastrar_usuario(email, senha, nome, sobrenome, cidade, telefone):
-    senha_hash = generate_password_hash(senha)
     usuarios = sheets.listar_usuarios()
 
-    # Verifica se o email já está cadastrado
+    # Verifica se o email já está cadastrado (antes do hash, que é caro)
     for u in usuarios:
         if u["email"] == email:
             return False
 
+    senha_hash = senhas.gerar_hash(senha)
+
     # Salva todos os dados na planilha
     sheets.salvar_usuario(
         email=email,
@@ -29,7 +30,8 @@ def cadastrar_usuario(email, senha, nome, sobrenome, cidade, telefone):
 # auth.py (substituir a função validar_login existente por esta)
 def validar_login(email, senha):
     usuarios = sheets.listar_usuarios()
-    for u in usuarios:
+    # Linha na aba = posição na lista + 2 (cabeçalho na linha 1)
+    for linha, u in enumerate(usuarios, start=2):
         # normaliza o email para comparar (evita espaços e maiúsculas)
         if str(u.get("email", "")).strip().lower() == str(email).strip().lower():
             # verifica ativo (tolerante a True/TRUE/"true")
@@ -38,31 +40,150 @@ def validar_login(email, senha):
                 return None  # usuário inativo
 
             # checa senha — trata chaves: 'senha' ou 'senha_hash'
-            senha_armazenada = u.get("senha") or u.get("senha_hash") or ""
-            try:
-                if check_password_hash(senha_armazenada, senha):
-                    # pega o campo de acesso com tolerância a maiúsculas/minúsculas
-                    nivel = u.get("acesso") or u.get("Acesso") or u.get("nivel") or "Visitante"
-                    nivel = str(nivel).strip()
-                    return {"id": u.get("id"), "acesso": nivel}
-            except Exception as e:
-                # se houver qualquer problema com o hash, falha o login
-                return None
+            senha_armazenada = str(u.get("senha") or u.get("senha_hash") or "")
+            if senhas.conferir(senha_armazenada, senha):
+                # Política de hash mudou: grava o hash novo enquanto a senha está disponível
+                try:
+                    if senhas.precisa_rehash(senha_armazenada):
+                        sheets.atualizar_senha_usuario(linha, u.get("id"), senhas.gerar_hash(senha))
+                except Exception as e:
+                    print(f"Erro ao atualizar hash da senha ({u.get('id')}): {e}")
+                # pega o campo de acesso com tolerância a maiúsculas/minúsculas
+                nivel = u.get("acesso") or u.get("Acesso") or u.get("nivel") or "Visitante"
+                nivel = str(nivel).strip()
+                return {"id": u.get("id"), "acesso": nivel}
     return None
 
+# -----------------------------------------------------------------
+# Identificadores ordenáveis por tempo (estilo ULID)
+# -----------------------------------------------------------------
+# Alfabeto Base32 de Crockford (sem I, L, O, U): a ordem alfabética das
+# strings é a mesma ordem numérica, então ids mais novos são "maiores".
+CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+TAMANHO_ULID = 26
+
+# Identifica este processo no código curto (equivalente ao "node id" de um
+# snowflake). Dois processos com o mesmo id gerariam o mesmo código no mesmo
+# milissegundo, então o id não é sorteado:
+#   - NODE_ID fixa o id (um processo por valor);
+#   - sem NODE_ID, cada processo trava com flock um arquivo livre em
+#     PASTA_NOS, dentro da faixa NODE_IDS ("inicio-fim"). A trava dura a
+#     vida do processo e o sistema a solta se ele morrer. Com mais de uma
+#     instância, dê a cada uma uma faixa própria.
+# Sem id livre a aplicação não sobe (RuntimeError).
+PASTA_NOS = os.environ.get(
+    "NODE_IDS_PASTA",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "nos"),
+)
+FAIXA_NOS = os.environ.get("NODE_IDS", "0-1023")
+
+_no = {"id": None, "pid": None, "arquivo": None}
+_lock_no = threading.Lock()
+
+_lock_ids = threading.Lock()
+_ultimo_ms = 0
+_ultimo_aleatorio = 0
+_sequencia = 0
+
+
+def _alocar_no():
+    fixo = os.environ.get("NODE_ID")
+    if fixo:
+        no = int(fixo)
+        if not 0 <= no < 1024:
+            raise RuntimeError(f"NODE_ID fora de 0-1023: {fixo}")
+        return no
+    inicio, _, fim = FAIXA_NOS.partition("-")
+    inicio, fim = int(inicio), int(fim or inicio)
+    if not 0 <= inicio <= fim < 1024:
+        raise RuntimeError(f"NODE_IDS fora de 0-1023: {FAIXA_NOS}")
+    os.makedirs(PASTA_NOS, exist_ok=True)
+    for no in range(inicio, fim + 1):
+        f = open(os.path.join(PASTA_NOS, f"no-{no}.lock"), "w")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            continue
+        _no["arquivo"] = f  # mantém a trava enquanto o processo viver
+        return no
+    raise RuntimeError(f"Nenhum node id livre na faixa {FAIXA_NOS} ({PASTA_NOS}).")
+
+
+def no_id():
+    """Node id deste processo. Um processo criado por fork (gunicorn --preload) trava o seu."""
+    with _lock_no:
+        if _no["pid"] != os.getpid():
+            _no["id"], _no["pid"] = _alocar_no(), os.getpid()
+        return _no["id"]
+
+
+def _base32(numero, tamanho):
+    chars = []
+    for _ in range(tamanho):
+        numero, resto = divmod(numero, 32)
+        chars.append(CROCKFORD[resto])
+    return "".join(reversed(chars))
+
+
+def eh_ulid(valor):
+    """True para ids no formato novo (26 caracteres Crockford); uuid4 antigos retornam False."""
+    valor = str(valor or "").strip().upper()
+    return len(valor) == TAMANHO_ULID and all(c in CROCKFORD for c in valor)
+
+
+def instante_ulid(valor):
+    """Instante de criação (epoch em segundos) guardado nos 10 primeiros caracteres do ULID."""
+    ms = 0
+    for c in str(valor).strip().upper()[:10]:
+        ms = ms * 32 + CROCKFORD.index(c)
+    return ms / 1000
+
+
+def _proximo_instante():
+    """
+    Retorna (ms, aleatorio, sequencia) monotônicos neste processo: no mesmo
+    milissegundo o aleatório e a sequência são incrementados.
+    """
+    global _ultimo_ms, _ultimo_aleatorio, _sequencia
+    with _lock_ids:
+        agora = int(time.time() * 1000)
+        if agora <= _ultimo_ms:
+            agora = _ultimo_ms
+            _ultimo_aleatorio += 1
+            _sequencia = (_sequencia + 1) % 4096
+            if _sequencia == 0:
+                # 4096 códigos no mesmo ms: avança o relógio lógico
+                agora += 1
+        else:
+            _ultimo_aleatorio = int.from_bytes(os.urandom(10), "big")
+            _sequencia = 0
+        _ultimo_ms = agora
+        return agora, _ultimo_aleatorio % (1 << 80), _sequencia
+
+
 def gerar_identificador(tipo_registro="geral"):
+    """
+    Retorna (id, codigo).
 
-    # 1UUID técnico — garante unicidade global
-    id_unico = str(uuid.uuid4())
+    - id: ULID (48 bits de tempo em ms + 80 bits aleatórios), ordenável por
+      tempo. Como as abas crescem por append, a coluna de ids fica ordenada e
+      permite busca binária (ver sheets.buscar_registro_por_id).
+    - codigo: código curto sem colisão, no formato PREFIXO-XXXXX-XXXXXXXX,
+      derivado de tempo (ms) + id do processo + sequência (estilo snowflake).
+    """
+    ms, aleatorio, sequencia = _proximo_instante()
 
-    # Seed única derivada de UUID + timestamp
-    seed_base = f"{id_unico}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
-    hash_seed = hashlib.sha1(seed_base.encode()).hexdigest().upper()
+    id_unico = _base32(ms, 10) + _base32(aleatorio, 16)
 
-    # Código curto (3 letras de tipo + 4 dígitos + 3 chars aleatórios)
+    # 42 bits de tempo + 10 bits de processo + 12 bits de sequência
+    snowflake = ((ms & ((1 << 42) - 1)) << 22) | (no_id() << 12) | sequencia
+    curto = _base32(snowflake, 13)
     prefixo = tipo_registro[:3].upper()
-    numero_rand = random.randint(1, 9999)
-    sufixo_hash = hash_seed[:3]
-    codigo_amigavel = f"{prefixo}-{str(numero_rand).zfill(4)}-{sufixo_hash}"
+    codigo_amigavel = f"{prefixo}-{curto[:5]}-{curto[5:]}"
 
     return id_unico, codigo_amigavel
+
+
+# Sem node id livre, falha já na importação (o worker não sobe)
+no_id()
@@ -0,0 +1,14 @@
+#!/usr/bin/env bash
+# Compila o CSS do Tailwind a partir dos templates (somente classes usadas).
+# Usa o executável standalone (não precisa de Node instalado).
+set -e
+cd "$(dirname "$0")/.."
+
+TAILWIND_VERSAO="${TAILWIND_VERSAO:-v3.4.17}"
+
+if [ ! -x bin/tailwindcss ]; then
+  curl -sL -o bin/tailwindcss "https://github.com/tailwindlabs/tailwindcss/releases/download/${TAILWIND_VERSAO}/tailwindcss-linux-x64"
+  chmod +x bin/tailwindcss
+fi
+
+bin/tailwindcss -c tailwind.config.js -i static/css/tailwind.input.css -o static/css/tailwind.css --minify
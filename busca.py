@@ -0,0 +1,211 @@
+# busca.py
+"""
+Busca de clientes por vendedor (autocomplete).
+
+Cada proprietário tem um índice em memória com:
+  - trigramas -> ids (busca por trecho, ex.: "silva" encontra "Da Silva");
+  - prefixos curtos (1-2 caracteres) -> ids, para as primeiras teclas.
+
+O índice é montado uma vez a partir da aba 'clientes' e depois atualizado
+incrementalmente. A versão do índice são as linhas do proprietário na aba
+(sheets.linhas_do_proprietario), que só mudam quando a aba 'clientes' muda:
+  - cadastro neste processo: registrar_cliente acrescenta o cliente;
+  - linhas novas do proprietário (outro worker, importação): só elas são
+    lidas e acrescentadas (carregar_novas);
+  - qualquer outra mudança nas linhas (apagadas, deslocadas) ou índice mais
+    velho que RECONSTRUIR_SEGUNDOS (edições manuais de um cliente): o índice
+    é remontado.
+Escritas em outras abas não afetam o índice.
+"""
+import os
+import re
+import time
+import threading
+import unicodedata
+
+# Campos pesquisáveis e os que são tratados só como dígitos
+CAMPOS_TEXTO = ("nome", "email", "municipio")
+CAMPOS_DIGITOS = ("cpf", "telefone")
+
+LIMITE_PADRAO = 10
+RECONSTRUIR_SEGUNDOS = int(os.environ.get("BUSCA_RECONSTRUIR", "900"))
+
+_indices = {}  # proprietario -> IndiceClientes
+_lock = threading.Lock()
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos ("João" -> "joao")."""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    return "".join(c for c in texto if not unicodedata.combining(c)).lower().strip()
+
+
+def somente_digitos(texto):
+    return re.sub(r"\D", "", str(texto or ""))
+
+
+def _trigramas(termo):
+    return {termo[i:i + 3] for i in range(len(termo) - 2)}
+
+
+def _termos_do_cliente(cliente):
+    """Palavras normalizadas do cliente (texto e dígitos)."""
+    termos = set()
+    for campo in CAMPOS_TEXTO:
+        valor = normalizar(cliente.get(campo))
+        if not valor:
+            continue
+        termos.add(valor)
+        termos.update(t for t in re.split(r"[\s@._\-]+", valor) if t)
+    for campo in CAMPOS_DIGITOS:
+        digitos = somente_digitos(cliente.get(campo))
+        if digitos:
+            termos.add(digitos)
+    return termos
+
+
+class IndiceClientes:
+    """Índice invertido (trigramas + prefixos) dos clientes de um proprietário."""
+
+    def __init__(self, versao=None):
+        self.versao = versao
+        self.montado_em = time.monotonic()
+        self.clientes = {}   # id -> cliente
+        self.termos = {}     # id -> termos normalizados
+        self.trigramas = {}  # trigrama -> {ids}
+        self.prefixos = {}   # prefixo de 1-2 caracteres -> {ids}
+
+    def adicionar(self, cliente):
+        cliente_id = str(cliente.get("id", "")).strip()
+        if not cliente_id:
+            return
+        if cliente_id in self.clientes:
+            self.remover(cliente_id)
+
+        termos = _termos_do_cliente(cliente)
+        self.clientes[cliente_id] = cliente
+        self.termos[cliente_id] = termos
+        for termo in termos:
+            for tri in _trigramas(termo):
+                self.trigramas.setdefault(tri, set()).add(cliente_id)
+            for n in (1, 2):
+                if len(termo) >= n:
+                    self.prefixos.setdefault(termo[:n], set()).add(cliente_id)
+
+    def remover(self, cliente_id):
+        for termo in self.termos.pop(cliente_id, ()):
+            for tri in _trigramas(termo):
+                self.trigramas.get(tri, set()).discard(cliente_id)
+            for n in (1, 2):
+                self.prefixos.get(termo[:n], set()).discard(cliente_id)
+        self.clientes.pop(cliente_id, None)
+
+    def _candidatos(self, token):
+        if len(token) < 3:
+            return self.prefixos.get(token, set())
+        conjuntos = [self.trigramas.get(tri, set()) for tri in _trigramas(token)]
+        if not conjuntos:
+            return set()
+        conjuntos.sort(key=len)
+        resultado = set(conjuntos[0])
+        for c in conjuntos[1:]:
+            resultado &= c
+            if not resultado:
+                break
+        return resultado
+
+    def buscar(self, consulta, limite=LIMITE_PADRAO):
+        """
+        Retorna até 'limite' clientes que contêm todos os tokens da consulta.
+        Clientes cujo nome começa com a consulta vêm primeiro.
+        """
+        texto = normalizar(consulta)
+        tokens = [t for t in re.split(r"[\s@._\-]+", texto) if t]
+        # CPF/telefone digitados com máscara viram um único token de dígitos
+        digitos = somente_digitos(consulta)
+        if digitos and len(digitos) >= 3 and not re.search(r"[a-z]", texto):
+            tokens = [digitos]
+        if not tokens:
+            return []
+
+        ids = None
+        for token in tokens:
+            candidatos = self._candidatos(token)
+            # Trigramas só dizem "talvez": confirma que o token aparece de fato
+            candidatos = {
+                i for i in candidatos
+                if any(token in termo for termo in self.termos.get(i, ()))
+            }
+            ids = candidatos if ids is None else ids & candidatos
+            if not ids:
+                return []
+
+        def chave(cliente_id):
+            nome = normalizar(self.clientes[cliente_id].get("nome"))
+            return (not nome.startswith(texto), nome)
+
+        return [self.clientes[i] for i in sorted(ids, key=chave)[:limite]]
+
+
+def _acrescimo(antiga, nova):
+    """Linhas novas se 'nova' só acrescenta linhas a 'antiga'; senão None."""
+    if not isinstance(antiga, tuple) or not isinstance(nova, tuple) or len(nova) < len(antiga):
+        return None
+    if nova[:len(antiga)] != antiga:
+        return None
+    return nova[len(antiga):]
+
+
+def indice_do_owner(proprietario, carregar, versao=None, carregar_novas=None):
+    """
+    Retorna o índice do proprietário. 'versao' é a tupla de linhas do
+    proprietário na aba; se ela só ganhou linhas, 'carregar_novas(linhas)'
+    traz os clientes delas. Sem índice, com outra mudança ou com o índice
+    velho, ele é montado com 'carregar()' (lista de clientes).
+    """
+    chave = str(proprietario).strip()
+    with _lock:
+        indice = _indices.get(chave)
+        if indice is not None and time.monotonic() - indice.montado_em < RECONSTRUIR_SEGUNDOS:
+            if versao is None or indice.versao == versao:
+                return indice
+            novas = _acrescimo(indice.versao, versao) if carregar_novas else None
+        else:
+            novas = None
+
+    if novas is not None:
+        clientes = carregar_novas(list(novas))
+        with _lock:
+            for cliente in clientes:
+                indice.adicionar(cliente)
+            indice.versao = versao
+        return indice
+
+    novo = IndiceClientes(versao)
+    for cliente in carregar():
+        novo.adicionar(cliente)
+    with _lock:
+        _indices[chave] = novo
+    return novo
+
+
+def registrar_cliente(cliente, versao=None):
+    """
+    Atualização incremental após um append na aba 'clientes'.
+    Só altera índices já montados. 'versao' (linhas do proprietário já com a
+    nova) passa a ser a vigente só se a única linha nova é esta; havendo
+    outras, a próxima busca as lê.
+    """
+    chave = str(cliente.get("proprietario", "")).strip()
+    with _lock:
+        indice = _indices.get(chave)
+        if indice is None:
+            return
+        indice.adicionar(cliente)
+        novas = _acrescimo(indice.versao, versao)
+        if novas is not None and len(novas) == 1:
+            indice.versao = versao
+
+
+def buscar(proprietario, consulta, carregar, versao=None, carregar_novas=None, limite=LIMITE_PADRAO):
+    return indice_do_owner(proprietario, carregar, versao, carregar_novas).buscar(consulta, limite)
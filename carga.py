@@ -0,0 +1,472 @@
+# carga.py
+"""
+Teste de carga offline: a aplicação real, sob gunicorn, falando com o
+Google falso (google_falso.py) em vez do Sheets e do Drive.
+
+Sobe o Google falso e o gunicorn como subprocessos e simula vendedores
+(threads) repetindo a sessão típica:
+
+    login -> meus_clientes -> iniciar_fluxo_oportunidade -> nova_oportunidade
+          -> cadastrar_oportunidade (com dois anexos) -> minhas_opp
+          -> proposta/preview
+
+com uma pausa aleatória entre os passos. Ao fim grava um JSON com, por
+rota, requisições, erros, códigos de status, vazão e latências p50/p95/p99
+(ms), além das chamadas recebidas pelo Google falso. Dois resultados (por
+exemplo, antes e depois de uma mudança) são comparados com 'comparar'.
+
+Workers, threads e worker class do gunicorn vêm, por padrão, do serviço web
+em .render.yaml (o startCommand de produção), para a carga medir o que roda
+de fato; --workers/--threads/--worker-class sobrepõem. A configuração usada
+fica no resultado.
+
+Uso:
+    python carga.py rodar [--usuarios 20] [--duracao 60] [--workers N] [--threads N]
+        [--worker-class sync|gthread]
+        [--latencia 0.08] [--erros 0] [--cota-leitura 0] [--cota-escrita 0] [--saida arquivo.json]
+    python carga.py comparar base.json novo.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import shlex
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_DEPLOY = os.path.join(PASTA, ".render.yaml")
+# Código de status esperado em cada passo (redirecionamentos não são seguidos)
+ESPERADO = {
+    "POST /login": (302,),
+    "GET /meus_clientes": (200, 304),
+    "GET /iniciar_fluxo_oportunidade": (302,),
+    "GET /nova_oportunidade": (200,),
+    "POST /cadastrar_oportunidade": (302,),
+    "GET /minhas_opp": (200, 304),
+    "GET /proposta/preview/<id>": (200, 304),
+}
+
+
+# -----------------------------------------------------------------
+# Processos
+# -----------------------------------------------------------------
+
+def _config_deploy():
+    """
+    workers, threads e worker class do startCommand do gunicorn em
+    .render.yaml, com os padrões do gunicorn para o que o comando não define
+    (1 worker sync; com mais de uma thread, gthread).
+    """
+    config = {"workers": 1, "threads": 1, "worker_class": "sync"}
+    try:
+        with open(ARQUIVO_DEPLOY, encoding="utf-8") as f:
+            comando = re.search(r"startCommand:\s*(gunicorn[^\n]*)", f.read())
+    except OSError as e:
+        print(f"Erro ao ler {ARQUIVO_DEPLOY}: {e}")
+        return config
+    if not comando:
+        return config
+    nomes = {"-w": "workers", "--workers": "workers", "--threads": "threads",
+             "-k": "worker_class", "--worker-class": "worker_class"}
+    argumentos = shlex.split(comando.group(1))[1:]
+    for i, argumento in enumerate(argumentos):
+        chave, _, valor = argumento.partition("=")
+        if chave in nomes:
+            config[nomes[chave]] = valor or (argumentos[i + 1] if i + 1 < len(argumentos) else "")
+    try:
+        config["workers"], config["threads"] = int(config["workers"]), int(config["threads"])
+    except ValueError:
+        print(f"Erro: workers/threads inválidos em {ARQUIVO_DEPLOY}; usando 1.")
+        config["workers"], config["threads"] = 1, 1
+    if config["worker_class"] == "sync" and config["threads"] > 1:
+        config["worker_class"] = "gthread"
+    return config
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _aguardar(porta, caminho, limite=60):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        try:
+            conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=5)
+            conexao.request("GET", caminho)
+            if conexao.getresponse().status < 500:
+                return True
+        except (http.client.HTTPException, OSError):
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def _obter_json(porta, caminho):
+    conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=30)
+    conexao.request("GET", caminho)
+    return json.loads(conexao.getresponse().read())
+
+
+def _subir_google_falso(opcoes, porta):
+    comando = [
+        sys.executable, os.path.join(PASTA, "google_falso.py"), "servir", "--porta", str(porta),
+        "--latencia", str(opcoes.latencia), "--jitter", str(opcoes.jitter), "--erros", str(opcoes.erros),
+        "--cota-leitura", str(opcoes.cota_leitura), "--cota-escrita", str(opcoes.cota_escrita),
+        "--banda", str(opcoes.banda), "--vendedores", str(opcoes.vendedores),
+        "--clientes", str(opcoes.clientes), "--oportunidades", str(opcoes.oportunidades),
+    ]
+    return subprocess.Popen(comando, cwd=PASTA)
+
+
+def _subir_gunicorn(opcoes, porta, porta_google, temporaria):
+    ambiente = dict(
+        os.environ,
+        GOOGLE_FALSO_URL=f"http://127.0.0.1:{porta_google}",
+        GOOGLE_CREDS_ADM="{}",
+        PLANILHA_ADM_ID="planilha-carga",
+        PLANILHA_ARQUIVO_ID="",
+        RATELIMIT_ENABLED="0",
+        # Caches locais em uma pasta temporária: cada rodada começa fria
+        PAINEL_ARQUIVO=os.path.join(temporaria, "painel.json"),
+        ANEXOS_INDICE=os.path.join(temporaria, "anexos.sqlite3"),
+        CEP_BANCO=os.path.join(temporaria, "cep.sqlite3"),
+        PROPOSTAS_CACHE_DIR=os.path.join(temporaria, "propostas"),
+        VERSOES_ARQUIVO=os.path.join(temporaria, "versoes.json"),
+        SENHA_VAGAS_PASTA=os.path.join(temporaria, "senhas"),
+        WEB_CONCURRENCY=str(opcoes.workers),
+    )
+    comando = [
+        sys.executable, "-m", "gunicorn", "google_falso:criar_app()",
+        "--bind", f"127.0.0.1:{porta}", "--workers", str(opcoes.workers),
+        "--worker-class", opcoes.worker_class, "--threads", str(opcoes.threads),
+        "--timeout", "120", "--log-level", "warning",
+    ]
+    return subprocess.Popen(comando, cwd=PASTA, env=ambiente)
+
+
+def _encerrar(processo):
+    if processo and processo.poll() is None:
+        processo.terminate()
+        try:
+            processo.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+
+
+def _revisao():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PASTA,
+                              capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+# -----------------------------------------------------------------
+# Vendedor simulado
+# -----------------------------------------------------------------
+
+def _multipart(campos, arquivos):
+    """Corpo multipart/form-data. 'arquivos': {campo: (nome, bytes, tipo)}."""
+    fronteira = uuid.uuid4().hex
+    partes = []
+    for nome, valor in campos.items():
+        partes.append(f'--{fronteira}\r\nContent-Disposition: form-data; name="{nome}"\r\n\r\n{valor}\r\n'.encode())
+    for nome, (arquivo, conteudo, tipo) in arquivos.items():
+        partes.append(
+            f'--{fronteira}\r\nContent-Disposition: form-data; name="{nome}"; filename="{arquivo}"\r\n'
+            f'Content-Type: {tipo}\r\n\r\n'.encode() + conteudo + b"\r\n"
+        )
+    partes.append(f"--{fronteira}--\r\n".encode())
+    return b"".join(partes), f"multipart/form-data; boundary={fronteira}"
+
+
+class Vendedor:
+    """Um navegador: cookies próprios, conexão persistente, sem seguir redirecionamentos."""
+
+    def __init__(self, porta, dados, registrar):
+        self.porta = porta
+        self.dados = dados
+        self.registrar = registrar
+        self.cookies = {}
+        self.conexao = None
+
+    def _pedir(self, rota, metodo, caminho, corpo=None, tipo=None):
+        cabecalhos = {}
+        if self.cookies:
+            cabecalhos["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        if tipo:
+            cabecalhos["Content-Type"] = tipo
+        inicio = time.monotonic()
+        status, local = 0, ""
+        try:
+            if self.conexao is None:
+                self.conexao = http.client.HTTPConnection("127.0.0.1", self.porta, timeout=120)
+            self.conexao.request(metodo, caminho, corpo, cabecalhos)
+            resposta = self.conexao.getresponse()
+            resposta.read()  # páginas em streaming: conta até o último byte
+            status, local = resposta.status, resposta.getheader("Location") or ""
+            for cabecalho in resposta.headers.get_all("Set-Cookie") or []:
+                for nome, morsel in SimpleCookie(cabecalho).items():
+                    self.cookies[nome] = morsel.value
+        except (http.client.HTTPException, OSError):
+            if self.conexao:
+                self.conexao.close()
+            self.conexao = None
+        self.registrar(rota, status, time.monotonic() - inicio)
+        return status, local
+
+    def sessao(self, pensar, anexo_kb):
+        """Uma sessão completa; para no primeiro passo que falhar."""
+        self.cookies.clear()
+        corpo = urlencode({"email": self.dados["email"], "senha": self.dados["senha"]})
+        passos = [
+            lambda: self._pedir("POST /login", "POST", "/login", corpo, "application/x-www-form-urlencoded"),
+            lambda: self._pedir("GET /meus_clientes", "GET", "/meus_clientes"),
+            lambda: self._pedir("GET /iniciar_fluxo_oportunidade", "GET", "/iniciar_fluxo_oportunidade?"
+                                + urlencode({"cliente_id": random.choice(self.dados["clientes"] or [""])})),
+            lambda: self._pedir("GET /nova_oportunidade", "GET", "/nova_oportunidade"),
+            lambda: self._cadastrar(anexo_kb),
+            lambda: self._pedir("GET /minhas_opp", "GET", "/minhas_opp"),
+            lambda: self._pedir("GET /proposta/preview/<id>", "GET", "/proposta/preview/"
+                                + random.choice(self.dados["oportunidades"] or ["-"])),
+        ]
+        for rota, passo in zip(ESPERADO, passos):
+            status, _ = passo()
+            if status not in ESPERADO[rota]:
+                return False
+            time.sleep(random.uniform(0, 2 * pensar))
+        return True
+
+    def _cadastrar(self, anexo_kb):
+        # Conteúdo aleatório: cada anexo é novo para a deduplicação (ver anexos.py)
+        anexo = lambda: b"%PDF-1.4\n" + os.urandom(anexo_kb * 1024)
+        corpo, tipo = _multipart(
+            {"modo": "novo", "nome": "Cliente Carga", "email": "cliente@carga.local",
+             "descricao": "teste de carga", "potenciaReal": "500", "valorReal": "19360"},
+            {"arquivo": ("documento.pdf", anexo(), "application/pdf"),
+             "conta_energia": ("conta.pdf", anexo(), "application/pdf")},
+        )
+        return self._pedir("POST /cadastrar_oportunidade", "POST", "/cadastrar_oportunidade", corpo, tipo)
+
+
+# -----------------------------------------------------------------
+# Medições
+# -----------------------------------------------------------------
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return None
+    posicao = min(int(round(p / 100 * (len(ordenados) - 1))), len(ordenados) - 1)
+    return round(ordenados[posicao] * 1000, 1)
+
+
+def _resumir(amostras, duracao):
+    """amostras: {rota: [(status, segundos)]} -> estatísticas por rota e totais."""
+    rotas = {}
+    todas = []
+    for rota, lista in amostras.items():
+        tempos = sorted(t for _, t in lista)
+        todas.extend(tempos)
+        status = {}
+        for s, _ in lista:
+            status[str(s)] = status.get(str(s), 0) + 1
+        rotas[rota] = {
+            "requisicoes": len(lista),
+            "erros": sum(1 for s, _ in lista if s not in ESPERADO.get(rota, (200,))),
+            "status": status,
+            "vazao": round(len(lista) / duracao, 3),
+            "p50_ms": _percentil(tempos, 50),
+            "p95_ms": _percentil(tempos, 95),
+            "p99_ms": _percentil(tempos, 99),
+            "max_ms": round(tempos[-1] * 1000, 1) if tempos else None,
+        }
+    todas.sort()
+    total = {
+        "requisicoes": len(todas),
+        "erros": sum(r["erros"] for r in rotas.values()),
+        "vazao": round(len(todas) / duracao, 3),
+        "p50_ms": _percentil(todas, 50),
+        "p95_ms": _percentil(todas, 95),
+        "p99_ms": _percentil(todas, 99),
+    }
+    return rotas, total
+
+
+def rodar(opcoes):
+    porta_google, porta_app = _porta_livre(), _porta_livre()
+    google = app = None
+    amostras = {rota: [] for rota in ESPERADO}
+    lock = threading.Lock()
+    fases = {"medindo_desde": None}
+    sessoes = {"completas": 0, "interrompidas": 0}
+
+    def registrar(rota, status, segundos):
+        inicio = fases["medindo_desde"]
+        if inicio is None or time.monotonic() < inicio:
+            return  # aquecimento
+        with lock:
+            amostras.setdefault(rota, []).append((status, segundos))
+
+    with tempfile.TemporaryDirectory(prefix="carga-") as temporaria:
+        try:
+            google = _subir_google_falso(opcoes, porta_google)
+            if not _aguardar(porta_google, "/saude"):
+                print("Erro: o Google falso não respondeu.")
+                return None
+            dados = _obter_json(porta_google, "/sessoes")
+
+            app = _subir_gunicorn(opcoes, porta_app, porta_google, temporaria)
+            if not _aguardar(porta_app, "/login", limite=120):
+                print("Erro: o gunicorn não respondeu.")
+                return None
+
+            inicio = time.monotonic()
+            fases["medindo_desde"] = inicio + opcoes.aquecimento
+            fim = fases["medindo_desde"] + opcoes.duracao
+
+            def usuario(posicao):
+                vendedor = Vendedor(porta_app, dados[posicao % len(dados)], registrar)
+                # Chegadas espalhadas no primeiro segundo, como usuários reais
+                time.sleep(random.uniform(0, 1))
+                while time.monotonic() < fim:
+                    completa = vendedor.sessao(opcoes.pensar, opcoes.anexo_kb)
+                    if time.monotonic() >= fases["medindo_desde"]:
+                        with lock:
+                            sessoes["completas" if completa else "interrompidas"] += 1
+
+            print(f"{opcoes.usuarios} vendedores por {opcoes.duracao:g}s "
+                  f"(+{opcoes.aquecimento:g}s de aquecimento)...", flush=True)
+            threads = [threading.Thread(target=usuario, args=(i,), daemon=True) for i in range(opcoes.usuarios)]
+            for t in threads:
+                t.start()
+            # Chamadas ao Google só da janela medida
+            time.sleep(max(fases["medindo_desde"] - time.monotonic(), 0))
+            antes = _obter_json(porta_google, "/estatisticas")
+            for t in threads:
+                t.join()
+            duracao = time.monotonic() - fases["medindo_desde"]
+            chamadas_google = {op: total - antes.get(op, 0)
+                               for op, total in _obter_json(porta_google, "/estatisticas").items()}
+        finally:
+            _encerrar(app)
+            _encerrar(google)
+
+    rotas, total = _resumir(amostras, duracao)
+    configuracao = {k: v for k, v in vars(opcoes).items() if k not in ("comando", "saida")}
+    return {
+        "revisao": _revisao(),
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "configuracao": configuracao,
+        "duracao_s": round(duracao, 1),
+        "sessoes": sessoes,
+        "rotas": rotas,
+        "total": total,
+        "chamadas_google": chamadas_google,
+    }
+
+
+# -----------------------------------------------------------------
+# Comparação
+# -----------------------------------------------------------------
+
+def _variacao(antes, depois):
+    if antes in (None, 0) or depois is None:
+        return "     -"
+    return f"{(depois - antes) / antes * 100:+6.1f}%"
+
+
+def comparar(base, novo):
+    """Tabela de p50/p95/p99 e vazão por rota: base -> novo."""
+    print(f"base {base.get('revisao') or '?'} ({base.get('data')})  ->  novo {novo.get('revisao') or '?'} ({novo.get('data')})")
+    gunicorn = []
+    for resultado in (base, novo):
+        c = resultado.get("configuracao", {})
+        gunicorn.append(f"{c.get('workers', '?')} x {c.get('worker_class', '?')}/{c.get('threads', '?')}")
+    print(f"gunicorn (workers x classe/threads): {gunicorn[0]}  ->  {gunicorn[1]}")
+    print(f"{'rota':36} {'métrica':8} {'base':>10} {'novo':>10} {'variação':>9}")
+    linhas = [(rota, base["rotas"].get(rota, {}), novo["rotas"].get(rota, {}))
+              for rota in dict.fromkeys(list(base["rotas"]) + list(novo["rotas"]))]
+    linhas.append(("total", base.get("total", {}), novo.get("total", {})))
+    for rota, antes, depois in linhas:
+        for metrica in ("p50_ms", "p95_ms", "p99_ms", "vazao", "erros"):
+            a, d = antes.get(metrica), depois.get(metrica)
+            print(f"{rota:36} {metrica:8} {'-' if a is None else a:>10} {'-' if d is None else d:>10} {_variacao(a, d):>9}")
+            rota = ""
+    chamadas = [(op, base.get("chamadas_google", {}).get(op, 0), novo.get("chamadas_google", {}).get(op, 0))
+                for op in sorted(set(base.get("chamadas_google", {})) | set(novo.get("chamadas_google", {})))]
+    if chamadas:
+        print("\nChamadas ao Google falso (por sessão completa):")
+        sessoes_base = max(base.get("sessoes", {}).get("completas", 0), 1)
+        sessoes_novo = max(novo.get("sessoes", {}).get("completas", 0), 1)
+        for op, a, d in chamadas:
+            print(f"  {op:12} {a / sessoes_base:8.2f} {d / sessoes_novo:8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga offline do portal.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    execucao = comandos.add_parser("rodar", help="sobe o ambiente e executa a carga")
+    execucao.add_argument("--usuarios", type=int, default=20, help="vendedores simultâneos")
+    execucao.add_argument("--duracao", type=float, default=60, help="segundos medidos")
+    execucao.add_argument("--aquecimento", type=float, default=10, help="segundos iniciais descartados")
+    execucao.add_argument("--pensar", type=float, default=1.0, help="pausa média entre passos (s)")
+    execucao.add_argument("--anexo-kb", type=int, default=300, help="tamanho de cada anexo")
+    execucao.add_argument("--workers", type=int, help="workers do gunicorn (padrão: .render.yaml)")
+    execucao.add_argument("--threads", type=int, help="threads por worker (padrão: .render.yaml)")
+    execucao.add_argument("--worker-class", choices=("sync", "gthread"), help="padrão: .render.yaml")
+    execucao.add_argument("--latencia", type=float, default=0.08, help="latência do Google falso (s)")
+    execucao.add_argument("--jitter", type=float, default=0.04)
+    execucao.add_argument("--erros", type=float, default=0.0, help="fração de chamadas com 503")
+    execucao.add_argument("--cota-leitura", type=int, default=0, help="leituras por minuto (0 = sem cota)")
+    execucao.add_argument("--cota-escrita", type=int, default=0, help="escritas por minuto (0 = sem cota)")
+    execucao.add_argument("--banda", type=float, default=10.0, help="MB/s nos uploads ao Drive")
+    execucao.add_argument("--vendedores", type=int, default=10, help="vendedores na planilha")
+    execucao.add_argument("--clientes", type=int, default=200, help="clientes por vendedor")
+    execucao.add_argument("--oportunidades", type=int, default=100, help="oportunidades por vendedor")
+    execucao.add_argument("--saida", help="arquivo JSON do resultado (padrão: carga-<revisão>-<data>.json)")
+
+    comparacao = comandos.add_parser("comparar", help="compara dois resultados")
+    comparacao.add_argument("base")
+    comparacao.add_argument("novo")
+
+    opcoes = parser.parse_args()
+    if opcoes.comando == "comparar":
+        with open(opcoes.base, encoding="utf-8") as a, open(opcoes.novo, encoding="utf-8") as b:
+            comparar(json.load(a), json.load(b))
+        return 0
+
+    # O que não foi informado vem do deploy
+    for chave, valor in _config_deploy().items():
+        if getattr(opcoes, chave) is None:
+            setattr(opcoes, chave, valor)
+    if opcoes.worker_class == "sync" and opcoes.threads > 1:
+        opcoes.worker_class = "gthread"  # como o gunicorn faz
+
+    resultado = rodar(opcoes)
+    if resultado is None:
+        return 1
+    saida = opcoes.saida or f"carga-{resultado['revisao'] or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    for rota, r in resultado["rotas"].items():
+        print(f"{rota:36} {r['requisicoes']:6} req  {r['erros']:4} erros  "
+              f"p50 {r['p50_ms']} ms  p95 {r['p95_ms']} ms  p99 {r['p99_ms']} ms")
+    print(f"Resultado em {saida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
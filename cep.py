@@ -0,0 +1,196 @@
+# cep.py
+"""
+Consulta de CEP com cache local (usada por /api/cep/<cep>).
+
+Ordem da consulta:
+  1. LRU em memória (TAMANHO_LRU CEPs por processo);
+  2. banco SQLite em disco (cache/cep.sqlite3), compartilhado pelos workers
+     e preservado entre deploys enquanto o disco existir;
+  3. resolvedor externo (ViaCEP por padrão), cujo resultado é gravado nos
+     dois níveis acima.
+
+O banco pode ser semeado com uma base de CEPs em CSV (colunas cep, uf,
+localidade, logradouro, bairro): automaticamente a partir de CEP_BASE na
+primeira abertura, ou com `python cep.py semear arquivo.csv`.
+
+O resolvedor é escolhido por CEP_RESOLVEDOR ("viacep" ou "stub"); o stub
+responde sem rede, para testes e desenvolvimento offline.
+"""
+import os
+import re
+import sys
+import csv
+import json
+import time
+import sqlite3
+import threading
+import urllib.request
+from collections import OrderedDict
+
+PASTA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+ARQUIVO_BANCO = os.environ.get("CEP_BANCO", os.path.join(PASTA, "cep.sqlite3"))
+ARQUIVO_BASE = os.environ.get("CEP_BASE", "")
+
+TAMANHO_LRU = int(os.environ.get("CEP_LRU", "5000"))
+TIMEOUT_RESOLVEDOR = float(os.environ.get("CEP_TIMEOUT", "3"))
+# CEP inexistente é lembrado por menos tempo (a base dos Correios muda)
+VALIDADE_NAO_ENCONTRADO = 24 * 3600
+
+CAMPOS = ("cep", "uf", "localidade", "logradouro", "bairro")
+
+_lru = OrderedDict()  # cep -> endereço (ou {} para CEP inexistente)
+_lock = threading.Lock()
+_local = threading.local()  # uma conexão SQLite por thread
+
+
+class ErroResolvedor(Exception):
+    """O serviço externo não respondeu (rede, timeout, erro HTTP)."""
+
+
+def normalizar(cep):
+    """'01310-100' -> '01310100' (None se não tiver 8 dígitos)."""
+    digitos = re.sub(r"\D", "", str(cep or ""))
+    return digitos if len(digitos) == 8 else None
+
+
+def _endereco(dados):
+    return {campo: str(dados.get(campo) or "") for campo in CAMPOS}
+
+
+# -----------------------------------------------------------------
+# Resolvedores externos
+# -----------------------------------------------------------------
+
+def resolver_viacep(cep):
+    """Endereço do CEP na ViaCEP; None se o CEP não existir."""
+    try:
+        with urllib.request.urlopen(f"https://viacep.com.br/ws/{cep}/json/", timeout=TIMEOUT_RESOLVEDOR) as resp:
+            dados = json.load(resp)
+    except Exception as e:
+        raise ErroResolvedor(str(e))
+    if dados.get("erro"):
+        return None
+    return _endereco(dict(dados, cep=cep))
+
+
+def resolver_stub(cep):
+    """Resposta fixa, sem rede. CEPs terminados em 000 são tratados como inexistentes."""
+    if cep.endswith("000"):
+        return None
+    return {"cep": cep, "uf": "SP", "localidade": "São Paulo", "logradouro": f"Rua Teste {cep[:5]}", "bairro": "Centro"}
+
+
+RESOLVEDORES = {"viacep": resolver_viacep, "stub": resolver_stub}
+
+_resolvedor = RESOLVEDORES.get(os.environ.get("CEP_RESOLVEDOR", "viacep"), resolver_viacep)
+
+
+def definir_resolvedor(funcao):
+    """Troca o resolvedor externo (função cep -> endereço ou None)."""
+    global _resolvedor
+    _resolvedor = funcao
+
+
+# -----------------------------------------------------------------
+# Cache em disco
+# -----------------------------------------------------------------
+
+def _conexao():
+    conexao = getattr(_local, "conexao", None)
+    if conexao is None:
+        os.makedirs(os.path.dirname(ARQUIVO_BANCO), exist_ok=True)
+        novo = not os.path.exists(ARQUIVO_BANCO)
+        conexao = sqlite3.connect(ARQUIVO_BANCO, timeout=5)
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute(
+            "CREATE TABLE IF NOT EXISTS ceps (cep TEXT PRIMARY KEY, dados TEXT, atualizado_em REAL)"
+        )
+        _local.conexao = conexao
+        if novo and ARQUIVO_BASE and os.path.isfile(ARQUIVO_BASE):
+            semear(ARQUIVO_BASE)
+    return conexao
+
+
+def _ler_disco(cep):
+    linha = _conexao().execute("SELECT dados, atualizado_em FROM ceps WHERE cep = ?", (cep,)).fetchone()
+    if linha is None:
+        return None
+    endereco = json.loads(linha[0]) if linha[0] else {}
+    if not endereco and time.time() - linha[1] > VALIDADE_NAO_ENCONTRADO:
+        return None
+    return endereco
+
+
+def _gravar_disco(cep, endereco):
+    conexao = _conexao()
+    with conexao:
+        conexao.execute(
+            "INSERT OR REPLACE INTO ceps (cep, dados, atualizado_em) VALUES (?, ?, ?)",
+            (cep, json.dumps(endereco, ensure_ascii=False) if endereco else "", time.time()),
+        )
+
+
+def semear(caminho):
+    """Carrega uma base de CEPs (CSV) no banco. Retorna quantos CEPs foram gravados."""
+    conexao = _conexao()
+    total = 0
+    agora = time.time()
+    with open(caminho, newline="", encoding="utf-8-sig") as f, conexao:
+        lote = []
+        for linha in csv.DictReader(f):
+            cep = normalizar(linha.get("cep"))
+            if not cep:
+                continue
+            lote.append((cep, json.dumps(_endereco(dict(linha, cep=cep)), ensure_ascii=False), agora))
+            if len(lote) >= 5000:
+                conexao.executemany("INSERT OR REPLACE INTO ceps VALUES (?, ?, ?)", lote)
+                total += len(lote)
+                lote = []
+        conexao.executemany("INSERT OR REPLACE INTO ceps VALUES (?, ?, ?)", lote)
+        total += len(lote)
+    return total
+
+
+# -----------------------------------------------------------------
+# Consulta
+# -----------------------------------------------------------------
+
+def _lembrar(cep, endereco):
+    with _lock:
+        _lru[cep] = endereco
+        _lru.move_to_end(cep)
+        while len(_lru) > TAMANHO_LRU:
+            _lru.popitem(last=False)
+
+
+def consultar(cep):
+    """
+    Endereço do CEP (dict com CAMPOS) ou None se o CEP não existir.
+    Lança ErroResolvedor se for preciso ir ao serviço externo e ele falhar.
+    """
+    with _lock:
+        if cep in _lru:
+            _lru.move_to_end(cep)
+            return _lru[cep] or None
+
+    try:
+        endereco = _ler_disco(cep)
+    except sqlite3.Error as e:
+        print(f"Erro ao ler cache de CEP: {e}")
+        endereco = None
+    if endereco is None:
+        endereco = _resolvedor(cep) or {}
+        try:
+            _gravar_disco(cep, endereco)
+        except sqlite3.Error as e:
+            print(f"Erro ao gravar cache de CEP: {e}")
+
+    _lembrar(cep, endereco)
+    return endereco or None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "semear":
+        print(f"{semear(sys.argv[2])} CEPs carregados em {ARQUIVO_BANCO}")
+    else:
+        print("Uso: python cep.py semear arquivo.csv")
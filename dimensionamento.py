@@ -0,0 +1,224 @@
+# dimensionamento.py
+"""
+Dimensionamento do sistema fotovoltaico a partir da conta de energia.
+
+Com o histórico de consumo mensal (kWh) e a localização do cliente
+(estado/município), calcula o kWp necessário:
+
+    kWp = (consumo médio − disponibilidade) / (HSP × 30 × DESEMPENHO)
+
+HSP são as horas de sol pleno médias do local (kWh/m²/dia): por estado,
+em HSP_ESTADOS, ou por município, se houver uma base em CSV (colunas
+uf, municipio, hsp) em DIMENSIONAMENTO_HSP. 'disponibilidade' é o
+consumo mínimo cobrado pela distribuidora, que a geração não compensa.
+
+classificar() compara todos os produtos do catálogo de uma vez (NumPy):
+geração estimada, cobertura do consumo, número de painéis e área de
+telhado, e ordena pelo melhor ajuste. As colunas do catálogo ficam em
+arrays reaproveitados enquanto o conteúdo da aba 'produtos' não muda:
+a aba é conferida a cada CATALOGO_TTL segundos (e na hora, se o portal
+gravar nela), e escritas em outras abas não remontam o catálogo.
+"""
+import os
+import csv
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+
+import numpy as np
+
+import sheets
+
+# Fração da geração teórica que chega ao consumo (perdas de inversor, cabos, calor, sujeira)
+DESEMPENHO = float(os.environ.get("DIMENSIONAMENTO_DESEMPENHO", "0.80"))
+# Área ocupada por painel, com espaçamento, quando o produto não informa espacoFisico
+AREA_POR_PAINEL = float(os.environ.get("DIMENSIONAMENTO_AREA_PAINEL", "2.7"))
+# Faltar geração pesa mais que sobrar: o cliente continua pagando a diferença
+PESO_FALTA = 2.0
+LIMITE_PADRAO = 10
+ARQUIVO_HSP = os.environ.get("DIMENSIONAMENTO_HSP", "")
+# Intervalo entre conferências da aba 'produtos' (editada só pela interface do Google)
+CATALOGO_TTL = int(os.environ.get("DIMENSIONAMENTO_CATALOGO_TTL", "300"))
+
+# Custo de disponibilidade (kWh/mês) por tipo de ligação
+DISPONIBILIDADE = {"mono": 30, "bi": 50, "tri": 100}
+
+# Média anual de horas de sol pleno no plano inclinado, por UF
+HSP_ESTADOS = {
+    "AC": 4.5, "AL": 5.4, "AM": 4.5, "AP": 4.8, "BA": 5.6, "CE": 5.6, "DF": 5.4,
+    "ES": 5.0, "GO": 5.4, "MA": 5.2, "MG": 5.4, "MS": 5.2, "MT": 5.2, "PA": 4.9,
+    "PB": 5.6, "PE": 5.6, "PI": 5.7, "PR": 4.7, "RJ": 5.0, "RN": 5.7, "RO": 4.7,
+    "RR": 4.9, "RS": 4.6, "SC": 4.5, "SE": 5.4, "SP": 4.9, "TO": 5.3,
+}
+HSP_PADRAO = 5.0
+
+_hsp_municipios = None
+_catalogo = {"versao": None, "assinatura": None, "conferido_em": 0.0, "dados": None}
+_lock = threading.Lock()
+
+
+class ErroDimensionamento(ValueError):
+    """Dados de consumo ou de local inválidos."""
+
+
+# -----------------------------------------------------------------
+# Local
+# -----------------------------------------------------------------
+
+def _chave_municipio(uf, municipio):
+    texto = unicodedata.normalize("NFKD", str(municipio or "")).encode("ascii", "ignore").decode()
+    return (str(uf or "").strip().upper(), " ".join(texto.lower().split()))
+
+
+def _carregar_municipios():
+    global _hsp_municipios
+    if _hsp_municipios is None:
+        tabela = {}
+        if ARQUIVO_HSP and os.path.isfile(ARQUIVO_HSP):
+            try:
+                with open(ARQUIVO_HSP, newline="", encoding="utf-8-sig") as f:
+                    for linha in csv.DictReader(f):
+                        try:
+                            tabela[_chave_municipio(linha.get("uf"), linha.get("municipio"))] = float(linha["hsp"])
+                        except (KeyError, TypeError, ValueError):
+                            continue
+            except OSError as e:
+                print(f"Erro ao ler base de HSP por município: {e}")
+        _hsp_municipios = tabela
+    return _hsp_municipios
+
+
+def hsp(estado, municipio=None):
+    """Horas de sol pleno do local: município (se houver base), senão estado, senão HSP_PADRAO."""
+    chave = _chave_municipio(estado, municipio)
+    if municipio and chave in _carregar_municipios():
+        return _hsp_municipios[chave]
+    return HSP_ESTADOS.get(chave[0], HSP_PADRAO)
+
+
+# -----------------------------------------------------------------
+# Consumo
+# -----------------------------------------------------------------
+
+def consumo_medio(consumos):
+    """Média dos meses informados (ignora vazios e zeros, comuns em contas com leitura estimada)."""
+    valores = np.asarray([c for c in consumos if c not in ("", None)], dtype=float)
+    valores = valores[valores > 0]
+    if valores.size == 0:
+        raise ErroDimensionamento("Informe o consumo de ao menos um mês.")
+    if valores.size > 24:
+        raise ErroDimensionamento("Informe no máximo 24 meses de consumo.")
+    return float(valores.mean())
+
+
+def kwp_necessario(consumo, hsp_local, ligacao="bi"):
+    """Potência (kWp) que gera o consumo compensável do mês."""
+    compensavel = max(consumo - DISPONIBILIDADE.get(ligacao, DISPONIBILIDADE["bi"]), 0.0)
+    return compensavel / (hsp_local * 30 * DESEMPENHO)
+
+
+# -----------------------------------------------------------------
+# Catálogo
+# -----------------------------------------------------------------
+
+def _numero(valor):
+    numero = sheets.converter_numero(valor)
+    return np.nan if numero is None else float(numero)
+
+
+def _montar_catalogo(produtos):
+    """Colunas numéricas do catálogo como arrays (NaN onde o campo falta)."""
+    produtos = [p for p in produtos if p.get("potencia") not in ("", None)]
+    colunas = {
+        campo: np.array([_numero(p.get(campo)) for p in produtos], dtype=float)
+        for campo in ("kwp", "wpPainel", "unidadePainel", "espacoFisico", "preco")
+    }
+    # Painéis: os informados no produto ou o mínimo para chegar ao kWp
+    paineis = np.where(
+        colunas["unidadePainel"] > 0,
+        colunas["unidadePainel"],
+        np.ceil(colunas["kwp"] * 1000 / np.where(colunas["wpPainel"] > 0, colunas["wpPainel"], np.nan)),
+    )
+    area = np.where(colunas["espacoFisico"] > 0, colunas["espacoFisico"], paineis * AREA_POR_PAINEL)
+    return {"produtos": produtos, "kwp": colunas["kwp"], "preco": colunas["preco"],
+            "paineis": paineis, "area": area}
+
+
+def catalogo():
+    """
+    Catálogo em arrays. A aba 'produtos' é relida a cada CATALOGO_TTL segundos
+    ou quando o portal grava nela (versao_aba); os arrays só são remontados
+    se o conteúdo mudou.
+    """
+    versao = sheets.versao_aba("produtos")
+    with _lock:
+        if (_catalogo["dados"] is not None and _catalogo["versao"] == versao
+                and time.monotonic() - _catalogo["conferido_em"] < CATALOGO_TTL):
+            return _catalogo["dados"]
+    produtos = sheets.listar_produtos()
+    assinatura = hashlib.sha1(json.dumps(produtos, sort_keys=True, default=str).encode()).hexdigest()
+    with _lock:
+        dados = _catalogo["dados"] if _catalogo["assinatura"] == assinatura else None
+    if dados is None:
+        dados = _montar_catalogo(produtos)
+    with _lock:
+        _catalogo.update(versao=versao, assinatura=assinatura, conferido_em=time.monotonic(), dados=dados)
+    return dados
+
+
+# -----------------------------------------------------------------
+# Classificação
+# -----------------------------------------------------------------
+
+def classificar(consumos, estado, municipio=None, ligacao="bi", area_disponivel=None,
+                limite=LIMITE_PADRAO, dados=None):
+    """
+    kWp necessário e os 'limite' produtos que melhor atendem. Ordem: cabem na
+    área disponível, menor desvio da cobertura ideal (100%), menor área, menor preço.
+    """
+    consumo = consumo_medio(consumos)
+    hsp_local = hsp(estado, municipio)
+    necessario = kwp_necessario(consumo, hsp_local, ligacao)
+    if necessario <= 0:
+        raise ErroDimensionamento("O consumo informado não passa do custo de disponibilidade.")
+    dados = dados or catalogo()
+
+    kwp, area, preco = dados["kwp"], dados["area"], dados["preco"]
+    validos = kwp > 0
+    geracao = kwp * hsp_local * 30 * DESEMPENHO
+    cobertura = kwp / necessario
+    desvio = np.where(cobertura >= 1, cobertura - 1, (1 - cobertura) * PESO_FALTA)
+    # Produto sem área conhecida não é descartado
+    cabe = np.ones_like(validos) if not area_disponivel else ~(area > area_disponivel)
+
+    # lexsort: a última chave é a principal; NaN vai para o fim
+    ordem = np.lexsort((np.nan_to_num(preco, nan=np.inf), np.nan_to_num(area, nan=np.inf),
+                        np.where(validos, desvio, np.inf), ~cabe, ~validos))
+    ordem = ordem[validos[ordem]][:limite]
+
+    def _ou_none(valor, casas=2):
+        return None if np.isnan(valor) else round(float(valor), casas)
+
+    ranking = []
+    for i in ordem:
+        produto = dados["produtos"][i]
+        ranking.append({
+            "potencia": produto.get("potencia"),
+            "pacote": produto.get("pacote"),
+            "inversor": produto.get("inversor"),
+            "kwp": _ou_none(kwp[i]),
+            "paineis": None if np.isnan(dados["paineis"][i]) else int(dados["paineis"][i]),
+            "area": _ou_none(area[i], 1),
+            "preco": _ou_none(preco[i]),
+            "geracao_mensal": round(float(geracao[i]), 1),
+            "cobertura": round(float(cobertura[i]) * 100, 1),
+            "cabe": bool(cabe[i]),
+        })
+    return {
+        "consumo_medio": round(consumo, 1),
+        "hsp": hsp_local,
+        "kwp_necessario": round(necessario, 2),
+        "produtos": ranking,
+    }
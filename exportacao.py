@@ -0,0 +1,259 @@
+# exportacao.py
+"""
+Exportação de clientes e oportunidades (relatórios do administrador).
+
+As linhas são lidas em páginas de PAGINA linhas (só as do proprietário,
+quando filtrado) e convertidas em tipos de verdade: valores como números
+e datacad/nascimento como datas, em vez das strings formatadas da
+planilha. A saída (CSV ou XLSX) é produzida por um gerador, então o
+download começa na hora e a memória usada não depende do tamanho da aba.
+
+O XLSX é montado direto no ZIP em streaming (mesma técnica do lote de
+propostas): a planilha usa strings inline e não precisa ser guardada
+inteira antes de ser enviada.
+"""
+import io
+import re
+import csv
+import math
+import zipfile
+from datetime import datetime, date
+from xml.sax.saxutils import escape
+
+import sheets
+from propostas import SaidaStream
+
+TABELAS = ("clientes", "oportunidades")
+FORMATOS = ("csv", "xlsx")
+PAGINA = 500
+# Linhas acumuladas antes de entregar um pedaço ao cliente
+LINHAS_POR_PEDACO = 200
+
+COLUNAS_NUMERICAS = {
+    "oportunidades": {"potencia", "valor", "kwp", "kw", "wppainel", "unidadepainel",
+                      "espacofisico", "preco", "juros", "valorparcela", "valorjuros",
+                      "finprazo", "fintaxa", "finentrada", "finparcela", "fintotal"},
+    "clientes": set(),
+}
+COLUNAS_DATA = {"datacad", "nascimento"}
+FORMATOS_DATA = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y"]
+
+
+# -----------------------------------------------------------------
+# Leitura e tipagem
+# -----------------------------------------------------------------
+
+def converter_data(valor):
+    """'2026-10-19 14:03:00' / '19/10/2026' -> datetime ou date (None se não for data)."""
+    texto = str(valor or "").strip()
+    for fmt in FORMATOS_DATA:
+        try:
+            convertida = datetime.strptime(texto, fmt)
+        except ValueError:
+            continue
+        return convertida if "%H" in fmt else convertida.date()
+    return None
+
+
+def tipar(nome_aba, registro):
+    """Converte os campos numéricos e de data do registro."""
+    numericas = COLUNAS_NUMERICAS.get(nome_aba, set())
+    tipado = {}
+    for coluna, valor in registro.items():
+        chave = (coluna or "").strip().lower()
+        if valor in ("", None):
+            tipado[coluna] = None
+        elif chave in numericas:
+            numero = sheets.converter_numero(valor)
+            tipado[coluna] = valor if numero is None else numero
+        elif chave in COLUNAS_DATA:
+            tipado[coluna] = converter_data(valor) or valor
+        else:
+            tipado[coluna] = valor
+    return tipado
+
+
+def _dia(valor):
+    return valor.date() if isinstance(valor, datetime) else valor
+
+
+def _paginas(nome_aba, proprietario):
+    if proprietario:
+        numeros = sheets.linhas_do_proprietario(nome_aba, proprietario)
+        for i in range(0, len(numeros), PAGINA):
+            yield numeros[i:i + PAGINA]
+        return
+    total = sheets.linhas_na_grade(nome_aba)
+    for inicio in range(2, total + 1, PAGINA):
+        yield list(range(inicio, min(inicio + PAGINA, total + 1)))
+
+
+def registros(nome_aba, proprietario=None, estado=None, de=None, ate=None):
+    """
+    Gera os registros tipados da aba que passam nos filtros.
+    'de' e 'ate' (date) valem sobre datacad, inclusive.
+    Oportunidades incluem as abas de arquivo.
+    """
+    where = {"proprietario": proprietario} if proprietario else None
+    estado = str(estado or "").strip().lower()
+    for aba, linhas in ((aba, linhas) for aba in sheets.abas_da_tabela(nome_aba)
+                        for linhas in _paginas(aba, proprietario)):
+        for registro in sheets.select(aba, where=where, linhas=linhas):
+            registro.pop("_linha", None)
+            if not any(str(v).strip() for v in registro.values()):
+                continue  # linha vazia no fim da grade
+            if estado and str(registro.get("estado", "")).strip().lower() != estado:
+                continue
+            tipado = tipar(nome_aba, registro)
+            if de or ate:
+                dia = _dia(tipado.get("datacad"))
+                if not isinstance(dia, date) or (de and dia < de) or (ate and dia > ate):
+                    continue
+            yield tipado
+
+
+def colunas(nome_aba):
+    return [h for h in sheets.cabecalho_aba(nome_aba) if h]
+
+
+# -----------------------------------------------------------------
+# CSV
+# -----------------------------------------------------------------
+
+# Texto começando com estes caracteres é lido pelo Excel como fórmula
+INICIO_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _texto_csv(valor):
+    if valor is None or (isinstance(valor, float) and not math.isfinite(valor)):
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    if isinstance(valor, datetime):
+        return valor.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        # Nome/email digitados pelo vendedor: o apóstrofo faz o Excel tratar como texto
+        return "'" + valor
+    return valor
+
+
+def gerar_csv(cabecalho, linhas):
+    """CSV (UTF-8 com BOM, para o Excel reconhecer os acentos) em pedaços."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write("\ufeff")
+    escritor.writerow(cabecalho)
+    for n, registro in enumerate(linhas, start=1):
+        escritor.writerow([_texto_csv(registro.get(c)) for c in cabecalho])
+        if n % LINHAS_POR_PEDACO == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+# -----------------------------------------------------------------
+# XLSX
+# -----------------------------------------------------------------
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>"""
+
+_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{nome}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+
+# Estilos: 0 = padrão, 1 = data (dd/mm/aaaa), 2 = data e hora
+_ESTILOS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<numFmts count="2"><numFmt numFmtId="164" formatCode="dd/mm/yyyy"/><numFmt numFmtId="165" formatCode="dd/mm/yyyy hh:mm:ss"/></numFmts>
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="3">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+</cellXfs>
+</styleSheet>"""
+
+_EPOCA_EXCEL = datetime(1899, 12, 30)
+_CARACTERES_INVALIDOS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _celula(valor):
+    if valor is None:
+        return "<c/>"
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        if not math.isfinite(valor):
+            # "nan"/"inf" em <v> deixam o arquivo inválido para o Excel
+            return "<c/>"
+        return f"<c><v>{valor!r}</v></c>"
+    if isinstance(valor, datetime):
+        serial = (valor - _EPOCA_EXCEL).total_seconds() / 86400
+        return f'<c s="2"><v>{serial!r}</v></c>'
+    if isinstance(valor, date):
+        return f'<c s="1"><v>{(valor - _EPOCA_EXCEL.date()).days}</v></c>'
+    # Texto sempre como inlineStr: o Excel não avalia "=..." de uma célula de texto
+    texto = escape(_CARACTERES_INVALIDOS.sub("", str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _linha_xml(valores):
+    return "<row>" + "".join(_celula(v) for v in valores) + "</row>"
+
+
+def gerar_xlsx(nome_planilha, cabecalho, linhas):
+    """Arquivo XLSX (uma planilha) produzido em pedaços."""
+    saida = SaidaStream()
+    with zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK.format(nome=escape(nome_planilha[:31])))
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        zf.writestr("xl/styles.xml", _ESTILOS)
+        yield saida.extrair()
+
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as planilha:
+            planilha.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            planilha.write(_linha_xml(cabecalho).encode("utf-8"))
+            for n, registro in enumerate(linhas, start=1):
+                planilha.write(_linha_xml([registro.get(c) for c in cabecalho]).encode("utf-8"))
+                if n % LINHAS_POR_PEDACO == 0:
+                    yield saida.extrair()
+            planilha.write(b"</sheetData></worksheet>")
+    yield saida.extrair()
+
+
+def exportar(nome_aba, formato, **filtros):
+    """Gerador com o conteúdo do arquivo exportado."""
+    cabecalho = colunas(nome_aba)
+    linhas = registros(nome_aba, **filtros)
+    if formato == "xlsx":
+        return gerar_xlsx(nome_aba, cabecalho, linhas)
+    return gerar_csv(cabecalho, linhas)
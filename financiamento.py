@@ -0,0 +1,135 @@
+# financiamento.py
+"""
+Simulação de financiamento das propostas (tabela Price e SAC).
+
+simular() calcula, em uma única passada vetorizada (NumPy), todas as
+combinações prazo x taxa x entrada para um valor: parcela inicial e
+final, total pago e total de juros. A grade inteira de uma proposta
+(algumas centenas de cenários) sai em bem menos de 1 ms, então o
+simulador da página pode recalcular a cada mudança sem custo.
+
+Taxas em % ao mês e entradas em % do valor.
+"""
+import os
+import math
+
+import numpy as np
+
+SISTEMAS = ("price", "sac")
+
+
+def _lista(texto, tipo=float):
+    return [tipo(v) for v in texto.split(",") if v.strip()]
+
+
+PRAZOS_PADRAO = _lista(os.environ.get("FINANCIAMENTO_PRAZOS", "12,24,36,48,60,72,84"), int)
+TAXAS_PADRAO = _lista(os.environ.get("FINANCIAMENTO_TAXAS", "0.99,1.29,1.49,1.79,1.99,2.49"))
+ENTRADAS_PADRAO = _lista(os.environ.get("FINANCIAMENTO_ENTRADAS", "0,10,20,30,40,50"))
+
+# Limites da grade pedida pela API
+PRAZO_MAXIMO = 420
+TAXA_MAXIMA = 10.0
+MAX_CENARIOS = 50000
+
+
+class ErroSimulacao(ValueError):
+    """Parâmetros fora dos limites aceitos."""
+
+
+def validar(valor, prazos, taxas, entradas, sistema):
+    if sistema not in SISTEMAS:
+        raise ErroSimulacao("Sistema de amortização inválido (use price ou sac).")
+    # float("nan") e float("inf") passam nas comparações abaixo e virariam NaN/Infinity no JSON
+    if not all(math.isfinite(v) for v in [valor or 0, *(prazos or ()), *(taxas or ()), *(entradas or ())]):
+        raise ErroSimulacao("Informe apenas valores numéricos finitos.")
+    if not valor or valor <= 0:
+        raise ErroSimulacao("Informe um valor maior que zero.")
+    if not prazos or not taxas or not entradas:
+        raise ErroSimulacao("Informe ao menos um prazo, uma taxa e uma entrada.")
+    if any(p < 1 or p > PRAZO_MAXIMO for p in prazos):
+        raise ErroSimulacao(f"Prazos devem estar entre 1 e {PRAZO_MAXIMO} meses.")
+    if any(t < 0 or t > TAXA_MAXIMA for t in taxas):
+        raise ErroSimulacao(f"Taxas devem estar entre 0 e {TAXA_MAXIMA:g}% ao mês.")
+    if any(e < 0 or e >= 100 for e in entradas):
+        raise ErroSimulacao("Entradas devem estar entre 0 e 100% (exclusive).")
+    if len(prazos) * len(taxas) * len(entradas) > MAX_CENARIOS:
+        raise ErroSimulacao("Combinações demais em uma simulação.")
+
+
+def simular(valor, prazos=None, taxas=None, entradas=None, sistema="price"):
+    """
+    Grade de cenários. Retorna um dict com os eixos (prazos, taxas,
+    entradas) e matrizes [entrada][taxa][prazo] de parcela_inicial,
+    parcela_final, total (entrada + parcelas) e juros.
+    """
+    prazos = PRAZOS_PADRAO if prazos is None else prazos
+    taxas = TAXAS_PADRAO if taxas is None else taxas
+    entradas = ENTRADAS_PADRAO if entradas is None else entradas
+    validar(valor, prazos, taxas, entradas, sistema)
+
+    # Eixos em broadcast: entrada (E,1,1) x taxa (1,T,1) x prazo (1,1,P)
+    n = np.asarray(prazos, dtype=float)[None, None, :]
+    i = (np.asarray(taxas, dtype=float) / 100)[None, :, None]
+    entrada = valor * np.asarray(entradas, dtype=float)[:, None, None] / 100
+    principal = valor - entrada
+
+    if sistema == "price":
+        # PMT = P·i / (1 − (1+i)^−n); com taxa zero, P/n
+        fator = np.where(i > 0, i / (1 - (1 + i) ** -n + (i == 0)), 1 / n)
+        parcela = principal * fator
+        parcela_inicial = parcela_final = parcela
+        pago = parcela * n
+    else:
+        # Amortização constante P/n; juros sobre o saldo devedor
+        amortizacao = principal / n
+        parcela_inicial = amortizacao + principal * i
+        parcela_final = amortizacao * (1 + i)
+        pago = principal + principal * i * (n + 1) / 2
+
+    formato = (len(entradas), len(taxas), len(prazos))
+    return {
+        "sistema": sistema,
+        "valor": round(float(valor), 2),
+        "prazos": [int(p) for p in prazos],
+        "taxas": [float(t) for t in taxas],
+        "entradas": [float(e) for e in entradas],
+        "parcela_inicial": np.round(np.broadcast_to(parcela_inicial, formato), 2).tolist(),
+        "parcela_final": np.round(np.broadcast_to(parcela_final, formato), 2).tolist(),
+        "total": np.round(np.broadcast_to(pago + entrada, formato), 2).tolist(),
+        "juros": np.round(np.broadcast_to(pago - principal, formato), 2).tolist(),
+    }
+
+
+def cenario(valor, prazo, taxa, entrada=0.0, sistema="price"):
+    """Resumo de um cenário escolhido (gravado na oportunidade)."""
+    grade = simular(valor, [prazo], [taxa], [entrada], sistema)
+    return {
+        "sistema": sistema,
+        "prazo": int(prazo),
+        "taxa": float(taxa),
+        "entrada": round(valor * entrada / 100, 2),
+        "parcela": grade["parcela_inicial"][0][0][0],
+        "total": grade["total"][0][0][0],
+    }
+
+
+def cenario_do_formulario(valor, campos):
+    """
+    Cenário enviado pelo simulador (campos fin_prazo, fin_taxa, fin_entrada e
+    fin_sistema), recalculado sobre 'valor' (número, preço do produto). Só
+    aceita as condições padrão; None se não houver escolha válida.
+    """
+    if valor is None:
+        return None
+    try:
+        prazo = int(campos.get("fin_prazo") or 0)
+        taxa = float(campos.get("fin_taxa") or 0)
+        entrada = float(campos.get("fin_entrada") or 0)
+    except (TypeError, ValueError):
+        return None
+    if prazo not in PRAZOS_PADRAO or taxa not in TAXAS_PADRAO or entrada not in ENTRADAS_PADRAO:
+        return None
+    try:
+        return cenario(float(valor), prazo, taxa, entrada, campos.get("fin_sistema", "price"))
+    except ErroSimulacao:
+        return None
@@ -0,0 +1,634 @@
+# google_falso.py
+"""
+Google Sheets e Drive falsos, para testes de carga sem a planilha de produção
+(ver carga.py).
+
+O servidor guarda as planilhas e os arquivos em memória e atende, por HTTP
+local, as operações que sheets.py usa (values.batchGet, append, batchUpdate,
+metadados, files.get/list/create). Cada chamada pode ter:
+  - latência (LATENCIA + até JITTER segundos; uploads também pagam
+    tamanho / BANDA);
+  - erro aleatório (503) com probabilidade ERROS;
+  - limite por minuto de leituras e de escritas (429, como a cota do Sheets).
+
+Do lado da aplicação, instalar() troca gspread.authorize,
+ServiceAccountCredentials e googleapiclient.discovery.build por clientes
+que falam com este servidor. O gunicorn carrega a aplicação assim com:
+
+    GOOGLE_FALSO_URL=http://127.0.0.1:8765 gunicorn "google_falso:criar_app()"
+
+Uso do servidor:
+    python google_falso.py servir [--porta 8765] [--latencia 0.08] [--jitter 0.04]
+        [--erros 0] [--cota-leitura 0] [--cota-escrita 0] [--banda 10]
+        [--vendedores 10] [--clientes 200] [--oportunidades 100]
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import http.client
+from collections import deque
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PLANILHA_CARGA = "planilha-carga"
+SENHA_CARGA = "carga-123"
+
+CABECALHOS = {
+    "usuarios": ["id", "codigo", "email", "senha", "ativo", "nome", "sobrenome", "cidade", "telefone", "acesso"],
+    "clientes": ["id", "codigo", "nome", "cpf", "nascimento", "email", "telefone", "proprietario",
+                 "datacad", "cep", "estado", "municipio", "logradouro", "numero"],
+    "oportunidades": ["id", "codigo", "nome", "email", "descricao", "potencia", "valor", "proprietario",
+                      "datacad", "cliente_id", "documento", "comprovante", "estado", "pacote", "kwp", "kw",
+                      "inversor", "wpPainel", "unidadePainel", "espacoFisico", "preco", "juros",
+                      "valorParcela", "valorJuros", "finSistema", "finPrazo", "finTaxa", "finEntrada",
+                      "finParcela", "finTotal"],
+    "produtos": ["potencia", "pacote", "kwp", "kw", "inversor", "wpPainel", "unidadePainel",
+                 "espacoFisico", "preco", "juros", "valorParcela", "valorJuros"],
+}
+# Linhas vazias no fim da grade, como numa planilha de verdade
+FOLGA_GRADE = 50
+CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+
+class ErroGoogleFalso(Exception):
+    """Resposta de erro do servidor falso (503, 429, 404...)."""
+
+
+# -----------------------------------------------------------------
+# Conversões A1
+# -----------------------------------------------------------------
+
+def _indice_coluna(letras):
+    indice = 0
+    for c in letras:
+        indice = indice * 26 + ord(c) - 64
+    return indice - 1
+
+
+def _letra_coluna(indice):
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _intervalo(a1):
+    """"'aba'!A2:C9" -> (aba, linha1, coluna1, linha2, coluna2); extremos abertos são None."""
+    aba, _, ref = a1.rpartition("!") if "!" in a1 else (a1, "", "")
+    aba = aba.strip("'")
+    if not ref:
+        return aba, 1, 0, None, None
+    m = re.fullmatch(r"([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?", ref)
+    if not m:
+        raise ErroGoogleFalso(f"400 Intervalo inválido: {a1}")
+    c1, l1, c2, l2 = m.groups()
+    if ":" not in ref:
+        c2, l2 = c1, l1
+    return (aba, int(l1) if l1 else 1, _indice_coluna(c1) if c1 else 0,
+            int(l2) if l2 else None, _indice_coluna(c2) if c2 else None)
+
+
+def _texto(valor):
+    """Valor gravado -> texto exibido (FORMATTED_VALUE)."""
+    if valor is None:
+        return ""
+    if isinstance(valor, bool):
+        return "TRUE" if valor else "FALSE"
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def _aparar(linhas):
+    """Remove células vazias do fim de cada linha e linhas vazias do fim (como a API)."""
+    linhas = [list(l) for l in linhas]
+    for linha in linhas:
+        while linha and linha[-1] == "":
+            linha.pop()
+    while linhas and not linhas[-1]:
+        linhas.pop()
+    return linhas
+
+
+# -----------------------------------------------------------------
+# Servidor
+# -----------------------------------------------------------------
+
+class Backend:
+    """Estado do Google falso: planilhas, arquivos do Drive, cotas e falhas."""
+
+    def __init__(self, latencia=0.08, jitter=0.04, erros=0.0, cota_leitura=0, cota_escrita=0, banda=10.0):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.erros = erros
+        self.cotas = {"leitura": cota_leitura, "escrita": cota_escrita}
+        self.banda = banda * 1024 * 1024
+        self.planilhas = {}  # id -> {"abas": {titulo: {"id", "linhas"}}, "modificada"}
+        self.arquivos = {}   # id -> {"nome", "pais", "propriedades", "trashed"}
+        self.janelas = {"leitura": deque(), "escrita": deque()}
+        self.contagem = {}
+        self.lock = threading.Lock()
+        self.sessoes = []
+
+    # Falhas, cotas e latência ------------------------------------
+
+    def _cobrar(self, tipo, bytes_enviados=0):
+        time.sleep(self.latencia + random.uniform(0, self.jitter) + bytes_enviados / self.banda)
+        if self.erros and random.random() < self.erros:
+            raise ErroGoogleFalso("503 backendError (falha simulada)")
+        limite = self.cotas.get(tipo)
+        if not limite:
+            return
+        agora = time.monotonic()
+        with self.lock:
+            janela = self.janelas[tipo]
+            while janela and agora - janela[0] > 60:
+                janela.popleft()
+            if len(janela) >= limite:
+                raise ErroGoogleFalso(f"429 RESOURCE_EXHAUSTED: cota de {tipo} por minuto")
+            janela.append(agora)
+
+    # Planilhas ---------------------------------------------------
+
+    def _planilha(self, planilha_id):
+        if planilha_id not in self.planilhas:
+            raise ErroGoogleFalso(f"404 Planilha não encontrada: {planilha_id}")
+        return self.planilhas[planilha_id]
+
+    def _aba(self, planilha_id, titulo):
+        abas = self._planilha(planilha_id)["abas"]
+        if titulo not in abas:
+            raise ErroGoogleFalso(f"404 WorksheetNotFound: {titulo}")
+        return abas[titulo]
+
+    def _modificar(self, planilha_id):
+        self.planilhas[planilha_id]["modificada"] = datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+    def criar_planilha(self, planilha_id, abas):
+        self.planilhas[planilha_id] = {"abas": {}, "modificada": ""}
+        for titulo, linhas in abas.items():
+            self._nova_aba(planilha_id, titulo, linhas)
+        self._modificar(planilha_id)
+
+    def _nova_aba(self, planilha_id, titulo, linhas=()):
+        abas = self.planilhas[planilha_id]["abas"]
+        abas[titulo] = {"id": len(abas) + 1, "linhas": [[_texto(v) for v in l] for l in linhas]}
+        return abas[titulo]
+
+    def op_aba(self, planilha, titulo):
+        self._cobrar("leitura")
+        with self.lock:
+            return {"id": self._aba(planilha, titulo)["id"]}
+
+    def op_metadados(self, planilha):
+        self._cobrar("leitura")
+        with self.lock:
+            abas = self._planilha(planilha)["abas"]
+            return {"sheets": [
+                {"properties": {"title": titulo, "sheetId": aba["id"], "gridProperties": {
+                    "rowCount": len(aba["linhas"]) + FOLGA_GRADE,
+                    "columnCount": max((len(l) for l in aba["linhas"]), default=0),
+                }}}
+                for titulo, aba in abas.items()
+            ]}
+
+    def op_ler(self, planilha, intervalos):
+        self._cobrar("leitura")
+        faixas = []
+        with self.lock:
+            for a1 in intervalos:
+                titulo, l1, c1, l2, c2 = _intervalo(a1)
+                linhas = self._aba(planilha, titulo)["linhas"]
+                trecho = linhas[l1 - 1:l2 if l2 is not None else len(linhas)]
+                valores = [l[c1:(c2 + 1) if c2 is not None else len(l)] for l in trecho]
+                faixa = {"range": a1, "majorDimension": "ROWS"}
+                valores = _aparar(valores)
+                if valores:
+                    faixa["values"] = valores
+                faixas.append(faixa)
+        return {"spreadsheetId": planilha, "valueRanges": faixas}
+
+    def op_anexar(self, planilha, titulo, linhas):
+        self._cobrar("escrita")
+        with self.lock:
+            aba = self._aba(planilha, titulo)
+            dados = aba["linhas"]
+            while dados and not any(dados[-1]):
+                dados.pop()
+            primeira = len(dados) + 1
+            dados.extend([_texto(v) for v in linha] for linha in linhas)
+            self._modificar(planilha)
+        largura = max((len(l) for l in linhas), default=1)
+        return {"updates": {"updatedRange": f"'{titulo}'!A{primeira}:{_letra_coluna(largura - 1)}{primeira + len(linhas) - 1}"}}
+
+    def op_atualizar(self, planilha, dados):
+        self._cobrar("escrita")
+        with self.lock:
+            for item in dados:
+                titulo, l1, c1, _, _ = _intervalo(item["range"])
+                linhas = self._aba(planilha, titulo)["linhas"]
+                for dl, valores in enumerate(item["values"]):
+                    while len(linhas) < l1 + dl:
+                        linhas.append([])
+                    linha = linhas[l1 + dl - 1]
+                    for dc, valor in enumerate(valores):
+                        while len(linha) <= c1 + dc:
+                            linha.append("")
+                        linha[c1 + dc] = _texto(valor)
+            self._modificar(planilha)
+        return {"totalUpdatedCells": sum(len(v) for d in dados for v in d["values"])}
+
+    def op_lote(self, planilha, pedidos):
+        self._cobrar("escrita")
+        with self.lock:
+            abas = self._planilha(planilha)["abas"]
+            for pedido in pedidos:
+                faixa = pedido["deleteDimension"]["range"]
+                aba = next(a for a in abas.values() if a["id"] == faixa["sheetId"])
+                del aba["linhas"][faixa["startIndex"]:faixa["endIndex"]]
+            self._modificar(planilha)
+        return {}
+
+    def op_nova_aba(self, planilha, titulo):
+        self._cobrar("escrita")
+        with self.lock:
+            aba = self._nova_aba(planilha, titulo)
+            self._modificar(planilha)
+            return {"id": aba["id"]}
+
+    # Drive -------------------------------------------------------
+
+    def op_arquivo(self, arquivo):
+        self._cobrar("leitura")
+        with self.lock:
+            if arquivo in self.planilhas:
+                return {"id": arquivo, "modifiedTime": self.planilhas[arquivo]["modificada"]}
+            if arquivo not in self.arquivos:
+                raise ErroGoogleFalso(f"404 File not found: {arquivo}")
+            return {"id": arquivo, "trashed": self.arquivos[arquivo]["trashed"]}
+
+    def op_enviar(self, nome, pais, propriedades, tamanho):
+        self._cobrar("escrita", tamanho)
+        with self.lock:
+            arquivo = f"arquivo-{len(self.arquivos) + 1:07d}"
+            self.arquivos[arquivo] = {"nome": nome, "pais": pais or [], "propriedades": propriedades or {},
+                                      "trashed": False}
+        return {"id": arquivo}
+
+    def op_permissao(self, arquivo):
+        self._cobrar("escrita")
+        return {"id": "anyoneWithLink"}
+
+    def op_buscar(self, consulta):
+        self._cobrar("leitura")
+        propriedade = re.search(r"key='([^']*)' and value='([^']*)'", consulta)
+        pasta = re.search(r"'([^']*)' in parents", consulta)
+        with self.lock:
+            for arquivo, dados in self.arquivos.items():
+                if dados["trashed"]:
+                    continue
+                if propriedade and dados["propriedades"].get(propriedade.group(1)) != propriedade.group(2):
+                    continue
+                if pasta and pasta.group(1) not in dados["pais"]:
+                    continue
+                return {"files": [{"id": arquivo}]}
+        return {"files": []}
+
+    def executar(self, op, argumentos):
+        metodo = getattr(self, f"op_{op}", None)
+        if metodo is None:
+            raise ErroGoogleFalso(f"400 Operação desconhecida: {op}")
+        with self.lock:
+            self.contagem[op] = self.contagem.get(op, 0) + 1
+        return metodo(**argumentos)
+
+
+# -----------------------------------------------------------------
+# Dados iniciais
+# -----------------------------------------------------------------
+
+def _ulid(ms):
+    aleatorio = random.getrandbits(80)
+    texto = ""
+    for numero, tamanho in ((ms, 10), (aleatorio, 16)):
+        parte = ""
+        for _ in range(tamanho):
+            numero, resto = divmod(numero, 32)
+            parte = CROCKFORD[resto] + parte
+        texto += parte
+    return texto
+
+
+def semear(backend, vendedores=10, clientes=200, oportunidades=100):
+    """
+    Planilha com 'vendedores' usuários ativos e, para cada um, 'clientes'
+    clientes e 'oportunidades' oportunidades. Os ids são ULIDs em ordem
+    crescente, como os gerados pela aplicação. Preenche backend.sessoes
+    com o que o gerador de carga precisa (login e ids de cada vendedor).
+    """
+    import senhas
+
+    ms = int(time.time() * 1000) - 10_000_000
+    hoje = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    senha_hash = senhas._gerar(SENHA_CARGA, senhas.METODO, senhas.TAMANHO_SALT)
+    produtos = [
+        [str(p), f"Kit {p} kWh", kwp, kwp * 0.8, "Inversor X", 550, max(int(kwp * 1000 / 550), 1),
+         max(int(kwp * 1000 / 550), 1) * 2.7, round(kwp * 3800, 2), 10, round(kwp * 380, 2), 0]
+        for p, kwp in ((300, 2.75), (500, 4.4), (800, 7.15), (1000, 8.8), (1500, 13.2), (2000, 17.6))
+    ]
+    usuarios, lista_clientes, lista_opps = [], [], []
+    for v in range(vendedores):
+        ms += 1
+        vendedor = _ulid(ms)
+        email = f"vendedor{v}@carga.local"
+        usuarios.append([vendedor, f"USU-{v:05d}", email, senha_hash, True, f"Vendedor {v}", "Carga",
+                         "Caraúbas", "84999990000", "Vendedor"])
+        backend.sessoes.append({"email": email, "senha": SENHA_CARGA, "clientes": [], "oportunidades": []})
+
+    # Intercalados, como numa planilha real com vários vendedores ativos
+    for i in range(clientes * vendedores):
+        ms += 1
+        v = i % vendedores
+        cliente = _ulid(ms)
+        lista_clientes.append([cliente, f"CLI-{i:07d}", f"Cliente {i}", f"{i:011d}", "1980-01-01",
+                               f"cliente{i}@carga.local", "84988880000", usuarios[v][0], hoje, "59780000",
+                               "RN", "Caraúbas", "Rua da Carga", str(i)])
+        backend.sessoes[v]["clientes"].append(cliente)
+    for i in range(oportunidades * vendedores):
+        ms += 1
+        v = i % vendedores
+        produto = produtos[i % len(produtos)]
+        opp = _ulid(ms)
+        cliente = backend.sessoes[v]["clientes"][(i // vendedores) % max(clientes, 1)] if clientes else ""
+        lista_opps.append([opp, f"OPO-{i:07d}", f"Cliente {i}", f"cliente{i}@carga.local", "", produto[0],
+                           produto[8], usuarios[v][0], hoje, cliente, "", "", "Criado"] + produto[1:])
+        backend.sessoes[v]["oportunidades"].append(opp)
+
+    backend.criar_planilha(PLANILHA_CARGA, {
+        "usuarios": [CABECALHOS["usuarios"]] + usuarios,
+        "clientes": [CABECALHOS["clientes"]] + lista_clientes,
+        "oportunidades": [CABECALHOS["oportunidades"]] + lista_opps,
+        "produtos": [CABECALHOS["produtos"]] + produtos,
+    })
+
+
+class _Tratador(BaseHTTPRequestHandler):
+    backend = None
+    protocol_version = "HTTP/1.1"
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        if self.path == "/saude":
+            self._responder(200, {"ok": True})
+        elif self.path == "/sessoes":
+            self._responder(200, self.backend.sessoes)
+        elif self.path == "/estatisticas":
+            self._responder(200, self.backend.contagem)
+        else:
+            self._responder(404, {"erro": "não encontrado"})
+
+    def do_POST(self):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        try:
+            pedido = json.loads(self.rfile.read(tamanho) or b"{}")
+            self._responder(200, {"resultado": self.backend.executar(pedido["op"], pedido.get("args", {}))})
+        except ErroGoogleFalso as e:
+            status = int(str(e)[:3]) if str(e)[:3].isdigit() else 500
+            self._responder(status, {"erro": str(e)})
+        except Exception as e:
+            self._responder(500, {"erro": f"500 {e}"})
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def servir(porta, backend):
+    _Tratador.backend = backend
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), _Tratador)
+    servidor.daemon_threads = True
+    print(f"Google falso em http://127.0.0.1:{porta}", flush=True)
+    servidor.serve_forever()
+
+
+# -----------------------------------------------------------------
+# Clientes usados pela aplicação (substituem gspread e o Drive)
+# -----------------------------------------------------------------
+
+class _Conexao:
+    """Chamadas ao servidor falso; uma conexão HTTP persistente por thread."""
+
+    def __init__(self, url):
+        endereco = urlparse(url)
+        self.host, self.porta = endereco.hostname, endereco.port
+        self.local = threading.local()
+
+    def chamar(self, op, **argumentos):
+        corpo = json.dumps({"op": op, "args": argumentos})
+        for tentativa in range(2):
+            conexao = getattr(self.local, "conexao", None)
+            if conexao is None:
+                conexao = self.local.conexao = http.client.HTTPConnection(self.host, self.porta, timeout=120)
+            try:
+                conexao.request("POST", "/rpc", corpo, {"Content-Type": "application/json"})
+                resposta = conexao.getresponse()
+                dados = json.loads(resposta.read() or b"{}")
+                break
+            except (http.client.HTTPException, OSError):
+                conexao.close()
+                self.local.conexao = None
+                if tentativa:
+                    raise
+        if resposta.status != 200:
+            raise ErroGoogleFalso(dados.get("erro") or f"{resposta.status}")
+        return dados["resultado"]
+
+
+class _Celula:
+    def __init__(self, valor):
+        self.value = valor
+
+
+class _Aba:
+    def __init__(self, conexao, planilha, titulo, aba_id):
+        self._conexao, self._planilha = conexao, planilha
+        self.title, self.id = titulo, aba_id
+
+    def _faixa(self, a1):
+        resposta = self._conexao.chamar("ler", planilha=self._planilha, intervalos=[f"'{self.title}'!{a1}"])
+        return resposta["valueRanges"][0].get("values", [])
+
+    def get_all_values(self):
+        # O gspread devolve a grade retangular
+        valores = self._conexao.chamar("ler", planilha=self._planilha,
+                                       intervalos=[f"'{self.title}'"])["valueRanges"][0].get("values", [])
+        largura = max((len(l) for l in valores), default=0)
+        return [l + [""] * (largura - len(l)) for l in valores]
+
+    def get_all_records(self):
+        from gspread.utils import numericise_all
+        valores = self.get_all_values()
+        if not valores:
+            return []
+        return [dict(zip(valores[0], numericise_all(l))) for l in valores[1:]]
+
+    def row_values(self, linha):
+        valores = self._faixa(f"{linha}:{linha}")
+        return valores[0] if valores else []
+
+    def col_values(self, coluna):
+        letra = _letra_coluna(coluna - 1)
+        return [l[0] if l else "" for l in self._faixa(f"{letra}1:{letra}")]
+
+    def cell(self, linha, coluna):
+        letra = _letra_coluna(coluna - 1)
+        valores = self._faixa(f"{letra}{linha}")
+        return _Celula(valores[0][0] if valores and valores[0] else "")
+
+    def append_row(self, valores, value_input_option="RAW", **_):
+        return self.append_rows([valores], value_input_option)
+
+    def append_rows(self, valores, value_input_option="RAW", **_):
+        return self._conexao.chamar("anexar", planilha=self._planilha, titulo=self.title,
+                                    linhas=[list(l) for l in valores])
+
+
+class _Planilha:
+    def __init__(self, conexao, planilha_id):
+        self._conexao = conexao
+        self.id = planilha_id
+
+    def worksheet(self, titulo):
+        try:
+            aba = self._conexao.chamar("aba", planilha=self.id, titulo=titulo)
+        except ErroGoogleFalso as e:
+            raise LookupError(str(e))
+        return _Aba(self._conexao, self.id, titulo, aba["id"])
+
+    def fetch_sheet_metadata(self, params=None):
+        return self._conexao.chamar("metadados", planilha=self.id)
+
+    def values_batch_get(self, ranges, params=None):
+        return self._conexao.chamar("ler", planilha=self.id, intervalos=list(ranges))
+
+    def values_batch_update(self, body):
+        return self._conexao.chamar("atualizar", planilha=self.id, dados=body.get("data", []))
+
+    def batch_update(self, body):
+        return self._conexao.chamar("lote", planilha=self.id, pedidos=body.get("requests", []))
+
+    def add_worksheet(self, title, rows=1, cols=1, **_):
+        aba = self._conexao.chamar("nova_aba", planilha=self.id, titulo=title)
+        return _Aba(self._conexao, self.id, title, aba["id"])
+
+
+class _Cliente:
+    def __init__(self, conexao):
+        self._conexao = conexao
+
+    def open_by_key(self, planilha_id):
+        return _Planilha(self._conexao, planilha_id)
+
+
+class _Execucao:
+    def __init__(self, funcao):
+        self._funcao = funcao
+
+    def execute(self):
+        return self._funcao()
+
+
+class _Arquivos:
+    def __init__(self, conexao):
+        self._conexao = conexao
+
+    def get(self, fileId, fields=None):
+        return _Execucao(lambda: self._conexao.chamar("arquivo", arquivo=fileId))
+
+    def list(self, q="", fields=None, pageSize=None):
+        return _Execucao(lambda: self._conexao.chamar("buscar", consulta=q))
+
+    def create(self, body=None, media_body=None, fields=None):
+        tamanho = media_body.size() if media_body is not None and hasattr(media_body, "size") else 0
+        body = body or {}
+        return _Execucao(lambda: self._conexao.chamar(
+            "enviar", nome=body.get("name", ""), pais=body.get("parents"),
+            propriedades=body.get("appProperties"), tamanho=tamanho or 0,
+        ))
+
+
+class _Permissoes:
+    def __init__(self, conexao):
+        self._conexao = conexao
+
+    def create(self, fileId, body=None, **_):
+        return _Execucao(lambda: self._conexao.chamar("permissao", arquivo=fileId))
+
+
+class _Drive:
+    def __init__(self, conexao):
+        self._conexao = conexao
+
+    def files(self):
+        return _Arquivos(self._conexao)
+
+    def permissions(self):
+        return _Permissoes(self._conexao)
+
+
+def instalar(url):
+    """Faz gspread, oauth2client e googleapiclient usarem o servidor falso em 'url'."""
+    import gspread
+    import googleapiclient.discovery
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    conexao = _Conexao(url)
+    gspread.authorize = lambda credenciais: _Cliente(conexao)
+    ServiceAccountCredentials.from_json_keyfile_dict = staticmethod(lambda *args, **kwargs: None)
+    googleapiclient.discovery.build = lambda *args, **kwargs: _Drive(conexao)
+
+
+def criar_app():
+    """Fábrica para o gunicorn: a aplicação real, falando com o Google falso."""
+    instalar(os.environ["GOOGLE_FALSO_URL"])
+    os.environ.setdefault("GOOGLE_CREDS_ADM", "{}")
+    os.environ.setdefault("PLANILHA_ADM_ID", PLANILHA_CARGA)
+    from app import app
+    return app
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "servir":
+        print(__doc__)
+        sys.exit(1)
+    parser = argparse.ArgumentParser(prog="google_falso.py servir")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--latencia", type=float, default=0.08)
+    parser.add_argument("--jitter", type=float, default=0.04)
+    parser.add_argument("--erros", type=float, default=0.0)
+    parser.add_argument("--cota-leitura", type=int, default=0)
+    parser.add_argument("--cota-escrita", type=int, default=0)
+    parser.add_argument("--banda", type=float, default=10.0, help="MB/s nos uploads ao Drive")
+    parser.add_argument("--vendedores", type=int, default=10)
+    parser.add_argument("--clientes", type=int, default=200, help="por vendedor")
+    parser.add_argument("--oportunidades", type=int, default=100, help="por vendedor")
+    opcoes = parser.parse_args(sys.argv[2:])
+
+    backend = Backend(opcoes.latencia, opcoes.jitter, opcoes.erros,
+                      opcoes.cota_leitura, opcoes.cota_escrita, opcoes.banda)
+    semear(backend, opcoes.vendedores, opcoes.clientes, opcoes.oportunidades)
+    servir(opcoes.porta, backend)
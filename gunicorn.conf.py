@@ -0,0 +1,14 @@
+# gunicorn.conf.py
+"""
+Configuração lida pelo gunicorn na subida (arquivo padrão no diretório do
+projeto). Workers, threads e bind continuam vindo da linha de comando
+(startCommand em .render.yaml).
+"""
+
+
+def post_worker_init(worker):
+    # Importações interrompidas por um reinício continuam de onde pararam.
+    # Roda no worker já carregado (nunca no master, que ainda vai fazer fork);
+    # só um worker por vez procura (ver importacao.retomar_pendentes).
+    import importacao
+    importacao.retomar_pendentes()
@@ -0,0 +1,165 @@
+# imagens.py
+"""
+Pipeline de otimização das imagens estáticas (proposta e identidade visual).
+
+Executado no build (`python imagens.py`): gera, para cada imagem listada em
+VARIANTES, cópias redimensionadas nas larguras realmente exibidas na tela e
+na impressão, em AVIF/WebP e com PNG recomprimido como fallback. O resultado
+fica em static/img/otimizadas/ junto de um manifesto.json, lido pelos
+templates (macro em templates/imagem.html) para montar o srcset.
+
+Sem o manifesto (ambiente sem build), os templates usam a imagem original.
+"""
+import os
+import json
+
+import assets
+
+PASTA_ORIGEM = os.path.join(assets.PASTA_STATIC, "img")
+PASTA_DESTINO = os.path.join(PASTA_ORIGEM, "otimizadas")
+ARQUIVO_MANIFESTO = os.path.join(PASTA_DESTINO, "manifesto.json")
+
+# imagem original -> larguras (px) geradas.
+# As larguras seguem o tamanho renderizado: 1x e 2x na tela e ~300 dpi na impressão A4.
+VARIANTES = {
+    # Capa da proposta: fundo de uma folha A4 de 794px (tela 1x) e impressão / tela 2x
+    "contratoPg1.png": [794, 1414],
+    # Logo do topo das páginas (classe w-40 = 160px)
+    "contratoImgTop.PNG": [160, 320, 480],
+    "contratoLogoInter.png": [657],
+    "contratoLogoNaci.png": [282],
+    # Ícone da aba (32px) e apple-touch-icon (180px)
+    "favoriteIcon.png": [32, 180],
+    # Logo do cabeçalho (h-10 = 40px de altura, ~57px de largura)
+    "4e08187569d261903370d0fd9c3dd0a2b07fa885.png": [57, 114],
+}
+
+QUALIDADE_WEBP = 80
+QUALIDADE_AVIF = 60
+# Só variantes até esta largura (ícones e logos) viram PNG de 256 cores; as
+# maiores, como a capa embutida no PDF pelo wkhtmltopdf (que não lê WebP),
+# ficam com todas as cores para não aparecerem faixas nas fotos
+LARGURA_MAXIMA_PALETA = 320
+
+# Ordem de preferência no <picture> (o PNG é sempre o fallback do <img>)
+FORMATOS_MODERNOS = [("avif", "image/avif"), ("webp", "image/webp")]
+
+
+# -----------------------------------------------------------------
+# Leitura do manifesto (usada pelos templates)
+# -----------------------------------------------------------------
+_manifesto = None
+
+
+def carregar_manifesto():
+    global _manifesto
+    if _manifesto is None:
+        try:
+            with open(ARQUIVO_MANIFESTO, encoding="utf-8") as f:
+                _manifesto = json.load(f)
+        except (OSError, ValueError):
+            _manifesto = {}
+    return _manifesto
+
+
+def variantes(origem):
+    """
+    Retorna {formato: [(largura, caminho relativo a static/), ...]} da imagem,
+    ou {} quando não há variantes geradas.
+    """
+    return carregar_manifesto().get(origem, {})
+
+
+def srcset(origem, formato):
+    """Monta o atributo srcset (com endereços com hash) de um formato."""
+    return ", ".join(
+        f"{assets.url(caminho)} {largura}w"
+        for largura, caminho in variantes(origem).get(formato, [])
+    )
+
+
+def maior(origem, formato="png"):
+    """Endereço da maior variante do formato (ou da imagem original)."""
+    lista = variantes(origem).get(formato)
+    if not lista:
+        return assets.url("img/" + origem)
+    return assets.url(lista[-1][1])
+
+
+def menor(origem, formato="png"):
+    """Endereço da menor variante do formato (ou da imagem original)."""
+    lista = variantes(origem).get(formato)
+    if not lista:
+        return assets.url("img/" + origem)
+    return assets.url(lista[0][1])
+
+
+# -----------------------------------------------------------------
+# Geração (build)
+# -----------------------------------------------------------------
+
+def _suporta_avif():
+    from PIL import features
+    try:
+        return bool(features.check("avif"))
+    except Exception:
+        return False
+
+
+def gerar_variantes(origem, larguras, com_avif=True):
+    """Gera as variantes de uma imagem e retorna sua entrada no manifesto."""
+    from PIL import Image
+
+    base, _ = os.path.splitext(origem)
+    entrada = {"png": [], "webp": []}
+    if com_avif:
+        entrada["avif"] = []
+
+    with Image.open(os.path.join(PASTA_ORIGEM, origem)) as img:
+        img.load()
+        for largura in larguras:
+            largura = min(largura, img.width)
+            altura = round(img.height * largura / img.width)
+            redimensionada = img if largura == img.width else img.resize((largura, altura), Image.LANCZOS)
+
+            nome = f"{base}-{largura}"
+
+            # PNG: fallback para navegadores sem WebP e imagem usada no PDF
+            if largura <= LARGURA_MAXIMA_PALETA:
+                png = redimensionada.convert("RGBA").quantize(256, method=Image.FASTOCTREE)
+            else:
+                png = redimensionada if redimensionada.mode in ("RGB", "RGBA") else redimensionada.convert("RGBA")
+            png.save(os.path.join(PASTA_DESTINO, nome + ".png"), optimize=True)
+            entrada["png"].append((largura, f"img/otimizadas/{nome}.png"))
+
+            redimensionada.save(os.path.join(PASTA_DESTINO, nome + ".webp"),
+                                "WEBP", quality=QUALIDADE_WEBP, method=6)
+            entrada["webp"].append((largura, f"img/otimizadas/{nome}.webp"))
+
+            if com_avif:
+                redimensionada.save(os.path.join(PASTA_DESTINO, nome + ".avif"),
+                                    "AVIF", quality=QUALIDADE_AVIF)
+                entrada["avif"].append((largura, f"img/otimizadas/{nome}.avif"))
+
+    return entrada
+
+
+def gerar_todas():
+    os.makedirs(PASTA_DESTINO, exist_ok=True)
+    com_avif = _suporta_avif()
+    if not com_avif:
+        print("Pillow sem suporte a AVIF: gerando apenas WebP e PNG.")
+
+    manifesto = {}
+    for origem, larguras in VARIANTES.items():
+        manifesto[origem] = gerar_variantes(origem, larguras, com_avif)
+        antes = os.path.getsize(os.path.join(PASTA_ORIGEM, origem))
+        depois = sum(os.path.getsize(os.path.join(assets.PASTA_STATIC, c)) for _, c in manifesto[origem]["webp"])
+        print(f"{origem}: {antes // 1024} KB -> {depois // 1024} KB (WebP, todas as larguras)")
+
+    with open(ARQUIVO_MANIFESTO, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2)
+
+
+if __name__ == "__main__":
+    gerar_todas()
@@ -0,0 +1,467 @@
+# importacao.py
+"""
+Importação de clientes em massa (CSV ou XLSX), usada pelo administrador.
+
+O arquivo enviado é gravado em disco e lido linha a linha (csv.reader ou
+openpyxl em modo read_only), em blocos de TAMANHO_BLOCO linhas: a memória
+usada não depende do tamanho do arquivo. Cada bloco é validado e
+normalizado (CPF, CEP, telefone, datas) na própria thread da importação
+(trabalho leve por linha; a espera está nas escritas ao Sheets); as linhas
+válidas que não duplicam clientes do vendedor (mesmo CPF ou email) são
+gravadas com append_rows em lotes de LOTE_ESCRITA, respeitando
+ESCRITAS_POR_MINUTO para não estourar a cota de escrita do Sheets.
+
+O progresso (e os erros por linha) fica em arquivo, como no lote de
+propostas, para ser consultado por qualquer worker.
+
+A importação roda em uma thread do worker. Junto do progresso fica o ponto
+de retomada: a última linha do arquivo cujo cliente já foi gravado, com as
+contagens até ela. Enquanto roda, a importação segura uma trava (flock) no
+arquivo <lote>.lock; se o worker morre (deploy, reinício), a trava é
+liberada pelo sistema e retomar_pendentes(), chamado na subida de cada
+worker (post_worker_init, em gunicorn.conf.py), continua do ponto gravado.
+Só um worker por vez procura importações pendentes (trava retomada.lock),
+e a trava de cada lote passa direto para a thread que o retoma. Linhas gravadas depois do último
+ponto (queda entre o append e o progresso) voltam como duplicadas, não
+como clientes repetidos.
+"""
+import os
+import re
+import csv
+import glob
+import json
+import time
+import fcntl
+import threading
+from datetime import datetime, timedelta
+
+import busca
+import sheets
+
+PASTA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "importacoes")
+
+EXTENSOES = (".csv", ".xlsx")
+TAMANHO_BLOCO = 1000
+LOTE_ESCRITA = int(os.environ.get("IMPORTACAO_LOTE_ESCRITA", "1000"))
+# A cota padrão do Sheets é de 60 escritas por minuto por usuário
+ESCRITAS_POR_MINUTO = int(os.environ.get("IMPORTACAO_ESCRITAS_POR_MINUTO", "30"))
+TENTATIVAS_COTA = 5
+# Erros guardados no progresso (os demais só entram na contagem)
+MAX_ERROS = 500
+
+# Nome da coluna no arquivo (normalizado) -> campo do cliente
+ALIASES = {
+    "nome": "nome", "nome completo": "nome", "cliente": "nome",
+    "cpf": "cpf",
+    "nascimento": "nascimento", "data de nascimento": "nascimento", "data nascimento": "nascimento",
+    "email": "email", "e-mail": "email",
+    "telefone": "telefone", "celular": "telefone", "whatsapp": "telefone",
+    "cep": "cep",
+    "estado": "estado", "uf": "estado",
+    "municipio": "municipio", "cidade": "municipio",
+    "logradouro": "logradouro", "endereco": "logradouro", "rua": "logradouro",
+    "numero": "numero", "n": "numero",
+}
+
+UFS = {"AC", "AL", "AP", "AM", "BA", "CE", "DF", "ES", "GO", "MA", "MT", "MS", "MG", "PA",
+       "PB", "PR", "PE", "PI", "RJ", "RN", "RS", "RO", "RR", "SC", "SP", "SE", "TO"}
+
+EMAIL_VALIDO = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+# -----------------------------------------------------------------
+# Validação e normalização
+# -----------------------------------------------------------------
+
+def _digitos(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)  # Planilhas guardam CPF/CEP como número
+    return re.sub(r"\D", "", str(valor if valor is not None else ""))
+
+
+def cpf_valido(digitos):
+    if len(digitos) != 11 or digitos == digitos[0] * 11:
+        return False
+    for tamanho in (9, 10):
+        soma = sum(int(d) * peso for d, peso in zip(digitos[:tamanho], range(tamanho + 1, 1, -1)))
+        if (soma * 10 % 11) % 10 != int(digitos[tamanho]):
+            return False
+    return True
+
+
+def normalizar_data(valor):
+    """datetime, serial do Excel, 'DD/MM/AAAA' ou 'AAAA-MM-DD' -> 'AAAA-MM-DD' (None se inválida)."""
+    if isinstance(valor, datetime):
+        return valor.strftime("%Y-%m-%d")
+    if isinstance(valor, (int, float)):
+        return (datetime(1899, 12, 30) + timedelta(days=int(valor))).strftime("%Y-%m-%d")
+    texto = str(valor).strip()
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%y", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(texto, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def normalizar_cliente(linha):
+    """
+    Valida e normaliza uma linha do arquivo ({campo: valor}).
+    Retorna (cliente, erros); os documentos ficam só com dígitos, como no
+    formulário de cadastro.
+    """
+    def texto(campo):
+        valor = linha.get(campo)
+        return "" if valor is None else str(valor).strip()
+
+    erros = []
+    cliente = {campo: texto(campo) for campo in ("nome", "municipio", "logradouro", "numero")}
+    cliente["email"] = texto("email").lower()
+
+    if not cliente["nome"]:
+        erros.append("nome vazio")
+    if not cliente["email"] or not EMAIL_VALIDO.match(cliente["email"]):
+        erros.append("email inválido")
+
+    cpf = _digitos(linha.get("cpf"))
+    if cpf:
+        cpf = cpf.zfill(11)
+        if not cpf_valido(cpf):
+            erros.append("CPF inválido")
+    cliente["cpf"] = cpf
+
+    cep = _digitos(linha.get("cep"))
+    if cep:
+        cep = cep.zfill(8)
+        if len(cep) != 8:
+            erros.append("CEP inválido")
+    cliente["cep"] = cep
+
+    telefone = _digitos(linha.get("telefone"))
+    if len(telefone) in (12, 13) and telefone.startswith("55"):
+        telefone = telefone[2:]
+    if telefone and len(telefone) not in (10, 11):
+        erros.append("telefone inválido")
+    cliente["telefone"] = telefone
+
+    nascimento = linha.get("nascimento")
+    cliente["nascimento"] = ""
+    if nascimento not in (None, ""):
+        cliente["nascimento"] = normalizar_data(nascimento) or ""
+        if not cliente["nascimento"]:
+            erros.append("data de nascimento inválida")
+
+    estado = texto("estado").upper()
+    if estado and estado not in UFS:
+        erros.append("UF inválida")
+    cliente["estado"] = estado
+
+    return cliente, erros
+
+
+# -----------------------------------------------------------------
+# Leitura do arquivo (streaming)
+# -----------------------------------------------------------------
+
+def _campos(cabecalho):
+    return [ALIASES.get(busca.normalizar(h)) for h in cabecalho]
+
+
+def _linhas_csv(caminho):
+    with open(caminho, newline="", encoding="utf-8-sig", errors="replace") as f:
+        amostra = f.read(4096)
+        f.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=",;\t")
+        except csv.Error:
+            dialeto = csv.excel
+        leitor = csv.reader(f, dialeto)
+        campos = _campos(next(leitor, []))
+        for valores in leitor:
+            yield {c: v for c, v in zip(campos, valores) if c}
+
+
+def _linhas_xlsx(caminho):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Importação de XLSX indisponível (instale o openpyxl).")
+    livro = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        linhas = livro.active.iter_rows(values_only=True)
+        campos = _campos([str(h or "") for h in next(linhas, ())])
+        for valores in linhas:
+            yield {c: v for c, v in zip(campos, valores) if c}
+    finally:
+        livro.close()
+
+
+def ler_linhas(caminho):
+    """Gera (número da linha no arquivo, {campo: valor}), pulando linhas vazias."""
+    linhas = _linhas_xlsx(caminho) if caminho.endswith(".xlsx") else _linhas_csv(caminho)
+    for numero, linha in enumerate(linhas, start=2):
+        if any(str(v).strip() for v in linha.values() if v is not None):
+            yield numero, linha
+
+
+def contar_linhas(caminho):
+    """Estimativa do total de linhas de dados (para a barra de progresso)."""
+    if caminho.endswith(".xlsx"):
+        try:
+            from openpyxl import load_workbook
+            livro = load_workbook(caminho, read_only=True)
+            total = (livro.active.max_row or 1) - 1
+            livro.close()
+            return max(total, 0)
+        except Exception:
+            return 0
+    with open(caminho, "rb") as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def _blocos(iteravel, tamanho):
+    bloco = []
+    for item in iteravel:
+        bloco.append(item)
+        if len(bloco) == tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+# -----------------------------------------------------------------
+# Progresso
+# -----------------------------------------------------------------
+
+def _seguro(lote_id):
+    return "".join(c for c in str(lote_id) if c.isalnum() or c in "-_")
+
+
+def caminho_upload(lote_id, extensao):
+    os.makedirs(PASTA, exist_ok=True)
+    return os.path.join(PASTA, _seguro(lote_id) + extensao)
+
+
+def gravar_progresso(lote_id, **dados):
+    os.makedirs(PASTA, exist_ok=True)
+    caminho = os.path.join(PASTA, _seguro(lote_id) + ".json")
+    temp = caminho + ".tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(dict(dados, atualizado_em=time.time()), f)
+    os.replace(temp, caminho)
+
+
+def ler_progresso(lote_id):
+    try:
+        with open(os.path.join(PASTA, _seguro(lote_id) + ".json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# -----------------------------------------------------------------
+# Importação
+# -----------------------------------------------------------------
+
+def _chaves(cliente):
+    """Chaves de duplicidade: CPF e email."""
+    chaves = set()
+    cpf = _digitos(cliente.get("cpf"))
+    if cpf:
+        chaves.add("cpf:" + cpf.zfill(11))
+    email = str(cliente.get("email") or "").strip().lower()
+    if email:
+        chaves.add("email:" + email)
+    return chaves
+
+
+def _chaves_existentes(proprietario):
+    """CPFs e emails já cadastrados para o vendedor (índice de busca de clientes)."""
+    indice = busca.indice_do_owner(
+        proprietario,
+        carregar=lambda: sheets.listar_clientes_por_owner(proprietario),
+        versao=tuple(sheets.linhas_do_proprietario("clientes", proprietario)),
+        carregar_novas=lambda linhas: sheets.select("clientes", where={"proprietario": proprietario}, linhas=linhas),
+    )
+    existentes = set()
+    for cliente in list(indice.clientes.values()):
+        existentes |= _chaves(cliente)
+    return existentes
+
+
+class _Escritor:
+    """append_rows em lotes, com intervalo mínimo entre escritas e nova tentativa em erro de cota."""
+
+    def __init__(self, proprietario, datacad):
+        self.proprietario = proprietario
+        self.datacad = datacad
+        self.intervalo = 60.0 / max(ESCRITAS_POR_MINUTO, 1)
+        self.ultima = 0.0
+
+    def gravar(self, clientes):
+        for tentativa in range(TENTATIVAS_COTA):
+            espera = self.ultima + self.intervalo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            self.ultima = time.monotonic()
+            try:
+                sheets.salvar_clientes_em_lote(clientes, self.proprietario, self.datacad)
+                return
+            except Exception as e:
+                if "429" not in str(e) or tentativa == TENTATIVAS_COTA - 1:
+                    raise
+                time.sleep(2 ** tentativa * self.intervalo)
+
+
+def _travar(lote_id):
+    """Trava exclusiva do lote (arquivo aberto) ou None se outra thread/processo já o executa."""
+    os.makedirs(PASTA, exist_ok=True)
+    arquivo = open(os.path.join(PASTA, _seguro(lote_id) + ".lock"), "w")
+    try:
+        fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        arquivo.close()
+        return None
+    return arquivo
+
+
+def importar(caminho, proprietario, lote_id, datacad, retomada=None, trava=None):
+    """
+    Processa o arquivo inteiro (executa em segundo plano, ver iniciar()).
+    'retomada' é o progresso gravado de uma execução interrompida; 'trava'
+    é a trava do lote, já obtida por quem retoma.
+    """
+    trava = trava or _travar(lote_id)
+    if trava is None:
+        return
+
+    if retomada:
+        estado = retomada
+        ponto = estado["retomar"]
+        for campo in ("lidas", "duplicados", "com_erro", "importados"):
+            estado[campo] = ponto.get(campo, 0)
+        estado["erros"] = estado.get("erros", [])[:ponto.get("erros", 0)]
+    else:
+        estado = {
+            "total": contar_linhas(caminho), "lidas": 0, "importados": 0,
+            "duplicados": 0, "com_erro": 0, "erros": [], "finalizado": False,
+            "retomar": {"caminho": caminho, "proprietario": proprietario, "datacad": datacad, "linha": 1},
+        }
+        ponto = estado["retomar"]
+    gravar_progresso(lote_id, **estado)
+
+    def erro(numero, mensagem):
+        estado["com_erro"] += 1
+        if len(estado["erros"]) < MAX_ERROS:
+            estado["erros"].append(f"Linha {numero}: {mensagem}")
+
+    def gravar(lote):
+        # lote: [(cliente, linha do arquivo, contagens até essa linha)]
+        escritor.gravar([cliente for cliente, _, _ in lote])
+        estado["importados"] += len(lote)
+        _, linha, contagens = lote[-1]
+        ponto.update(contagens, linha=linha, importados=estado["importados"])
+
+    escritor = _Escritor(proprietario, datacad)
+    pendentes = []
+    try:
+        # Já inclui os clientes gravados antes de uma interrupção
+        vistos = _chaves_existentes(proprietario)
+        linhas = ((n, l) for n, l in ler_linhas(caminho) if n > ponto["linha"])
+        for bloco in _blocos(linhas, TAMANHO_BLOCO):
+            for numero, linha in bloco:
+                cliente, erros = normalizar_cliente(linha)
+                estado["lidas"] += 1
+                if erros:
+                    erro(numero, ", ".join(erros))
+                    continue
+                chaves = _chaves(cliente)
+                if chaves & vistos:
+                    estado["duplicados"] += 1
+                    continue
+                vistos |= chaves
+                pendentes.append((cliente, numero, {
+                    "lidas": estado["lidas"], "duplicados": estado["duplicados"],
+                    "com_erro": estado["com_erro"], "erros": len(estado["erros"]),
+                }))
+
+            while len(pendentes) >= LOTE_ESCRITA:
+                gravar(pendentes[:LOTE_ESCRITA])
+                pendentes = pendentes[LOTE_ESCRITA:]
+            gravar_progresso(lote_id, **estado)
+
+        if pendentes:
+            gravar(pendentes)
+    except Exception as e:
+        print(f"Erro na importação de clientes ({lote_id}): {e}")
+        estado["falha"] = str(e)
+    finally:
+        estado["finalizado"] = True
+        gravar_progresso(lote_id, **estado)
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+        trava.close()
+
+
+def _disparar(caminho, proprietario, lote_id, datacad, retomada=None, trava=None):
+    threading.Thread(
+        target=importar,
+        args=(caminho, proprietario, lote_id, datacad, retomada, trava),
+        name=f"importacao-{_seguro(lote_id)[:8]}",
+        daemon=True,
+    ).start()
+
+
+def iniciar(caminho, proprietario, lote_id, datacad):
+    """Dispara a importação em segundo plano e retorna na hora."""
+    gravar_progresso(lote_id, total=0, lidas=0, importados=0, duplicados=0,
+                     com_erro=0, erros=[], finalizado=False)
+    _disparar(caminho, proprietario, lote_id, datacad)
+
+
+def retomar_pendentes():
+    """
+    Retoma as importações interrompidas (progresso não finalizado e sem
+    nenhum processo segurando a trava do lote). Se outro worker já está
+    procurando, não faz nada.
+    """
+    try:
+        os.makedirs(PASTA, exist_ok=True)
+        guarda = open(os.path.join(PASTA, "retomada.lock"), "w")
+    except OSError as e:
+        print(f"Erro ao procurar importações pendentes: {e}")
+        return
+    try:
+        try:
+            fcntl.flock(guarda, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        for caminho_progresso in glob.glob(os.path.join(PASTA, "*.json")):
+            lote_id = os.path.basename(caminho_progresso)[:-len(".json")]
+            if not _pendente(ler_progresso(lote_id)):
+                continue
+            trava = _travar(lote_id)
+            if trava is None:
+                continue  # em andamento em outro worker
+            # Relido com a trava: pode ter terminado entre a leitura e a trava
+            progresso = ler_progresso(lote_id)
+            if not _pendente(progresso):
+                trava.close()
+                continue
+            ponto = progresso["retomar"]
+            if not os.path.exists(ponto["caminho"]):
+                gravar_progresso(lote_id, **dict(progresso, finalizado=True,
+                                                  falha="Arquivo da importação não encontrado para retomar."))
+                trava.close()
+                continue
+            print(f"Retomando importação de clientes {lote_id} após a linha {ponto['linha']}")
+            _disparar(ponto["caminho"], ponto["proprietario"], lote_id, ponto["datacad"], progresso, trava)
+    finally:
+        guarda.close()
+
+
+def _pendente(progresso):
+    return bool(progresso and not progresso.get("finalizado") and progresso.get("retomar"))
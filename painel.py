@@ -0,0 +1,209 @@
+# painel.py
+"""
+Resumo do funil de vendas (painel da página inicial).
+
+Para cada proprietário e para o total geral guarda, por estado da
+oportunidade (Criado, Em confirmação, Em análise...), a quantidade e a
+soma de 'valor' e 'preco', além dos mesmos totais por mês de cadastro.
+
+Os agregados ficam em um arquivo JSON (compartilhado pelos workers do
+gunicorn) e são atualizados a cada append ou mudança de estado feitos pelo
+portal (registrar_oportunidade / mudar_estado). Mudanças feitas direto na
+planilha (é assim que as aprovações mudam o estado) são percebidas pela
+versão da planilha no Drive: se ela mudou sem escrita do portal na aba, os
+agregados são reconstruídos (ver obter). A aba também é relida inteira
+quando o arquivo não existe ou fica mais velho que RECALCULO_HORAS.
+"""
+import os
+import json
+import time
+import fcntl
+from contextlib import contextmanager
+
+ARQUIVO = os.environ.get(
+    "PAINEL_ARQUIVO",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "painel.json"),
+)
+RECALCULO_HORAS = float(os.environ.get("PAINEL_RECALCULO_HORAS", "24"))
+
+# Colunas da aba 'oportunidades' usadas no cálculo
+COLUNAS = ["proprietario", "estado", "valor", "preco", "datacad"]
+
+GERAL = "*"
+MESES_EXIBIDOS = 6
+
+_memo = {"mtime": None, "dados": None}
+
+
+def _numero(valor):
+    # Os valores chegam normalizados (sheets.normalizar_oportunidade)
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _mes(datacad):
+    """'2026-10-19 14:03:00' -> '2026-10' (None se a data não estiver nesse formato)."""
+    texto = str(datacad or "").strip()
+    if len(texto) >= 7 and texto[4] == "-" and texto[:4].isdigit() and texto[5:7].isdigit():
+        return texto[:7]
+    return None
+
+
+def _estado(valor):
+    return str(valor or "").strip() or "Sem estado"
+
+
+def _somar(grupo, chave, quantidade, valor, preco):
+    total = grupo.setdefault(chave, {"quantidade": 0, "valor": 0.0, "preco": 0.0})
+    total["quantidade"] += quantidade
+    total["valor"] = round(total["valor"] + valor, 2)
+    total["preco"] = round(total["preco"] + preco, 2)
+    if total["quantidade"] <= 0:
+        grupo.pop(chave, None)
+
+
+def _aplicar(dados, oportunidade, sinal=1, so_estado=False):
+    """Soma (sinal=1) ou subtrai (sinal=-1) uma oportunidade dos agregados."""
+    valor = _numero(oportunidade.get("valor")) * sinal
+    preco = _numero(oportunidade.get("preco")) * sinal
+    mes = _mes(oportunidade.get("datacad"))
+    dono = str(oportunidade.get("proprietario") or "").strip()
+    for chave in (dono, GERAL):
+        resumo = dados["donos"].setdefault(chave, {"estados": {}, "meses": {}})
+        _somar(resumo["estados"], _estado(oportunidade.get("estado")), sinal, valor, preco)
+        if mes and not so_estado:
+            _somar(resumo["meses"], mes, sinal, valor, preco)
+
+
+def calcular(oportunidades):
+    """Agregados completos a partir das linhas da aba (usado só na reconstrução)."""
+    dados = {"gerado_em": time.time(), "donos": {}}
+    for oportunidade in oportunidades:
+        _aplicar(dados, oportunidade)
+    return dados
+
+
+@contextmanager
+def _trava():
+    os.makedirs(os.path.dirname(ARQUIVO), exist_ok=True)
+    with open(ARQUIVO + ".lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _ler():
+    """Conteúdo do arquivo, relido só quando o mtime muda."""
+    try:
+        mtime = os.path.getmtime(ARQUIVO)
+    except OSError:
+        return None
+    if _memo["mtime"] != mtime:
+        try:
+            with open(ARQUIVO, encoding="utf-8") as f:
+                _memo["dados"] = json.load(f)
+        except (OSError, ValueError):
+            return None
+        _memo["mtime"] = mtime
+    return _memo["dados"]
+
+
+def _gravar(dados):
+    temp = ARQUIVO + ".tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(dados, f)
+    os.replace(temp, ARQUIVO)
+
+
+def _atualizar(alterar):
+    """Aplica 'alterar(dados)' ao arquivo; sem arquivo não há o que atualizar."""
+    try:
+        with _trava():
+            dados = _ler()
+            if dados is None:
+                return
+            dados = json.loads(json.dumps(dados))
+            alterar(dados)
+            _gravar(dados)
+    except OSError as e:
+        print(f"Erro ao atualizar o painel: {e}")
+
+
+def registrar_oportunidade(oportunidade):
+    """Nova oportunidade gravada na aba."""
+    _atualizar(lambda dados: _aplicar(dados, oportunidade))
+
+
+def mudar_estado(oportunidade, novo_estado):
+    """A oportunidade (com o estado antigo) passou para 'novo_estado'."""
+    if _estado(oportunidade.get("estado")) == _estado(novo_estado):
+        return
+
+    def alterar(dados):
+        _aplicar(dados, oportunidade, sinal=-1, so_estado=True)
+        _aplicar(dados, dict(oportunidade, estado=novo_estado), so_estado=True)
+
+    _atualizar(alterar)
+
+
+def obter(carregar, versao_remota=None, escritas=None):
+    """
+    Agregados atuais. 'carregar()' retorna as linhas da aba e só é chamado
+    quando é preciso reconstruir. 'versao_remota' é a versão da planilha no
+    Drive e 'escritas' o contador de escritas do portal na aba: se a versão
+    mudou e o contador não, a planilha foi editada pela interface do Google
+    e os agregados são reconstruídos.
+    """
+    def situacao(dados):
+        """'atual', 'versao' (só registra a nova versão remota) ou None (reconstruir)."""
+        if dados is None or time.time() - dados.get("gerado_em", 0) >= RECALCULO_HORAS * 3600:
+            return None
+        if not versao_remota or dados.get("versao_remota") == versao_remota:
+            return "atual"
+        if dados.get("escritas") != escritas:
+            # A mudança veio do portal, já aplicada pelos incrementos
+            return "versao"
+        return None
+
+    dados = _ler()
+    if situacao(dados) == "atual":
+        return dados
+
+    # A reconstrução inteira roda com a trava: incrementos de outros workers
+    # (_atualizar) esperam e entram sobre o arquivo novo, em vez de se perderem
+    try:
+        with _trava():
+            dados = _ler()
+            estado = situacao(dados)
+            if estado == "atual":
+                # Outro worker reconstruiu enquanto esperávamos a trava
+                return dados
+            if estado == "versao":
+                novo = dict(dados)
+            else:
+                novo = calcular(carregar())
+            novo.update(versao_remota=versao_remota, escritas=escritas)
+            _gravar(novo)
+            return novo
+    except OSError as e:
+        print(f"Erro ao gravar o painel: {e}")
+        return calcular(carregar())
+
+
+def resumo(dados, proprietario=GERAL):
+    """
+    Resumo de um proprietário para o template: estados (maior valor primeiro),
+    totais e os últimos MESES_EXIBIDOS meses.
+    """
+    grupo = dados.get("donos", {}).get(str(proprietario or "").strip(), {"estados": {}, "meses": {}})
+    estados = sorted(grupo["estados"].items(), key=lambda item: -item[1]["valor"])
+    meses = sorted(grupo["meses"].items())[-MESES_EXIBIDOS:]
+    total = {"quantidade": 0, "valor": 0.0, "preco": 0.0}
+    for _, t in estados:
+        for campo in total:
+            total[campo] += t[campo]
+    return {"estados": estados, "meses": meses, "total": total}
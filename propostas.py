@@ -0,0 +1,255 @@
+# propostas.py
+"""
+Geração da proposta em PDF no servidor, com cache em disco.
+
+O HTML da proposta (propostaPreview.html) é convertido pelo wkhtmltopdf
+(instalado por bin/setup_wkhtml.sh) em um pool limitado de workers. Cada
+PDF é guardado em disco com a versão dos dados no nome: enquanto a linha
+da oportunidade e a do cliente não mudarem, o mesmo arquivo é reaproveitado.
+
+A exportação em lote (exportar_lote) usa o mesmo pool (o trabalho pesado
+é o processo do wkhtmltopdf, não o Python) e devolve um ZIP em streaming
+conforme cada PDF fica pronto.
+"""
+import io
+import os
+import json
+import glob
+import time
+import zipfile
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import assets
+
+PASTA_CACHE = os.environ.get(
+    "PROPOSTAS_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "propostas"),
+)
+
+# Quantos PDFs podem ser gerados ao mesmo tempo neste processo. As threads só
+# esperam o wkhtmltopdf; o padrão é um processo dele por núcleo.
+MAX_WORKERS = int(os.environ.get("PROPOSTAS_PDF_WORKERS", str(os.cpu_count() or 1)))
+TIMEOUT_RENDER = int(os.environ.get("PROPOSTAS_PDF_TIMEOUT", "60"))
+
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="proposta-pdf")
+_em_andamento = {}  # caminho do PDF -> Future (evita gerar o mesmo PDF duas vezes)
+_lock = threading.Lock()
+
+
+def binario_wkhtmltopdf():
+    """Caminho do wkhtmltopdf (bin/ do projeto, variável de ambiente ou PATH)."""
+    configurado = os.environ.get("WKHTMLTOPDF_BIN")
+    if configurado:
+        return configurado
+    local = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bin", "wkhtmltopdf")
+    if os.path.isfile(local) and os.access(local, os.X_OK):
+        return local
+    return shutil.which("wkhtmltopdf")
+
+
+def disponivel():
+    return bool(binario_wkhtmltopdf())
+
+
+def versao_proposta(oportunidade, cliente=None):
+    """
+    Versão do PDF: hash das linhas da oportunidade e do cliente + build atual
+    (mudanças de template também geram um novo PDF).
+    """
+    base = json.dumps(
+        {"oportunidade": oportunidade, "cliente": cliente or {}, "build": assets.versao_build()},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha1(base.encode()).hexdigest()[:16]
+
+
+def caminho_pdf(oportunidade_id, versao):
+    # O id vem da URL: mantém só caracteres seguros para nome de arquivo
+    seguro = "".join(c for c in str(oportunidade_id) if c.isalnum() or c in "-_")
+    return os.path.join(PASTA_CACHE, f"{seguro}-{versao}.pdf")
+
+
+def buscar_em_cache(oportunidade_id, versao):
+    caminho = caminho_pdf(oportunidade_id, versao)
+    return caminho if os.path.isfile(caminho) else None
+
+
+def _renderizar(html, destino):
+    """Converte o HTML em PDF (executa dentro do pool)."""
+    os.makedirs(PASTA_CACHE, exist_ok=True)
+    fd_html, caminho_html = tempfile.mkstemp(suffix=".html", dir=PASTA_CACHE)
+    fd_pdf, caminho_tmp = tempfile.mkstemp(suffix=".pdf.tmp", dir=PASTA_CACHE)
+    os.close(fd_pdf)
+    try:
+        with os.fdopen(fd_html, "w", encoding="utf-8") as f:
+            f.write(html)
+
+        subprocess.run(
+            [
+                binario_wkhtmltopdf(),
+                "--quiet",
+                "--enable-local-file-access",
+                "--print-media-type",
+                "--page-size", "A4",
+                "--margin-top", "0", "--margin-bottom", "0",
+                "--margin-left", "0", "--margin-right", "0",
+                "--encoding", "utf-8",
+                caminho_html,
+                caminho_tmp,
+            ],
+            check=True,
+            timeout=TIMEOUT_RENDER,
+            capture_output=True,
+        )
+        # Escrita atômica: o PDF só aparece no cache quando está completo
+        os.replace(caminho_tmp, destino)
+    finally:
+        for temp in (caminho_html, caminho_tmp):
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    _remover_versoes_antigas(destino)
+    return destino
+
+
+def _remover_versoes_antigas(atual):
+    prefixo = os.path.basename(atual).rsplit("-", 1)[0]
+    padrao = f"{glob.escape(prefixo)}-{'[0-9a-f]' * 16}.pdf"
+    for antigo in glob.glob(os.path.join(PASTA_CACHE, padrao)):
+        if antigo != atual:
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+
+
+def _submeter(destino, html):
+    """Future da geração de 'destino'; pedidos simultâneos da mesma versão compartilham a mesma."""
+    with _lock:
+        futuro = _em_andamento.get(destino)
+        if futuro is None:
+            futuro = _pool.submit(_renderizar, html, destino)
+            _em_andamento[destino] = futuro
+            futuro.add_done_callback(lambda _f: _em_andamento.pop(destino, None))
+    return futuro
+
+
+def gerar_pdf(oportunidade_id, versao, html):
+    """
+    Gera o PDF no pool e retorna o caminho do arquivo (bloqueia até terminar).
+    Pedidos simultâneos da mesma versão aguardam a mesma geração.
+    """
+    return _submeter(caminho_pdf(oportunidade_id, versao), html).result()
+
+
+# -----------------------------------------------------------------
+# Exportação em lote
+# -----------------------------------------------------------------
+PASTA_LOTES = os.path.join(os.path.dirname(PASTA_CACHE), "lotes")
+
+
+def _caminho_progresso(lote_id):
+    seguro = "".join(c for c in str(lote_id) if c.isalnum() or c in "-_")
+    return os.path.join(PASTA_LOTES, f"{seguro}.json")
+
+
+def gravar_progresso(lote_id, **dados):
+    """
+    Progresso fica em arquivo (e não em memória) para ser lido por qualquer
+    worker do gunicorn.
+    """
+    os.makedirs(PASTA_LOTES, exist_ok=True)
+    caminho = _caminho_progresso(lote_id)
+    temp = caminho + ".tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(dict(dados, atualizado_em=time.time()), f)
+    os.replace(temp, caminho)
+
+
+def ler_progresso(lote_id):
+    try:
+        with open(_caminho_progresso(lote_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class SaidaStream(io.RawIOBase):
+    """Destino de um ZipFile que acumula bytes até o gerador entregá-los ao cliente."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def extrair(self):
+        dados = b"".join(self._partes)
+        self._partes = []
+        return dados
+
+
+def exportar_lote(itens, lote_id):
+    """
+    Gera os PDFs do lote e produz, em pedaços, um arquivo ZIP.
+
+    'itens' é uma lista de dicionários com nome (dentro do ZIP), oportunidade_id,
+    versao e html: uma função sem argumentos que renderiza o HTML, chamada só
+    quando o PDF não está no cache e só quando o item é alcançado (o primeiro
+    pedaço do ZIP sai sem esperar o HTML dos demais). Os PDFs entram no ZIP na
+    ordem em que ficam prontos.
+    """
+    total = len(itens)
+    concluidos = 0
+    erros = []
+    saida = SaidaStream()
+    gravar_progresso(lote_id, total=total, concluidos=0, erros=[], finalizado=False)
+
+    with zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        futuros = {}
+
+        def incluir(item, obter_caminho):
+            nonlocal concluidos
+            try:
+                zf.write(obter_caminho(), item["nome"])
+            except Exception as e:
+                erros.append(f"{item['nome']}: {e}")
+            concluidos += 1
+            gravar_progresso(lote_id, total=total, concluidos=concluidos, erros=erros, finalizado=False)
+            return saida.extrair()
+
+        for item in itens:
+            caminho = buscar_em_cache(item["oportunidade_id"], item["versao"])
+            if caminho:
+                yield incluir(item, lambda: caminho)
+            else:
+                try:
+                    html = item["html"]()
+                except Exception as e:
+                    erros.append(f"{item['nome']}: {e}")
+                    concluidos += 1
+                    continue
+                destino = caminho_pdf(item["oportunidade_id"], item["versao"])
+                futuros[_submeter(destino, html)] = item
+            # Entrega o que já ficou pronto enquanto os demais HTML são renderizados
+            for futuro in [f for f in futuros if f.done()]:
+                yield incluir(futuros.pop(futuro), futuro.result)
+
+        for futuro in as_completed(futuros):
+            yield incluir(futuros[futuro], futuro.result)
+
+        if erros:
+            zf.writestr("erros.txt", "\n".join(erros) + "\n")
+
+    gravar_progresso(lote_id, total=total, concluidos=concluidos, erros=erros, finalizado=True)
+    yield saida.extrair()
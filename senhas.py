@@ -0,0 +1,211 @@
+# senhas.py
+"""
+Hash de senhas (cadastro e login) com limite de hashes simultâneos.
+
+generate_password_hash/check_password_hash são lentos de propósito; no pico
+de logins da manhã, todos os workers do gunicorn calculavam hashes ao mesmo
+tempo e nenhum sobrava para as outras rotas. O hash roda no próprio worker
+(os workers são síncronos: mandá-lo a outro processo e esperar o resultado
+prendia o worker do mesmo jeito, com uma cópia a mais da senha entre
+processos), mas só com uma vaga livre.
+
+As vagas são compartilhadas pelos workers: cada hash em andamento trava um
+arquivo com flock em PASTA_VAGAS (solto pelo sistema se o worker morrer).
+Com FILA_MAXIMA vagas ocupadas, o pedido seguinte falha na hora (Sobrecarga)
+em vez de esperar, e a rota responde "tente novamente". O padrão de
+FILA_MAXIMA fica abaixo do número de workers (WEB_CONCURRENCY), para sempre
+sobrar worker para as outras rotas, e não passa do número de núcleos (mais
+hashes que núcleos só deixam todos mais lentos); com workers gthread, ajuste
+SENHA_FILA abaixo de workers x threads.
+
+O método do hash é configurável (SENHA_METODO, no formato do Werkzeug, ex.:
+"scrypt:32768:8:1" ou "pbkdf2:sha256:600000"). Hashes gravados com outro
+método ou tamanho de salt são refeitos no próximo login bem-sucedido
+(precisa_rehash).
+
+Uso: python senhas.py benchmark [segundos] [threads]
+"""
+import os
+import sys
+import time
+import fcntl
+import resource
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+METODO = os.environ.get("SENHA_METODO", "scrypt")
+TAMANHO_SALT = int(os.environ.get("SENHA_SALT", "16"))
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", "1"))
+FILA_MAXIMA = int(os.environ.get(
+    "SENHA_FILA", str(max(min(WORKERS - 1, os.cpu_count() or 1), 1))))
+PASTA_VAGAS = os.environ.get(
+    "SENHA_VAGAS_PASTA",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "senhas"),
+)
+
+_vagas = threading.BoundedSemaphore(max(FILA_MAXIMA, 1))  # só se PASTA_VAGAS estiver indisponível
+_metodo_atual = None
+
+
+class Sobrecarga(Exception):
+    """Todas as vagas de hash estão ocupadas."""
+
+
+# -----------------------------------------------------------------
+# Hash
+# -----------------------------------------------------------------
+
+def _gerar(senha, metodo, tamanho_salt):
+    return generate_password_hash(senha, method=metodo, salt_length=tamanho_salt)
+
+
+def _conferir(senha_hash, senha):
+    try:
+        return check_password_hash(senha_hash, senha)
+    except Exception:
+        # Hash corrompido ou de método desconhecido: login falha
+        return False
+
+
+# -----------------------------------------------------------------
+# Vagas
+# -----------------------------------------------------------------
+
+def _ocupar_vaga():
+    """
+    Trava uma das FILA_MAXIMA vagas compartilhadas pelos workers. Retorna o
+    arquivo travado (ou _vagas, sem a pasta) ou None se a fila está cheia.
+    """
+    try:
+        os.makedirs(PASTA_VAGAS, exist_ok=True)
+        for i in range(max(FILA_MAXIMA, 1)):
+            f = open(os.path.join(PASTA_VAGAS, f"vaga-{i}.lock"), "w")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except BlockingIOError:
+                f.close()
+        return None
+    except OSError as e:
+        print(f"Erro ao abrir fila de hash de senhas: {e}")
+        # Sem a pasta: limite só deste processo
+        return _vagas if _vagas.acquire(blocking=False) else None
+
+
+def _liberar_vaga(vaga):
+    if vaga is _vagas:
+        _vagas.release()
+        return
+    fcntl.flock(vaga, fcntl.LOCK_UN)
+    vaga.close()
+
+
+def _executar(funcao, *args):
+    vaga = _ocupar_vaga()
+    if vaga is None:
+        raise Sobrecarga("Fila de hash de senhas cheia.")
+    try:
+        return funcao(*args)
+    finally:
+        _liberar_vaga(vaga)
+
+
+# -----------------------------------------------------------------
+# API
+# -----------------------------------------------------------------
+
+def gerar_hash(senha):
+    """Hash da senha com o método configurado. Lança Sobrecarga."""
+    return _executar(_gerar, senha, METODO, TAMANHO_SALT)
+
+
+def conferir(senha_hash, senha):
+    """True se a senha confere com o hash gravado. Lança Sobrecarga."""
+    if not senha_hash:
+        return False
+    return _executar(_conferir, senha_hash, senha)
+
+
+def metodo_atual():
+    """
+    Método completo gravado pelo Werkzeug para METODO ("scrypt" vira
+    "scrypt:32768:8:1"), descoberto gerando um hash uma única vez, com vaga
+    como os demais. Lança Sobrecarga (e tenta de novo na próxima chamada).
+    """
+    global _metodo_atual
+    if _metodo_atual is None:
+        _metodo_atual = _executar(_gerar, "", METODO, TAMANHO_SALT).split("$", 1)[0]
+    return _metodo_atual
+
+
+def precisa_rehash(senha_hash):
+    """True se o hash foi gravado com outro método, parâmetros ou tamanho de salt."""
+    partes = str(senha_hash or "").split("$")
+    if len(partes) != 3:
+        return True
+    metodo, salt, _ = partes
+    return metodo != metodo_atual() or len(salt) != TAMANHO_SALT
+
+
+# -----------------------------------------------------------------
+# Benchmark
+# -----------------------------------------------------------------
+
+def _cpu():
+    """Tempo de CPU (s) deste processo."""
+    uso = resource.getrusage(resource.RUSAGE_SELF)
+    return uso.ru_utime + uso.ru_stime
+
+
+def _medir(conferir_uma, segundos, threads):
+    """
+    Executa logins em 'threads' threads por 'segundos'. Retorna (logins/s,
+    logins por segundo de CPU, recusados por Sobrecarga).
+    """
+    fim = time.monotonic() + segundos
+    contagem = [0] * threads
+    recusados = [0] * threads
+
+    def rodar(posicao):
+        while time.monotonic() < fim:
+            try:
+                conferir_uma()
+                contagem[posicao] += 1
+            except Sobrecarga:
+                recusados[posicao] += 1
+                time.sleep(0.01)  # como um cliente que tenta de novo
+
+    cpu, inicio = _cpu(), time.monotonic()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(rodar, range(threads)))
+    decorrido = time.monotonic() - inicio
+    total = sum(contagem)
+    return total / decorrido, total / max(_cpu() - cpu, 1e-9), sum(recusados)
+
+
+def benchmark(segundos=5.0, threads=4):
+    """
+    Compara o hash sem limite (como era) com o limite de FILA_MAXIMA vagas.
+    'threads' simula requisições simultâneas.
+    """
+    senha_hash = _gerar("senha-de-teste", METODO, TAMANHO_SALT)
+    print(f"Método {metodo_atual()}, {threads} threads, {segundos:g}s cada, "
+          f"{os.cpu_count() or 1} núcleos, {FILA_MAXIMA} vagas")
+
+    vazao, por_nucleo, _ = _medir(lambda: _conferir(senha_hash, "senha-de-teste"), segundos, threads)
+    print(f"  sem limite: {vazao:8.1f} logins/s  {por_nucleo:8.1f} logins/s por núcleo")
+
+    vazao, por_nucleo, recusados = _medir(lambda: conferir(senha_hash, "senha-de-teste"), segundos, threads)
+    print(f"  com vagas:  {vazao:8.1f} logins/s  {por_nucleo:8.1f} logins/s por núcleo  "
+          f"{recusados} recusados")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "benchmark":
+        benchmark(
+            float(sys.argv[2]) if len(sys.argv) >= 3 else 5.0,
+            int(sys.argv[3]) if len(sys.argv) >= 4 else 4,
+        )
+    else:
+        print("Uso: python senhas.py benchmark [segundos] [threads]")
@@ -1,7 +1,20 @@
 import auth
+import busca
+import painel
 import os
+import re
 import json
+import time
+import fcntl
+import bisect
+import threading
 import gspread
+from contextlib import contextmanager
+from collections.abc import Sequence
+from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from gspread.utils import numericise_all
+from flask import g, has_request_context
 from oauth2client.service_account import ServiceAccountCredentials
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
@@ -21,17 +34,1187 @@ if not planilha_id:
     raise ValueError("A variável PLANILHA_ADM_ID não está definida.")
 spreadsheet = client.open_by_key(planilha_id)
 
+# Planilha das abas de arquivo de oportunidades (ver arquivamento.py). Por
+# padrão é a mesma; uma planilha separada tem o seu próprio limite de células.
+planilha_arquivo_id = os.environ.get("PLANILHA_ARQUIVO_ID") or planilha_id
+spreadsheet_arquivo = spreadsheet if planilha_arquivo_id == planilha_id else client.open_by_key(planilha_arquivo_id)
+
+# Aba principal de oportunidades e abas de arquivo, uma por ano de datacad
+ABA_OPORTUNIDADES = "oportunidades"
+ABA_ARQUIVO = re.compile(r"^oportunidades_(\d{4})$")
+
+def planilha_da_aba(nome):
+    """Planilha onde a aba está (abas de arquivo podem estar em outra)."""
+    return spreadsheet_arquivo if ABA_ARQUIVO.match(nome) else spreadsheet
+
 # Acesso a abas
 def get_aba(nome):
-    return spreadsheet.worksheet(nome)
+    # Dentro de uma requisição o objeto da aba é reaproveitado (cada
+    # spreadsheet.worksheet() é uma leitura de metadados)
+    unidade = unidade_atual()
+    if unidade is None:
+        return planilha_da_aba(nome).worksheet(nome)
+    if nome not in unidade.abas:
+        unidade.abas[nome] = planilha_da_aba(nome).worksheet(nome)
+    return unidade.abas[nome]
+
+_drive_service = None
+
+def get_drive():
+    """Retorna o cliente da API do Drive (criado uma única vez por processo)."""
+    global _drive_service
+    if _drive_service is None:
+        _drive_service = build("drive", "v3", credentials=creds, cache_discovery=False)
+    return _drive_service
+
+# -----------------------------------------------------------------
+# Unidade de trabalho da requisição
+# -----------------------------------------------------------------
+class UnidadeTrabalho:
+    """
+    Estado de uma requisição (guardado em flask.g):
+      - leituras já feitas, reaproveitadas até o fim da requisição;
+      - escritas pendentes, enviadas juntas em confirmar() (um append_rows
+        por aba e um único values.batchUpdate para as células) ou
+        descartadas em descartar() se a rota falhar.
+
+    Escritas pendentes não aparecem nas leituras da mesma requisição.
+    """
+
+    def __init__(self):
+        self.abas = {}
+        self.leituras = {}
+        self.appends = {}       # aba -> [(linha, ao_gravar)]
+        self.atualizacoes = []  # (aba, linha, coluna, valor)
+        self.ao_atualizar = []  # callbacks após o batchUpdate
+
+    def confirmar(self):
+        appends, self.appends = self.appends, {}
+        atualizacoes, self.atualizacoes = self.atualizacoes, []
+        ao_atualizar, self.ao_atualizar = self.ao_atualizar, []
+
+        for nome_aba, itens in appends.items():
+            resposta = get_aba(nome_aba).append_rows([linha for linha, _ in itens])
+            primeira = _linha_do_append(resposta)
+            for deslocamento, (_, ao_gravar) in enumerate(itens):
+                if ao_gravar:
+                    ao_gravar(_resposta_da_linha(nome_aba, primeira + deslocamento) if primeira else None)
+
+        if atualizacoes:
+            _enviar_atualizacoes(atualizacoes)
+            for callback in ao_atualizar:
+                callback()
+
+    def descartar(self):
+        self.appends = {}
+        self.atualizacoes = []
+        self.ao_atualizar = []
+
+def unidade_atual():
+    """Unidade de trabalho da requisição atual (None fora de uma requisição)."""
+    if not has_request_context():
+        return None
+    if "unidade_trabalho" not in g:
+        g.unidade_trabalho = UnidadeTrabalho()
+    return g.unidade_trabalho
+
+def confirmar_unidade():
+    """Envia as escritas pendentes da requisição. Retorna False se falhar."""
+    unidade = g.get("unidade_trabalho") if has_request_context() else None
+    if unidade is None:
+        return True
+    try:
+        unidade.confirmar()
+        return True
+    except Exception as e:
+        print(f"Erro ao gravar as alterações da requisição: {e}")
+        unidade.descartar()
+        return False
+
+def descartar_unidade():
+    unidade = g.get("unidade_trabalho") if has_request_context() else None
+    if unidade is not None:
+        unidade.descartar()
+
+class RegistrosEspelhados(Sequence):
+    """
+    Registros de uma aba espelhada, sem copiar a aba: cada registro é
+    copiado só quando é lido (iteração ou índice), então quem para na
+    primeira linha que procura não paga pelas demais. 'registros' é uma
+    lista própria (o espelho troca os dicionários, nunca os altera).
+    """
+
+    def __init__(self, registros):
+        self._registros = registros
+
+    def __len__(self):
+        return len(self._registros)
+
+    def __getitem__(self, posicao):
+        if isinstance(posicao, slice):
+            return [dict(r) for r in self._registros[posicao]]
+        return dict(self._registros[posicao])
+
+    def __iter__(self):
+        return (dict(r) for r in self._registros)
+
+def _copiar(valor):
+    """Cópia rasa de registros, para quem chama poder alterar o resultado."""
+    if isinstance(valor, RegistrosEspelhados):
+        return valor  # já copia cada registro ao ser lido
+    if isinstance(valor, list):
+        return [dict(r) if isinstance(r, dict) else r for r in valor]
+    if isinstance(valor, dict):
+        return dict(valor)
+    if isinstance(valor, tuple):
+        return tuple(_copiar(v) for v in valor)
+    return valor
+
+def memoizar(chave, ler):
+    """Executa ler() uma única vez por requisição para a mesma chave."""
+    unidade = unidade_atual()
+    if unidade is None:
+        return ler()
+    if chave not in unidade.leituras:
+        unidade.leituras[chave] = ler()
+    return _copiar(unidade.leituras[chave])
+
+def ler_registros(nome_aba):
+    """get_all_records da aba, memoizado na requisição (abas espelhadas vêm do espelho)."""
+    def ler():
+        atual = espelho(nome_aba)
+        return atual.registros_atuais() if atual else get_aba(nome_aba).get_all_records()
+    return memoizar(("registros", nome_aba), ler)
+
+def ler_valores(nome_aba):
+    """get_all_values da aba, memoizado na requisição (abas espelhadas vêm do espelho)."""
+    def ler():
+        atual = espelho(nome_aba)
+        return [list(v) for v in atual.valores] if atual else get_aba(nome_aba).get_all_values()
+    return memoizar(("valores", nome_aba), ler)
+
+def _resposta_da_linha(nome_aba, linha):
+    """Resposta no formato de append_row para uma linha de um append_rows."""
+    return {"updates": {"updatedRange": f"'{nome_aba}'!A{linha}"}}
+
+def anexar_linha(nome_aba, linha, ao_gravar=None):
+    """
+    append_row adiado para o fim da requisição. 'ao_gravar(resposta)' roda
+    depois da gravação (atualização de índices e versões locais).
+    Fora de uma requisição a linha é gravada na hora.
+    """
+    unidade = unidade_atual()
+    if unidade is None:
+        resposta = get_aba(nome_aba).append_row(linha)
+        if ao_gravar:
+            ao_gravar(resposta)
+        return
+    unidade.appends.setdefault(nome_aba, []).append((linha, ao_gravar))
+
+def _enviar_atualizacoes(atualizacoes):
+    por_planilha = {}  # id -> (planilha, dados)
+    for nome_aba, linha, coluna, valor in atualizacoes:
+        planilha = planilha_da_aba(nome_aba)
+        por_planilha.setdefault(planilha.id, (planilha, []))[1].append(
+            {"range": f"'{nome_aba}'!{coluna_letra(coluna - 1)}{linha}", "values": [[valor]]}
+        )
+    for planilha, dados in por_planilha.values():
+        planilha.values_batch_update({"valueInputOption": "USER_ENTERED", "data": dados})
+    for nome_aba, linha, _, _ in atualizacoes:
+        marcar_linhas_alteradas(nome_aba, [linha])
+
+def atualizar_celulas(nome_aba, linha, valores, ao_gravar=None):
+    """
+    Atualiza células de uma linha ({coluna 1-based: valor}), adiado para o
+    fim da requisição (ou imediato fora dela).
+    """
+    atualizacoes = [(nome_aba, linha, coluna, valor) for coluna, valor in valores.items()]
+    unidade = unidade_atual()
+    if unidade is None:
+        _enviar_atualizacoes(atualizacoes)
+        if ao_gravar:
+            ao_gravar()
+        return
+    unidade.atualizacoes.extend(atualizacoes)
+    if ao_gravar:
+        unidade.ao_atualizar.append(ao_gravar)
+
+# -----------------------------------------------------------------
+# Versão dos dados (usada como validador de cache HTTP)
+# -----------------------------------------------------------------
+# Tempo (segundos) em que a data de modificação da planilha lida do Drive é reaproveitada
+VERSAO_TTL = int(os.environ.get("VERSAO_DADOS_TTL", "15"))
+# Contadores de escrita por aba, compartilhados pelos workers do gunicorn
+ARQUIVO_VERSOES = os.environ.get(
+    "VERSOES_ARQUIVO",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "versoes.json"),
+)
+
+_versoes_locais = {}  # aba -> contador deste processo (só se o arquivo estiver indisponível)
+_versoes_remotas = {}  # id da planilha -> {"valor", "lido_em"}
+
+@contextmanager
+def _trava_versoes():
+    os.makedirs(os.path.dirname(ARQUIVO_VERSOES), exist_ok=True)
+    with open(ARQUIVO_VERSOES + ".lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _ler_versoes():
+    with open(ARQUIVO_VERSOES, encoding="utf-8") as f:
+        return json.load(f)
+
+def marcar_alteracao(nome_aba):
+    """
+    Registra que o portal escreveu na aba. O contador fica em um arquivo
+    compartilhado: o validador muda na hora em todos os workers, não só
+    no que gravou.
+    """
+    try:
+        with _trava_versoes():
+            try:
+                versoes = _ler_versoes()
+            except (OSError, ValueError):
+                versoes = {}
+            versoes[nome_aba] = versoes.get(nome_aba, 0) + 1
+            temp = ARQUIVO_VERSOES + ".tmp"
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(versoes, f)
+            os.replace(temp, ARQUIVO_VERSOES)
+    except OSError as e:
+        print(f"Erro ao gravar versão da aba {nome_aba}: {e}")
+        _versoes_locais[nome_aba] = _versoes_locais.get(nome_aba, 0) + 1
+
+def versao_aba(nome_aba):
+    """Contador de escritas do portal na aba (todos os workers)."""
+    try:
+        return str(_ler_versoes().get(nome_aba, 0))
+    except (OSError, ValueError):
+        return f"l{_versoes_locais.get(nome_aba, 0)}"
+
+def versao_escritas():
+    """Contadores de escrita do portal em todas as abas (muda a cada gravação de qualquer worker)."""
+    try:
+        return json.dumps(_ler_versoes(), sort_keys=True)
+    except (OSError, ValueError):
+        return f"l{sorted(_versoes_locais.items())}"
+
+def versao_planilha(id_planilha=None):
+    """
+    Retorna o 'modifiedTime' da planilha (a principal, por padrão) no Drive.
+    A leitura é memoizada por VERSAO_TTL segundos, então a maioria das chamadas
+    não faz nenhuma requisição ao Google.
+    """
+    id_planilha = id_planilha or planilha_id
+    remota = _versoes_remotas.setdefault(id_planilha, {"valor": "", "lido_em": 0.0})
+    agora = time.monotonic()
+    if remota["valor"] and agora - remota["lido_em"] < VERSAO_TTL:
+        return remota["valor"]
+    try:
+        meta = get_drive().files().get(fileId=id_planilha, fields="modifiedTime").execute()
+        remota["valor"] = meta.get("modifiedTime", "")
+    except Exception as e:
+        print(f"Erro ao ler versão da planilha: {e}")
+        # Sem versão remota confiável: usa o relógio para nunca responder 304 indevido
+        remota["valor"] = f"t{int(time.time())}"
+    remota["lido_em"] = agora
+    return remota["valor"]
+
+def versao_dados(*abas):
+    """
+    Monta um identificador barato da versão atual das abas informadas.
+    Muda na hora quando qualquer worker do portal grava em uma das abas
+    (versao_aba) e, em até VERSAO_TTL segundos, quando a planilha é editada
+    pela interface do Google.
+    """
+    locais = ",".join(f"{aba}={versao_aba(aba)}" for aba in abas)
+    return f"{versao_planilha()}|{locais}"
+
+# -----------------------------------------------------------------
+# Consultas com projeção de colunas e filtro por proprietário
+# -----------------------------------------------------------------
+# Máximo de intervalos por chamada de values.batchGet
+MAX_INTERVALOS_BATCH = 100
+# Chamadas batchGet simultâneas quando os intervalos não cabem em uma só
+MAX_LEITURAS_PARALELAS = int(os.environ.get("SHEETS_LEITURAS_PARALELAS", "4"))
+
+_mapas_owner = {}  # aba -> {"versao", "cabecalho", "linhas": {proprietario: [linhas]}}
+_grade = {}  # id da planilha -> {"versao", "linhas": {aba: total de linhas da grade}}
+
+def _planilha_do_intervalo(intervalo):
+    """Planilha da aba de um intervalo A1 ("'oportunidades_2024'!A2:C9")."""
+    nome = intervalo.rsplit("!", 1)[0] if "!" in intervalo else intervalo
+    return planilha_da_aba(nome.strip("'"))
+
+def values_batch_get(intervalos):
+    """
+    Lê os intervalos A1 e retorna a lista de valueRanges, na mesma ordem.
+    Até MAX_INTERVALOS_BATCH intervalos (da mesma planilha) vão em uma única
+    chamada; acima disso, ou com abas de arquivo em outra planilha, os lotes
+    são lidos em paralelo (a latência continua sendo a de uma ida ao Google).
+    """
+    grupos = {}  # id da planilha -> (planilha, posições)
+    for posicao, intervalo in enumerate(intervalos):
+        planilha = _planilha_do_intervalo(intervalo)
+        grupos.setdefault(planilha.id, (planilha, []))[1].append(posicao)
+    lotes = [
+        (planilha, posicoes[i:i + MAX_INTERVALOS_BATCH])
+        for planilha, posicoes in grupos.values()
+        for i in range(0, len(posicoes), MAX_INTERVALOS_BATCH)
+    ]
+    if not lotes:
+        return []
+
+    def ler(lote):
+        planilha, posicoes = lote
+        return planilha.values_batch_get([intervalos[p] for p in posicoes]).get("valueRanges", [])
+
+    if len(lotes) == 1:
+        return ler(lotes[0])
+    with ThreadPoolExecutor(max_workers=min(MAX_LEITURAS_PARALELAS, len(lotes))) as pool:
+        respostas = list(pool.map(ler, lotes))
+    faixas = [{} for _ in intervalos]
+    for (_, posicoes), resposta in zip(lotes, respostas):
+        for posicao, faixa in zip(posicoes, resposta):
+            faixas[posicao] = faixa
+    return faixas
+
+def _linhas_das_abas(planilha, recarregar=False):
+    """
+    Total de linhas da grade de cada aba da planilha. Uma única leitura de
+    metadados traz todas as abas e vale enquanto a planilha não muda.
+    """
+    versao = versao_planilha(planilha.id)
+    grade = _grade.get(planilha.id)
+    if recarregar or grade is None or grade["versao"] != versao:
+        meta = planilha.fetch_sheet_metadata()
+        grade = {"versao": versao, "linhas": {
+            s["properties"]["title"]: s["properties"].get("gridProperties", {}).get("rowCount", 0)
+            for s in meta.get("sheets", [])
+        }}
+        _grade[planilha.id] = grade
+    return grade["linhas"]
+
+def linhas_na_grade(nome_aba):
+    """Total de linhas da grade da aba."""
+    planilha = planilha_da_aba(nome_aba)
+    linhas = _linhas_das_abas(planilha)
+    if nome_aba not in linhas:
+        # Aba criada depois da última leitura de metadados
+        linhas = _linhas_das_abas(planilha, recarregar=True)
+    return linhas.get(nome_aba, 0)
+
+def coluna_letra(indice):
+    """Índice 0-based da coluna -> letra A1 (0 -> A, 26 -> AA)."""
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+def _chave_owner(valor):
+    return str(valor or "").strip().lower()
+
+def _mapa_proprietarios(nome_aba):
+    """
+    Mapa proprietário -> números de linha da aba, montado lendo apenas a
+    coluna 'proprietario'. Reaproveitado enquanto a planilha não muda e
+    atualizado incrementalmente pelos appends deste processo.
+    """
+    versao = versao_planilha(planilha_da_aba(nome_aba).id)
+    mapa = _mapas_owner.get(nome_aba)
+    if mapa and mapa["versao"] == versao:
+        return mapa
+
+    if mapa and nome_aba in _espelhos:
+        # Com o espelho montado, o mapa acompanha a sincronização da cauda
+        espelho(nome_aba)
+        mapa = _mapas_owner[nome_aba]
+        mapa["versao"] = versao
+        return mapa
+
+    aba = get_aba(nome_aba)
+    cabecalho = aba.row_values(1)
+    normalizado = [(h or "").strip().lower() for h in cabecalho]
+    linhas = {}
+    if "proprietario" in normalizado:
+        coluna = aba.col_values(normalizado.index("proprietario") + 1)
+        for numero, valor in enumerate(coluna[1:], start=2):
+            linhas.setdefault(_chave_owner(valor), []).append(numero)
+
+    mapa = {"versao": versao, "cabecalho": cabecalho, "linhas": linhas}
+    _mapas_owner[nome_aba] = mapa
+    return mapa
+
+def _linha_do_append(resposta):
+    """Número da linha gravada, a partir da resposta de append_row ('aba!A57:N57')."""
+    try:
+        intervalo = resposta["updates"]["updatedRange"]
+        return int("".join(c for c in intervalo.split("!")[-1].split(":")[0] if c.isdigit()))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def registrar_append(nome_aba, resposta, proprietario):
+    """Inclui no mapa proprietário -> linhas a linha recém-gravada (sem reler a aba)."""
+    mapa = _mapas_owner.get(nome_aba)
+    linha = _linha_do_append(resposta)
+    planilha = planilha_da_aba(nome_aba)
+    # O append pode ter aumentado a grade
+    grade = _grade.get(planilha.id, {}).get("linhas", {})
+    if linha is not None and linha > grade.get(nome_aba, linha):
+        grade[nome_aba] = linha
+    if not mapa or linha is None:
+        _mapas_owner.pop(nome_aba, None)
+        return
+    mapa["linhas"].setdefault(_chave_owner(proprietario), []).append(linha)
+    mapa["versao"] = versao_planilha(planilha.id)
+
+def _agrupar(numeros):
+    """[2, 3, 4, 9, 10] -> [(2, 4), (9, 10)]"""
+    grupos = []
+    for n in sorted(numeros):
+        if grupos and n == grupos[-1][1] + 1:
+            grupos[-1][1] = n
+        else:
+            grupos.append([n, n])
+    return [tuple(g) for g in grupos]
+
+def _ler_linhas(nome_aba, cabecalho, linhas, indices):
+    """
+    Lê apenas as 'linhas' e colunas 'indices' da aba, com values.batchGet
+    (um intervalo por bloco contíguo de linhas x bloco contíguo de colunas).
+    Com linhas=None lê as colunas inteiras (a partir da linha 2).
+    """
+    blocos_linhas = _agrupar(linhas) if linhas is not None else [(2, None)]
+    intervalos = []
+    for col_ini, col_fim in _agrupar(indices):
+        for lin_ini, lin_fim in blocos_linhas:
+            intervalos.append((lin_ini, lin_fim, col_ini, col_fim))
+
+    celulas = {}  # (linha, coluna) -> valor
+    encontradas = set()
+    a1 = [
+        f"'{nome_aba}'!{coluna_letra(ci)}{li}:{coluna_letra(cf)}{lf if lf is not None else ''}"
+        for li, lf, ci, cf in intervalos
+    ]
+    for (li, lf, ci, cf), faixa in zip(intervalos, values_batch_get(a1)):
+        for dl, valores in enumerate(faixa.get("values", [])):
+            encontradas.add(li + dl)
+            for dc, valor in enumerate(valores):
+                celulas[(li + dl, ci + dc)] = valor
+
+    registros = []
+    for linha in (sorted(linhas) if linhas is not None else sorted(encontradas)):
+        registro = {cabecalho[c]: celulas.get((linha, c), "") for c in indices}
+        registro["_linha"] = linha
+        registros.append(registro)
+    return registros
+
+def linhas_do_proprietario(nome_aba, proprietario):
+    """Números de linha (em ordem) do proprietário na aba."""
+    return list(_mapa_proprietarios(nome_aba)["linhas"].get(_chave_owner(proprietario), []))
+
+def select(nome_aba, columns=None, where=None, linhas=None):
+    """
+    Consulta na aba trazendo só as colunas pedidas.
+
+    - columns: nomes das colunas (None = todas);
+    - where: igualdade por coluna. 'proprietario' é resolvido pelo mapa
+      proprietário -> linhas, então só as linhas daquele dono são baixadas;
+      as demais condições são verificadas localmente;
+    - linhas: restringe a leitura a estes números de linha (paginação).
+
+    Retorna uma lista de dicionários na ordem da aba, cada um com '_linha'.
+    """
+    where = {(k or "").strip().lower(): v for k, v in (where or {}).items()}
+    mapa = _mapa_proprietarios(nome_aba)
+    cabecalho = mapa["cabecalho"]
+    por_nome = {(h or "").strip().lower(): h for h in cabecalho if h}
+
+    pedidas = {(c or "").strip().lower() for c in (columns or por_nome)}
+    indices = [i for i, h in enumerate(cabecalho)
+               if (h or "").strip().lower() in pedidas | set(where)]
+    if not indices:
+        return []
+
+    alvo = linhas
+    if "proprietario" in where:
+        alvo = mapa["linhas"].get(_chave_owner(where.pop("proprietario")), [])
+        if linhas is not None:
+            permitidas = set(linhas)
+            alvo = [n for n in alvo if n in permitidas]
+        if not alvo:
+            return []
+
+    atual = espelho_carregado(nome_aba)
+    if atual is not None:
+        # Aba espelhada: as linhas saem da cópia (sincronizada na requisição);
+        # só as que ela ainda não tem vão ao Google
+        registros, faltando = atual.linhas(alvo, indices)
+        if faltando:
+            registros = sorted(registros + _ler_linhas(nome_aba, cabecalho, faltando, indices),
+                               key=lambda r: r["_linha"])
+    else:
+        registros = _ler_linhas(nome_aba, cabecalho, alvo, indices)
+
+    resultado = []
+    for registro in registros:
+        if not all(_chave_owner(registro.get(por_nome.get(k, k))) == _chave_owner(v) for k, v in where.items()):
+            continue
+        if columns:
+            registro = {k: v for k, v in registro.items()
+                        if k == "_linha" or (k or "").strip().lower() in pedidas}
+        resultado.append(registro)
+    return resultado
+
+# -----------------------------------------------------------------
+# Espelho incremental das abas que só crescem
+# -----------------------------------------------------------------
+# clientes, oportunidades e usuarios quase só recebem append_row. Em vez de
+# baixar a aba inteira a cada leitura, o processo guarda uma cópia e, a
+# cada sincronização, lê em um único batchGet:
+#   - a cauda (linhas depois da última sincronizada);
+#   - uma amostra de linhas já conhecidas (cabeçalho, última linha e
+#     AMOSTRAS_ESPELHO linhas espalhadas, em posições que mudam a cada
+#     rodada), comparada com a cópia: qualquer diferença (edição manual,
+#     linhas apagadas pelo arquivamento) força a releitura completa;
+#   - as linhas alteradas por este processo (atualizar_celulas).
+# O custo de uma sincronização é proporcional às linhas novas. Edições
+# fora da amostra (oportunidades é editada no lugar) são detectadas pela
+# versão da planilha no Drive: se ela mudou sem nenhuma escrita do portal
+# (versao_escritas), a aba é relida inteira. A cada RESYNC_ESPELHO segundos
+# a aba também é relida inteira, para o caso de uma edição pela interface
+# coincidir com uma escrita do portal.
+ABAS_ESPELHADAS = ("clientes", "oportunidades", "usuarios")
+AMOSTRAS_ESPELHO = int(os.environ.get("ESPELHO_AMOSTRAS", "8"))
+RESYNC_ESPELHO = int(os.environ.get("ESPELHO_RESYNC", "900"))
+
+def _sem_vazios_finais(linha):
+    """Linha sem as células vazias do fim (o batchGet não as devolve; get_all_values completa)."""
+    linha = list(linha or [])
+    while linha and linha[-1] == "":
+        linha.pop()
+    return linha
+
+class EspelhoAba:
+    """Cópia local de uma aba (valores e registros), sincronizada pela cauda."""
+
+    def __init__(self, nome_aba):
+        self.nome_aba = nome_aba
+        self.valores = []    # como get_all_values (cabeçalho na primeira)
+        self.registros = []  # como get_all_records
+        self.recarregado_em = 0.0
+        self.rodada = 0
+        self.sujas = set()   # linhas alteradas por este processo
+        self.versao_remota = None  # versão da planilha no Drive já refletida na cópia
+        self.escritas = None       # versao_escritas() quando versao_remota foi aceita
+        self.ids = None      # id -> número da linha (montado na primeira busca por id)
+        self.lock = threading.Lock()
+
+    def _completa(self):
+        # Versões lidas antes da aba: uma edição durante a leitura força outra releitura
+        self.versao_remota = versao_planilha(planilha_da_aba(self.nome_aba).id)
+        self.escritas = versao_escritas()
+        valores = get_aba(self.nome_aba).get_all_values()
+        self.valores = [list(v) for v in valores]
+        self.registros = _registros(self.valores)
+        self.recarregado_em = time.monotonic()
+        self.sujas = set()
+        self.ids = None
+        _reindexar_proprietarios(self)
+
+    def _amostra(self):
+        """Números de linha conferidos nesta rodada (sempre o cabeçalho e a última)."""
+        total = len(self.valores)
+        linhas = {1, total}
+        if total > 2 and AMOSTRAS_ESPELHO:
+            passo = max((total - 1) // AMOSTRAS_ESPELHO, 1)
+            deslocamento = self.rodada % passo
+            linhas.update(range(2 + deslocamento, total, passo))
+        return sorted(linhas)
+
+    def _substituir(self, numero, linha):
+        largura = len(self.valores[0])
+        linha = (list(linha) + [""] * largura)[:largura]
+        self.valores[numero - 1] = linha
+        self.registros[numero - 2] = _registros([self.valores[0], linha])[0]
+        self.ids = None
+
+    def _indexar_ids(self, primeira):
+        normalizado = [(h or "").strip().lower() for h in self.valores[0]] if self.valores else []
+        if "id" not in normalizado:
+            return
+        coluna = normalizado.index("id")
+        for numero in range(primeira, len(self.valores) + 1):
+            valores = self.valores[numero - 1]
+            if coluna < len(valores):
+                # Id repetido: vale a primeira linha, como na varredura da aba
+                self.ids.setdefault(str(valores[coluna]).strip(), numero)
+
+    def registro_por_id(self, id_busca):
+        """(linha, registro com os valores da linha) do id na cópia, ou (None, None)."""
+        with self.lock:
+            if self.ids is None:
+                self.ids = {}
+                self._indexar_ids(2)
+            linha = self.ids.get(str(id_busca).strip())
+            if linha is None:
+                return None, None
+            valores, cabecalho = self.valores[linha - 1], self.valores[0]
+            return linha, {h: (valores[c] if c < len(valores) else "") for c, h in enumerate(cabecalho)}
+
+    def linhas(self, numeros, indices):
+        """
+        Registros das linhas 'numeros' (None = todas), só com as colunas
+        'indices', como _ler_linhas. Retorna também as linhas que a cópia
+        ainda não tem.
+        """
+        with self.lock:
+            cabecalho = self.valores[0] if self.valores else []
+            if numeros is None:
+                numeros = range(2, len(self.valores) + 1)
+            registros, faltando = [], []
+            for numero in sorted(numeros):
+                if numero > len(self.valores):
+                    faltando.append(numero)
+                    continue
+                valores = self.valores[numero - 1]
+                registro = {cabecalho[c]: (valores[c] if c < len(valores) else "") for c in indices}
+                registro["_linha"] = numero
+                registros.append(registro)
+            return registros, faltando
+
+    def registros_atuais(self):
+        """Registros da aba sem copiá-los agora (ver RegistrosEspelhados)."""
+        with self.lock:
+            return RegistrosEspelhados(list(self.registros))
+
+    def sincronizar(self):
+        """Traz as mudanças da planilha. Retorna o número de linhas novas (-1 se relida inteira)."""
+        with self.lock:
+            if len(self.valores) < 1 or time.monotonic() - self.recarregado_em > RESYNC_ESPELHO:
+                self._completa()
+                return -1
+
+            remota = versao_planilha(planilha_da_aba(self.nome_aba).id)
+            # Versão "t..." = Drive indisponível; fica só a amostra
+            if remota != self.versao_remota and not remota.startswith("t"):
+                escritas = versao_escritas()
+                if escritas == self.escritas:
+                    # A planilha mudou sem escrita do portal: edição pela interface do Google
+                    self._completa()
+                    return -1
+                self.versao_remota, self.escritas = remota, escritas
+
+            self.rodada += 1
+            total = len(self.valores)
+            ultima = coluna_letra(max(len(self.valores[0]), 1) - 1)
+            amostra = self._amostra()
+            sujas = sorted(n for n in self.sujas if 2 <= n <= total and n not in amostra)
+            intervalos = [f"'{self.nome_aba}'!A{total + 1}:{ultima}"] + [
+                f"'{self.nome_aba}'!A{n}:{ultima}{n}" for n in amostra + sujas
+            ]
+            faixas = values_batch_get(intervalos)
+
+            lidas = [(faixa.get("values") or [[]])[0] for faixa in faixas[1:]]
+            for numero, linha in zip(amostra, lidas):
+                if _sem_vazios_finais(linha) != _sem_vazios_finais(self.valores[numero - 1]):
+                    if numero not in self.sujas:
+                        self._completa()
+                        return -1
+                    self._substituir(numero, linha)
+            for numero, linha in zip(sujas, lidas[len(amostra):]):
+                self._substituir(numero, linha)
+            self.sujas = set()
+
+            largura = len(self.valores[0])
+            novas = [(list(v) + [""] * largura)[:largura] for v in faixas[0].get("values", [])]
+            if novas:
+                self.valores.extend(novas)
+                self.registros.extend(_registros([self.valores[0]] + novas))
+                if self.ids is not None:
+                    self._indexar_ids(total + 1)
+                _indexar_proprietarios(self, total + 1)
+            return len(novas)
+
+_espelhos = {}  # aba -> EspelhoAba
+_espelhos_lock = threading.Lock()
+
+def espelho(nome_aba, sincronizar=True):
+    """
+    Espelho da aba, sincronizado uma vez por requisição (None se a aba
+    não é espelhada).
+    """
+    if nome_aba not in ABAS_ESPELHADAS:
+        return None
+    with _espelhos_lock:
+        atual = _espelhos.setdefault(nome_aba, EspelhoAba(nome_aba))
+    if sincronizar:
+        memoizar(("espelho", nome_aba), atual.sincronizar)
+    return atual
+
+def espelho_carregado(nome_aba):
+    """
+    Espelho da aba se ele já foi montado neste processo (sincronizado uma vez
+    por requisição); None se não, e quem chama lê só o que precisa do Google
+    em vez de baixar a aba inteira.
+    """
+    atual = _espelhos.get(nome_aba)
+    if atual is None or not atual.valores:
+        return None
+    return espelho(nome_aba)
+
+def marcar_linhas_alteradas(nome_aba, linhas):
+    """Linhas alteradas por este processo: relidas na próxima sincronização do espelho."""
+    atual = _espelhos.get(nome_aba)
+    if atual is not None:
+        with atual.lock:
+            atual.sujas.update(linhas)
+
+def _reindexar_proprietarios(atual):
+    """Espelho relido inteiro: remonta o mapa proprietário -> linhas a partir dele."""
+    cabecalho = atual.valores[0] if atual.valores else []
+    _mapas_owner[atual.nome_aba] = {
+        "versao": versao_planilha(planilha_da_aba(atual.nome_aba).id),
+        "cabecalho": cabecalho,
+        "linhas": {},
+    }
+    _indexar_proprietarios(atual, 2)
+
+def _indexar_proprietarios(atual, primeira):
+    """Acrescenta ao mapa proprietário -> linhas as linhas do espelho a partir de 'primeira'."""
+    mapa = _mapas_owner.get(atual.nome_aba)
+    if mapa is None:
+        return
+    normalizado = [(h or "").strip().lower() for h in mapa["cabecalho"]]
+    if "proprietario" not in normalizado:
+        return
+    coluna = normalizado.index("proprietario")
+    for numero in range(primeira, len(atual.valores) + 1):
+        linhas = mapa["linhas"].setdefault(_chave_owner(atual.valores[numero - 1][coluna]), [])
+        # O append deste processo pode já ter registrado a linha (registrar_append)
+        posicao = bisect.bisect_left(linhas, numero)
+        if posicao == len(linhas) or linhas[posicao] != numero:
+            linhas.insert(posicao, numero)
+
+# -----------------------------------------------------------------
+# Páginas lidas sob demanda (templates em streaming)
+# -----------------------------------------------------------------
+# Linhas do primeiro bloco: os primeiros cartões chegam ao navegador sem
+# esperar a leitura da página inteira (o resto vai em uma leitura só)
+BLOCO_INICIAL = int(os.environ.get("PAGINA_BLOCO_INICIAL", "5"))
+
+class PaginaStream:
+    """
+    Página de registros para stream_template. Nada é lido do Google até o
+    template iterar; aí os registros são entregues à medida que chegam.
+
+    'planejar()' retorna ([(aba, números de linha)], proximo). Depois da
+    iteração ficam disponíveis 'proximo' (cursor ou página seguinte, None
+    na última), 'total' e 'erro'.
+    """
+
+    def __init__(self, planejar, columns=None, where=None):
+        self.planejar = planejar
+        self.columns = columns
+        self.where = where
+        self.proximo = None
+        self.total = 0
+        self.erro = False
+
+    def __iter__(self):
+        try:
+            partes, self.proximo = self.planejar()
+            blocos = []
+            for nome_aba, linhas in partes:
+                if not linhas:
+                    continue
+                if not blocos:
+                    blocos.append((nome_aba, linhas[:BLOCO_INICIAL]))
+                    linhas = linhas[BLOCO_INICIAL:]
+                if linhas:
+                    blocos.append((nome_aba, linhas))
+            for nome_aba, linhas in blocos:
+                for registro in select(nome_aba, self.columns, self.where, linhas):
+                    self.total += 1
+                    yield registro
+        except Exception as e:
+            print(f"Erro ao ler página de registros: {e}")
+            self.proximo = None
+            self.erro = True
+
+# -----------------------------------------------------------------
+# Busca binária por id (ids ULID, ordenados por tempo)
+# -----------------------------------------------------------------
+# Células lidas por rodada da busca (busca k-ária: uma chamada batchGet por rodada)
+SONDAS_BUSCA = 16
+# Linhas lidas ao redor da posição encontrada. Cobre appends de workers
+# diferentes que chegam à planilha fora da ordem de geração dos ids.
+JANELA_BUSCA = 64
+
+def cabecalho_aba(nome_aba):
+    return _mapa_proprietarios(nome_aba)["cabecalho"]
+
+def _chave_ordem(valor):
+    """Ordem da coluna id: uuid4 antigos < ULIDs (por tempo) < células vazias (fim da aba)."""
+    valor = str(valor or "").strip().upper()
+    if not valor:
+        return (2, "")
+    if auth.eh_ulid(valor):
+        return (1, valor)
+    return (0, "")
+
+class _BuscaId:
+    """
+    Estado de uma busca k-ária por id ULID. Cada rodada pede alguns
+    intervalos (intervalos()) e recebe as respostas (receber()); assim várias
+    buscas podem compartilhar a mesma chamada batchGet (ver PlanoLeitura).
+    """
+
+    def __init__(self, nome_aba, id_busca, cabecalho, col_id):
+        self.nome_aba = nome_aba
+        self.cabecalho = cabecalho
+        self.col_id = col_id
+        self.alvo = (1, str(id_busca).strip().upper())
+        # Invariante: chave(lo) < alvo <= chave(hi). A linha 1 é o cabeçalho e
+        # o total de linhas + 1 fica além do fim da grade.
+        self.total = linhas_na_grade(nome_aba)
+        self.lo, self.hi = 1, self.total + 1
+        self.sondas = None
+        self.terminada = False
+        self.linha = self.registro = None
+
+    @classmethod
+    def criar(cls, nome_aba, id_busca):
+        """Retorna a busca, ou None se o id não for ULID ou a aba não tiver coluna 'id'."""
+        if not auth.eh_ulid(id_busca):
+            return None
+        cabecalho = cabecalho_aba(nome_aba)
+        normalizado = [(h or "").strip().lower() for h in cabecalho]
+        if "id" not in normalizado:
+            return None
+        return cls(nome_aba, id_busca, cabecalho, normalizado.index("id"))
+
+    def intervalos(self):
+        if self.hi - self.lo > JANELA_BUSCA:
+            passo = (self.hi - self.lo) / (SONDAS_BUSCA + 1)
+            self.sondas = sorted({self.lo + max(1, int(passo * i)) for i in range(1, SONDAS_BUSCA + 1)} - {self.hi})
+            letra = coluna_letra(self.col_id)
+            return [f"'{self.nome_aba}'!{letra}{n}" for n in self.sondas]
+
+        # Janela final: linhas inteiras ao redor da posição encontrada
+        self.sondas = None
+        self.inicio = max(2, self.lo - JANELA_BUSCA)
+        fim = min(self.hi + JANELA_BUSCA, max(self.total, self.inicio))
+        ultima = coluna_letra(len(self.cabecalho) - 1)
+        return [f"'{self.nome_aba}'!A{self.inicio}:{ultima}{fim}"]
+
+    def receber(self, faixas):
+        if self.sondas is not None:
+            for linha, faixa in zip(self.sondas, faixas):
+                v = faixa.get("values", [])
+                valor = v[0][0] if v and v[0] else ""
+                if _chave_ordem(valor) < self.alvo:
+                    self.lo = linha
+                else:
+                    self.hi = linha
+                    break
+            return
+
+        self.terminada = True
+        for deslocamento, valores in enumerate(faixas[0].get("values", []) if faixas else []):
+            id_linha = valores[self.col_id] if len(valores) > self.col_id else ""
+            if str(id_linha).strip().upper() == self.alvo[1]:
+                self.linha = self.inicio + deslocamento
+                self.registro = {h: (valores[c] if c < len(valores) else "")
+                                 for c, h in enumerate(self.cabecalho)}
+                return
+
+def buscar_registro_por_id(nome_aba, id_busca):
+    """
+    Localiza um registro de id ULID sem baixar a aba: busca k-ária na coluna
+    'id' (O(log n) leituras de poucas células) seguida da leitura de uma
+    pequena janela de linhas.
+
+    Retorna (linha, registro), ou (None, None) se o id não for ULID ou não
+    estiver na janela; nesses casos quem chama faz a varredura completa.
+    """
+    def ler():
+        atual = espelho_carregado(nome_aba)
+        if atual is not None:
+            # A cópia tem a aba inteira: o id sai do índice dela
+            return atual.registro_por_id(id_busca)
+        busca_id = _BuscaId.criar(nome_aba, id_busca)
+        if busca_id is None:
+            return None, None
+        while not busca_id.terminada:
+            busca_id.receber(values_batch_get(busca_id.intervalos()))
+        return busca_id.linha, busca_id.registro
+
+    return memoizar(("id", nome_aba, str(id_busca).strip()), ler)
+
+# -----------------------------------------------------------------
+# Abas de arquivo de oportunidades (ver arquivamento.py)
+# -----------------------------------------------------------------
+def aba_arquivo(ano):
+    return f"{ABA_OPORTUNIDADES}_{ano}"
+
+def abas_arquivo():
+    """Abas de arquivo existentes, da mais recente para a mais antiga."""
+    return sorted((nome for nome in _linhas_das_abas(spreadsheet_arquivo) if ABA_ARQUIVO.match(nome)),
+                  reverse=True)
+
+def abas_da_tabela(nome_aba):
+    """
+    Abas que compõem a tabela: a própria aba e, para oportunidades, as de
+    arquivo. É um gerador, então quem para na aba principal não chega a
+    consultar os metadados do arquivo.
+    """
+    yield nome_aba
+    if nome_aba == ABA_OPORTUNIDADES:
+        yield from abas_arquivo()
+
+def abas_candidatas(id_registro):
+    """
+    Abas de arquivo onde procurar uma oportunidade que não está na aba
+    principal. Um ULID traz o instante de criação, que é o mesmo do datacad:
+    só a aba daquele ano é consultada. Ids antigos (uuid4) passam por
+    todas, da mais recente para a mais antiga.
+    """
+    abas = abas_arquivo()
+    if not auth.eh_ulid(id_registro):
+        return abas
+    criado = datetime.fromtimestamp(auth.instante_ulid(id_registro), timezone.utc) - timedelta(hours=3)
+    nome = aba_arquivo(criado.year)
+    return [nome] if nome in abas else []
+
+def buscar_oportunidade_arquivada(id_opp):
+    """Oportunidade (normalizada) nas abas de arquivo, ou None."""
+    id_busca = str(id_opp).strip()
+    for nome_aba in abas_candidatas(id_busca):
+        _, registro = buscar_registro_por_id(nome_aba, id_busca)
+        if registro is None:
+            registro = next((r for r in ler_registros(nome_aba)
+                             if str(r.get("id", "")).strip() == id_busca), None)
+        if registro:
+            return normalizar_oportunidade(registro)
+    return None
+
+# -----------------------------------------------------------------
+# Plano de leitura (várias abas em uma ida ao Google)
+# -----------------------------------------------------------------
+def _registros(valores):
+    """Linhas da aba (cabeçalho na primeira) -> dicionários, como get_all_records."""
+    if not valores:
+        return []
+    cabecalho = valores[0]
+    registros = []
+    for linha in valores[1:]:
+        linha = list(linha) + [""] * (len(cabecalho) - len(linha))
+        registros.append(dict(zip(cabecalho, numericise_all(linha[:len(cabecalho)]))))
+    return registros
+
+class Pedido:
+    """Um item do plano de leitura; 'valor' fica disponível após executar()."""
+
+    def __init__(self, nome_aba, id_registro=None, origem=None, campo=None, tabela=False):
+        self.nome_aba = nome_aba
+        self.id = id_registro
+        self.origem = origem
+        self.campo = campo
+        self.tabela = tabela
+        self.busca = None
+        self.pronto = False
+        self.valor = None
+        # Oportunidade fora da aba principal: próximas abas a consultar e
+        # abas a ler inteiras sem busca binária
+        self.candidatas = None
+        self.varrer = set()
+
+    def concluir(self, valor):
+        self.valor = valor
+        self.pronto = True
+
+class PlanoLeitura:
+    """
+    Leituras que uma rota precisa, declaradas antes de ir ao Google:
+
+        plano = PlanoLeitura()
+        produtos = plano.tabela("produtos")
+        opp = plano.registro("oportunidades", id_opp)
+        cliente = plano.registro("clientes", origem=opp, campo="cliente_id")
+        plano.executar()
+
+    Em cada rodada, tudo o que está pendente (abas inteiras e sondas das
+    buscas por id) vai em uma única chamada values.batchGet. Pedidos
+    independentes compartilham as mesmas rodadas; um pedido que depende de
+    outro (origem/campo) começa assim que o id dele é conhecido.
+
+    Uma oportunidade que não está na aba principal é procurada nas abas de
+    arquivo (abas_candidatas), nas rodadas seguintes.
+    """
+
+    def __init__(self):
+        self.pedidos = []
+        self.mudou = False
+
+    def tabela(self, nome_aba):
+        """Aba inteira, como lista de dicionários."""
+        pedido = Pedido(nome_aba, tabela=True)
+        self.pedidos.append(pedido)
+        return pedido
+
+    def registro(self, nome_aba, id_registro=None, origem=None, campo=None):
+        """
+        Registro pelo id. Com 'origem' (outro pedido) e 'campo', o id é lido
+        do registro de origem (ex.: cliente_id da oportunidade).
+        """
+        pedido = Pedido(nome_aba, id_registro, origem, campo)
+        self.pedidos.append(pedido)
+        return pedido
+
+    def _mudar_de_aba(self, pedido):
+        """Registro não encontrado: passa o pedido para a próxima aba candidata, se houver."""
+        if pedido.tabela:
+            return False
+        if pedido.candidatas is None:
+            if pedido.nome_aba != ABA_OPORTUNIDADES:
+                return False
+            pedido.candidatas = abas_candidatas(pedido.id)
+        if not pedido.candidatas:
+            return False
+        pedido.nome_aba = pedido.candidatas.pop(0)
+        pedido.busca = None
+        self.mudou = True
+        return True
+
+    def _resolver(self, tabelas, inteiras, memo):
+        """Avança os pedidos; retorna (abas a ler inteiras, buscas desta rodada)."""
+        self.mudou = False
+        ler_inteiras = set()
+        buscas = []
+        for pedido in self.pedidos:
+            if pedido.pronto:
+                continue
+            if pedido.origem is not None and pedido.id is None:
+                if not pedido.origem.pronto:
+                    continue
+                pedido.id = str((pedido.origem.valor or {}).get(pedido.campo) or "").strip()
+                if not pedido.id:
+                    pedido.concluir(None)
+                    continue
+
+            if pedido.nome_aba not in tabelas and ("registros", pedido.nome_aba) in memo:
+                tabelas[pedido.nome_aba] = _copiar(memo[("registros", pedido.nome_aba)])
+            chave_id = ("id", pedido.nome_aba, str(pedido.id).strip())
+            if not pedido.tabela and memo.get(chave_id, (None, None))[1] is not None:
+                pedido.concluir(_copiar(memo[chave_id][1]))
+                continue
+
+            atual = None if pedido.tabela else espelho_carregado(pedido.nome_aba)
+            if atual is not None:
+                # Aba espelhada: o registro sai do índice de ids da cópia, sem busca
+                linha, valor = atual.registro_por_id(pedido.id)
+                if valor is not None:
+                    memo[chave_id] = (linha, valor)
+                    pedido.concluir(_copiar(valor))
+                elif not self._mudar_de_aba(pedido):
+                    pedido.concluir(None)
+                continue
+
+            if pedido.nome_aba in tabelas:
+                if pedido.tabela:
+                    pedido.concluir(tabelas[pedido.nome_aba])
+                else:
+                    id_busca = str(pedido.id).strip()
+                    valor = next((r for r in tabelas[pedido.nome_aba]
+                                  if str(r.get("id", "")).strip() == id_busca), None)
+                    if valor is not None or not self._mudar_de_aba(pedido):
+                        pedido.concluir(valor)
+                continue
+
+            # A aba já será lida inteira: o registro sai dela
+            if pedido.tabela or pedido.nome_aba in inteiras:
+                ler_inteiras.add(pedido.nome_aba)
+                continue
+
+            if pedido.busca is None:
+                if pedido.nome_aba not in pedido.varrer:
+                    pedido.busca = _BuscaId.criar(pedido.nome_aba, pedido.id)
+                if pedido.busca is None:
+                    # Id antigo (uuid4): varredura completa
+                    ler_inteiras.add(pedido.nome_aba)
+                    continue
+            if pedido.busca.terminada:
+                if pedido.busca.registro is not None:
+                    memo[chave_id] = (pedido.busca.linha, pedido.busca.registro)
+                    pedido.concluir(_copiar(pedido.busca.registro))
+                elif pedido.nome_aba == ABA_OPORTUNIDADES and pedido.candidatas is None:
+                    # Antes de varrer a aba principal, tenta o arquivo do ano do id
+                    pedido.candidatas = abas_candidatas(pedido.id) + [pedido.nome_aba]
+                    pedido.varrer.add(pedido.nome_aba)
+                    self._mudar_de_aba(pedido)
+                else:
+                    ler_inteiras.add(pedido.nome_aba)
+                continue
+            buscas.append(pedido.busca)
+        return ler_inteiras, buscas
+
+    def executar(self):
+        """Executa o plano. Retorna False (e deixa os pedidos sem valor) em caso de erro."""
+        tabelas = {}
+        inteiras = {p.nome_aba for p in self.pedidos if p.tabela}
+        # Leituras já feitas nesta requisição não vão de novo ao Google
+        unidade = unidade_atual()
+        memo = unidade.leituras if unidade is not None else {}
+        try:
+            while True:
+                ler_inteiras, buscas = self._resolver(tabelas, inteiras, memo)
+                espelhadas = {nome for nome in ler_inteiras if nome in ABAS_ESPELHADAS}
+                if espelhadas:
+                    # Abas espelhadas: só a cauda vai ao Google (ver EspelhoAba)
+                    for nome in espelhadas:
+                        memo[("registros", nome)] = espelho(nome).registros_atuais()
+                        tabelas[nome] = memo[("registros", nome)]
+                    ler_inteiras -= espelhadas
+                    if not ler_inteiras and not buscas:
+                        continue
+                if not ler_inteiras and not buscas:
+                    if self.mudou:
+                        continue
+                    return True
+
+                ler_inteiras = sorted(ler_inteiras)
+                intervalos = [f"'{nome}'" for nome in ler_inteiras]
+                partes = []
+                for busca_id in buscas:
+                    pedidos = busca_id.intervalos()
+                    partes.append((busca_id, len(pedidos)))
+                    intervalos.extend(pedidos)
+
+                faixas = values_batch_get(intervalos)
+                for nome, faixa in zip(ler_inteiras, faixas):
+                    memo[("registros", nome)] = _registros(faixa.get("values", []))
+                    tabelas[nome] = _copiar(memo[("registros", nome)])
+                posicao = len(ler_inteiras)
+                for busca_id, quantidade in partes:
+                    busca_id.receber(faixas[posicao:posicao + quantidade])
+                    posicao += quantidade
+        except Exception as e:
+            print(f"Erro ao executar plano de leitura: {e}")
+            return False
 
 # Usuários
 def listar_usuarios():
-    return get_aba("usuarios").get_all_records()
+    return ler_registros("usuarios")
 
 def salvar_usuario(email, senha_hash, ativo=False, nome="", sobrenome="", cidade="", telefone=""):
     id, codigo = auth.gerar_identificador("usuario")
-    get_aba("usuarios").append_row([
+    anexar_linha("usuarios", [
         id,
         codigo,
         email,
@@ -41,14 +1224,32 @@ def salvar_usuario(email, senha_hash, ativo=False, nome="", sobrenome="", cidade
         sobrenome,
         cidade,
         telefone
-    ])
+    ], ao_gravar=lambda resposta: marcar_alteracao("usuarios"))
+
+def atualizar_senha_usuario(linha, user_id, senha_hash):
+    """
+    Regrava o hash da senha do usuário na 'linha' (rehash no login). Confere
+    antes que a linha ainda é do mesmo id; retorna False se não for.
+    """
+    cabecalho = [(h or "").strip().lower() for h in cabecalho_aba("usuarios")]
+    coluna = "senha" if "senha" in cabecalho else "senha_hash"
+    if coluna not in cabecalho or "id" not in cabecalho:
+        return False
+    atual = get_aba("usuarios").cell(linha, cabecalho.index("id") + 1).value
+    if str(atual or "").strip() != str(user_id or "").strip():
+        return False
+    atualizar_celulas("usuarios", linha, {cabecalho.index(coluna) + 1: senha_hash},
+                      ao_gravar=lambda: marcar_alteracao("usuarios"))
+    return True
+
 #produtos
 def listar_produtos():
-    aba = get_aba("produtos")  # Nome da guia no Sheets
-    linhas = aba.get_all_records()
-    return linhas
+    return ler_registros("produtos")  # Nome da guia no Sheets
 
 # Clientes
+CABECALHO_CLIENTES = ["id", "codigo", "nome", "cpf", "nascimento", "email", "telefone", "proprietario",
+                      "datacad", "cep", "estado", "municipio", "logradouro", "numero"]
+
 def salvar_cliente(nome, email, telefone, proprietario, datacad,
                    cpf=None, nascimento=None,
                    cep=None, estado=None, municipio=None, logradouro=None, numero=None):
@@ -79,14 +1280,12 @@ def salvar_cliente(nome, email, telefone, proprietario, datacad,
         "numero": (numero or "")
     }
 
-    aba = get_aba("clientes")
     # Lê cabeçalho atual da planilha para respeitar a ordem das colunas
-    valores = aba.get_all_values()
-    if valores and len(valores) >= 1:
-        cabecalho = valores[0]
-    else:
+    # (só a linha 1, reaproveitada enquanto a planilha não muda)
+    cabecalho = cabecalho_aba("clientes")
+    if not cabecalho:
         # fallback para ordem esperada
-        cabecalho = ["id", "codigo", "nome", "cpf", "nascimento", "email", "telefone", "proprietario", "datacad", "cep", "estado", "municipio", "logradouro", "numero"]
+        cabecalho = CABECALHO_CLIENTES
 
     # Monta a linha respeitando a ordem do cabeçalho (normalizando nomes)
     linha_para_salvar = []
@@ -94,11 +1293,97 @@ def salvar_cliente(nome, email, telefone, proprietario, datacad,
         key = (h or "").strip().lower()
         linha_para_salvar.append(valores_map.get(key, ""))
 
-    aba.append_row(linha_para_salvar)
+    def ao_gravar(resposta):
+        marcar_alteracao("clientes")
+        registrar_append("clientes", resposta, proprietario)
+        # Atualiza o índice de busca do proprietário sem reler a aba
+        busca.registrar_cliente(valores_map, versao=_versao_busca(proprietario))
+
+    anexar_linha("clientes", linha_para_salvar, ao_gravar)
+    return valores_map
+
+def salvar_clientes_em_lote(clientes, proprietario, datacad):
+    """
+    Grava vários clientes com um único append_rows (importação em massa).
+    Os clientes já vêm validados e normalizados (importacao.py).
+    """
+    cabecalho = cabecalho_aba("clientes") or CABECALHO_CLIENTES
+    linhas = []
+    mapas = []
+    for cliente in clientes:
+        id, codigo = auth.gerar_identificador("cliente")
+        valores_map = dict(cliente, id=id, codigo=codigo, proprietario=proprietario, datacad=datacad)
+        mapas.append(valores_map)
+        linhas.append([valores_map.get((h or "").strip().lower(), "") for h in cabecalho])
+
+    resposta = get_aba("clientes").append_rows(linhas)
+    marcar_alteracao("clientes")
+    primeira = _linha_do_append(resposta)
+    for deslocamento, valores_map in enumerate(mapas):
+        registrar_append("clientes", _resposta_da_linha("clientes", primeira + deslocamento) if primeira else None,
+                         proprietario)
+        busca.registrar_cliente(valores_map, versao=_versao_busca(proprietario))
+    return mapas
+
+def listar_clientes():
+    """Todos os clientes (uma leitura da aba)."""
+    return ler_registros("clientes")
 
 def listar_clientes_por_owner(owner_id):
-    todos = get_aba("clientes").get_all_records()
-    return [c for c in todos if str(c.get("proprietario")) == str(owner_id)]
+    # Só as linhas do proprietário são baixadas (ver select)
+    return select("clientes", where={"proprietario": owner_id})
+
+def pagina_clientes_por_owner(owner_id, apos_linha=1, limite=20):
+    """
+    Página de clientes do proprietário a partir de uma posição na aba, lida
+    sob demanda (PaginaStream).
+
+    O cursor é o número da linha do último cliente entregue. Como a aba só
+    cresce por append, a posição é estável: novos cadastros não deslocam as
+    páginas seguintes. Só as linhas da página são baixadas.
+    """
+    apos_linha = max(int(apos_linha or 1), 1)
+
+    def planejar():
+        # Um registro a mais que o limite indica se há próxima página
+        seguintes = [n for n in linhas_do_proprietario("clientes", owner_id) if n > apos_linha][:limite + 1]
+        proximo = seguintes[limite - 1] if len(seguintes) > limite else None
+        return [("clientes", seguintes[:limite])], proximo
+
+    return PaginaStream(planejar, where={"proprietario": owner_id})
+
+def listar_clientes_por_owner_cursor(owner_id, apos_linha=1, limite=20):
+    """
+    Página de clientes do proprietário (ver pagina_clientes_por_owner).
+    Retorna (clientes, proximo_cursor); proximo_cursor é None na última página.
+    Com erro de leitura retorna (None, None): não é o fim da lista.
+    """
+    pagina = pagina_clientes_por_owner(owner_id, apos_linha, limite)
+    clientes = list(pagina)
+    if pagina.erro:
+        return None, None
+    return clientes, pagina.proximo
+
+def _versao_busca(proprietario):
+    """Linhas do proprietário em 'clientes' já conhecidas pelo mapa, sem ir ao Google (None sem mapa)."""
+    mapa = _mapas_owner.get("clientes")
+    return tuple(mapa["linhas"].get(_chave_owner(proprietario), [])) if mapa else None
+
+def buscar_clientes(owner_id, consulta, limite=busca.LIMITE_PADRAO):
+    """
+    Autocomplete de clientes do proprietário (nome, CPF, email, telefone, município).
+    Usa o índice em memória de busca.py, versionado pelas linhas do
+    proprietário em 'clientes': linhas novas são lidas sozinhas e a aba só
+    é relida para remontar o índice.
+    """
+    return busca.buscar(
+        owner_id,
+        consulta,
+        carregar=lambda: listar_clientes_por_owner(owner_id),
+        versao=tuple(linhas_do_proprietario("clientes", owner_id)),
+        carregar_novas=lambda linhas: select("clientes", where={"proprietario": owner_id}, linhas=linhas),
+        limite=limite,
+    )
 
 def buscar_cliente_por_proprietario(proprietario_id):
     """
@@ -107,7 +1392,7 @@ def buscar_cliente_por_proprietario(proprietario_id):
     Inclui todos os dados do cliente: endereço, CPF, telefone, etc.
     """
     try:
-        todos = get_aba("clientes").get_all_records()
+        todos = ler_registros("clientes")
         prop_busca = str(proprietario_id).strip()
         for cliente in todos:
             if str(cliente.get("proprietario", "")).strip() == prop_busca:
@@ -123,7 +1408,12 @@ def buscar_cliente_por_id(cliente_id):
     Retorna um dicionário com todos os dados do cliente.
     """
     try:
-        todos = get_aba("clientes").get_all_records()
+        # Ids novos (ULID): busca binária; ids antigos (uuid4): varredura completa
+        _, cliente = buscar_registro_por_id("clientes", cliente_id)
+        if cliente:
+            return cliente
+
+        todos = ler_registros("clientes")
         id_busca = str(cliente_id).strip()
         for cliente in todos:
             if str(cliente.get("id", "")).strip() == id_busca:
@@ -133,13 +1423,14 @@ def buscar_cliente_por_id(cliente_id):
         print(f"Erro ao buscar cliente por ID ({cliente_id}): {e}")
         return None
 
-def buscar_cliente_por_email_e_proprietario(email, proprietario_id):
+def buscar_cliente_por_email_e_proprietario(email, proprietario_id, clientes=None):
     """
     Busca um cliente pelo email E proprietário (mais específico).
     Útil quando há múltiplos clientes do mesmo proprietário.
+    'clientes' evita a leitura da aba quando ela já foi lida (PlanoLeitura).
     """
     try:
-        todos = get_aba("clientes").get_all_records()
+        todos = clientes if clientes is not None else ler_registros("clientes")
         email_busca = str(email).strip().lower()
         prop_busca = str(proprietario_id).strip()
         for cliente in todos:
@@ -151,6 +1442,47 @@ def buscar_cliente_por_email_e_proprietario(email, proprietario_id):
         print(f"Erro ao buscar cliente por email e proprietário: {e}")
         return None
 
+def _parse_brazil_number(val):
+    """
+    Normaliza strings numéricas no formato brasileiro (ex: "28\u00a0000,00" ou "1 835,56")
+    para float (28000.0, 1835.56). Retorna o valor original se não for possível.
+    """
+    if val is None:
+        return val
+    # Se já for numérico, retorna como float/int óbvio
+    if isinstance(val, (int, float)):
+        return val
+    try:
+        s = str(val)
+        # Remove símbolos de moeda e espaços em branco (inclui NBSP)
+        s = s.replace('\u00a0', '').replace('\xa0', '')
+        s = s.replace('R$', '').replace('r$', '')
+        s = s.replace('\u20ac', '')
+        # Remove espaços normais
+        s = s.replace(' ', '')
+        # Se já contém apenas dígitos e ponto, tentar converter direto
+        # Troca vírgula decimal por ponto
+        if ',' in s and s.count(',') >= 1:
+            # Remove pontos de milhares (caso existam) e então trocar vírgula por ponto
+            s = s.replace('.', '')
+            s = s.replace(',', '.')
+        # Poder haver outros caracteres como non-breaking space, já limpos
+        return float(s)
+    except Exception:
+        return val
+
+def converter_numero(valor):
+    """Número (int/float) de um valor da planilha, aceitando o formato brasileiro; None se não for número."""
+    numero = _parse_brazil_number(valor)
+    return numero if isinstance(numero, (int, float)) and not isinstance(numero, bool) else None
+
+def normalizar_oportunidade(registro):
+    """Converte campos monetários/numéricos que possam vir formatados como string."""
+    for campo in ("preco", "valorParcela", "valorJuros", "valor", "finEntrada", "finParcela", "finTotal"):
+        if campo in registro:
+            registro[campo] = _parse_brazil_number(registro.get(campo))
+    return registro
+
 # -----------------------------------------------------------------
 # NOVA FUNÇÃO (Refatoração por ID)
 # -----------------------------------------------------------------
@@ -159,47 +1491,29 @@ def buscar_oportunidade_por_id(id_opp):
     Busca uma única oportunidade pelo seu ID.
     Usado no fluxo 'Continuar Oportunidade'.
     """
-    def _parse_brazil_number(val):
-        """
-        Normaliza strings numéricas no formato brasileiro (ex: "28\u00a0000,00" ou "1 835,56")
-        para float (28000.0, 1835.56). Retorna o valor original se não for possível.
-        """
-        if val is None:
-            return val
-        # Se já for numérico, retorna como float/int óbvio
-        if isinstance(val, (int, float)):
-            return val
-        try:
-            s = str(val)
-            # Remove símbolos de moeda e espaços em branco (inclui NBSP)
-            s = s.replace('\u00a0', '').replace('\xa0', '')
-            s = s.replace('R$', '').replace('r$', '')
-            s = s.replace('\u20ac', '')
-            # Remove espaços normais
-            s = s.replace(' ', '')
-            # Se já contém apenas dígitos e ponto, tentar converter direto
-            # Troca vírgula decimal por ponto
-            if ',' in s and s.count(',') >= 1:
-                # Remove pontos de milhares (caso existam) e então trocar vírgula por ponto
-                s = s.replace('.', '')
-                s = s.replace(',', '.')
-            # Poder haver outros caracteres como non-breaking space, já limpos
-            return float(s)
-        except Exception:
-            return val
-
     try:
-        aba = get_aba("oportunidades")
-        todos = aba.get_all_records() # get_all_records retorna lista de dicionários
+        # Ids novos (ULID): busca binária; ids antigos (uuid4): varredura completa
+        _, registro = buscar_registro_por_id("oportunidades", id_opp)
+        if registro:
+            return normalizar_oportunidade(registro)
+
+        # ULID fora da aba principal: em geral foi arquivado (uma busca no ano do id)
+        if auth.eh_ulid(id_opp):
+            arquivada = buscar_oportunidade_arquivada(id_opp)
+            if arquivada:
+                return arquivada
+
+        todos = ler_registros("oportunidades") # get_all_records retorna lista de dicionários
         id_busca = str(id_opp).strip()
 
         for registro in todos:
             if str(registro.get("id")).strip() == id_busca:
-                # Converte campos monetários/numéricos que possam vir formatados como string
-                for campo in ("preco", "valorParcela", "valorJuros", "valor"):
-                    if campo in registro:
-                        registro[campo] = _parse_brazil_number(registro.get(campo))
-                return registro # Retorna o dicionário da oportunidade encontrada
+                return normalizar_oportunidade(registro) # Retorna o dicionário da oportunidade encontrada
+
+        if not auth.eh_ulid(id_opp):
+            arquivada = buscar_oportunidade_arquivada(id_opp)
+            if arquivada:
+                return arquivada
         
         print(f"Oportunidade com ID {id_opp} não encontrada.")
         return None 
@@ -208,63 +1522,84 @@ def buscar_oportunidade_por_id(id_opp):
         return None
 # -----------------------------------------------------------------
 
+def listar_oportunidades():
+    """Todas as oportunidades (uma leitura da aba), com valores numéricos normalizados."""
+    return [normalizar_oportunidade(r) for r in ler_registros("oportunidades")]
+
+def listar_oportunidades_arquivadas():
+    """Oportunidades das abas de arquivo (lidas juntas em uma chamada batchGet)."""
+    abas = abas_arquivo()
+    faixas = values_batch_get([f"'{nome}'" for nome in abas])
+    return [normalizar_oportunidade(r) for faixa in faixas for r in _registros(faixa.get("values", []))]
+
+def painel_oportunidades():
+    """
+    Agregados do funil de vendas (ver painel.py). A aba só é lida, e apenas
+    nas colunas usadas, quando o painel precisa ser reconstruído.
+    """
+    try:
+        # Versões lidas antes da aba: uma edição durante a leitura força outra reconstrução
+        remota = versao_planilha()
+        return painel.obter(
+            lambda: [
+                normalizar_oportunidade(r)
+                for nome_aba in abas_da_tabela("oportunidades")
+                for r in select(nome_aba, columns=painel.COLUNAS)
+            ],
+            # Versão "t..." = Drive indisponível; fica só o RECALCULO_HORAS
+            versao_remota=None if remota.startswith("t") else remota,
+            escritas=versao_aba(ABA_OPORTUNIDADES),
+        )
+    except Exception as e:
+        print(f"Erro ao montar o painel de oportunidades: {e}")
+        return None
+
 def buscar_oportunidades_por_proprietario(proprietario):
     """
     Busca TODAS as oportunidades de um proprietário.
     (Nota: Não é mais usado no fluxo 'Continuar', mas pode ser útil em outros lugares).
     """
     try:
-        aba = get_aba("oportunidades")
-        todos = aba.get_all_records()
-
-        owner_busca = str(proprietario).strip().lower()
-        resultados = []
-
-        for registro in todos:
-            owner_registro = str(registro.get("proprietario", "")).strip().lower()
-            if owner_registro == owner_busca:
-                resultados.append(registro)
-
-        return resultados  # retorna lista de oportunidades do proprietário
-
+        return [r for nome_aba in abas_da_tabela("oportunidades")
+                for r in select(nome_aba, where={"proprietario": proprietario})]
     except Exception as e:
         print(f"Erro ao buscar oportunidades do proprietário: {e}")
         return []
 
-def listar_opp_por_owner_paginado(proprietario, pagina=1, limite=10):
+# Colunas exibidas na listagem de oportunidades (minhasOportunidades.html)
+COLUNAS_LISTA_OPP = ["id", "codigo", "nome", "email", "descricao", "potencia", "valor",
+                     "proprietario", "datacad", "estado", "link"]
+
+def pagina_opp_por_owner(proprietario, pagina=1, limite=10):
     """
-    Lista oportunidades paginadas. 
-    Importante: Esta função já retorna o 'id' no dicionário 'registro',
-    pois 'cabecalho' contém 'id'. Nenhuma mudança necessária aqui.
+    Página de oportunidades do proprietário, lida sob demanda (PaginaStream).
+    Só as linhas da página pedida e as colunas da listagem são baixadas:
+    o mapa proprietário -> linhas diz quais linhas pertencem à página.
+    As arquivadas vêm depois das da aba principal; as abas de arquivo só
+    são consultadas quando a página passa do fim da aba principal.
     """
-    aba = get_aba("oportunidades")
-    valores = aba.get_all_values()
-
-    # Verifica se há dados suficientes
-    if not valores or len(valores) < 2:
-        return []
-
-    cabecalho = valores[0]
-    dados = valores[1:]
-
-    proprietario = proprietario.strip().lower()
+    def planejar():
+        partes = []
+        total = 0
+        pular = (pagina - 1) * limite
+        for nome_aba in abas_da_tabela("oportunidades"):
+            if total >= limite:
+                break
+            linhas = linhas_do_proprietario(nome_aba, proprietario)
 
-    # Filtra as linhas do proprietário atual
-    dados_filtrados = []
-    for linha in dados:
-        if len(linha) < len(cabecalho):
-            continue
+            # Paginação
+            linhas_pagina = linhas[pular:pular + limite - total]
+            pular = max(0, pular - len(linhas))
+            if linhas_pagina:
+                partes.append((nome_aba, linhas_pagina))
+                total += len(linhas_pagina)
+        return partes, (pagina + 1 if total == limite else None)
 
-        registro = dict(zip(cabecalho, linha))
-        dono = registro.get("proprietario", "").strip().lower()
+    return PaginaStream(planejar, columns=COLUNAS_LISTA_OPP, where={"proprietario": proprietario})
 
-        if dono == proprietario:
-            dados_filtrados.append(registro)
-
-    # Paginação
-    inicio = (pagina - 1) * limite
-    fim = inicio + limite
-    return dados_filtrados[inicio:fim]
+def listar_opp_por_owner_paginado(proprietario, pagina=1, limite=10):
+    """Lista oportunidades paginadas (ver pagina_opp_por_owner)."""
+    return list(pagina_opp_por_owner(proprietario, pagina, limite))
 
 def ajustar_escala(valor,escala):
         """Converte valor em centavos (int) para valor em Reais (float)."""
@@ -279,6 +1614,9 @@ def ajustar_escala(valor,escala):
             # Se não for numérico, retorna o valor original
             return valor
 
+# Cenário de financiamento (financiamento.cenario), gravado no fim da linha
+COLUNAS_FINANCIAMENTO = ["finSistema", "finPrazo", "finTaxa", "finEntrada", "finParcela", "finTotal"]
+
 def salvar_oportunidade(dados_opp):
     """
     Salva uma nova oportunidade a partir de um dicionário de dados.
@@ -324,10 +1662,38 @@ def salvar_oportunidade(dados_opp):
     dados_opp.get("preco"),
     dados_opp.get("juros"),
     valorParcelaFormatado,
-    dados_opp.get("valorJuros")
+    dados_opp.get("valorJuros"),
+    # Cenário de financiamento escolhido no simulador (vazio se nenhum)
+    dados_opp.get("finSistema", ""),
+    dados_opp.get("finPrazo", ""),
+    dados_opp.get("finTaxa", ""),
+    dados_opp.get("finEntrada", ""),
+    dados_opp.get("finParcela", ""),
+    dados_opp.get("finTotal", "")
 ]
+    # As colunas do cenário são as últimas da linha: só são gravadas se o
+    # cabeçalho da planilha tem essas colunas nessa posição (senão os valores
+    # cairiam em outras colunas ou fora do cabeçalho)
+    posicao = len(linha_para_salvar) - len(COLUNAS_FINANCIAMENTO)
+    try:
+        cabecalho = [(h or "").strip().lower() for h in cabecalho_aba("oportunidades")]
+    except Exception as e:
+        print(f"Erro ao ler o cabeçalho de oportunidades: {e}")
+        cabecalho = []
+    if cabecalho[posicao:posicao + len(COLUNAS_FINANCIAMENTO)] != [c.lower() for c in COLUNAS_FINANCIAMENTO]:
+        if any(dados_opp.get(c) not in (None, "") for c in COLUNAS_FINANCIAMENTO):
+            print(f"Erro: a aba 'oportunidades' não tem as colunas {', '.join(COLUNAS_FINANCIAMENTO)} "
+                  f"a partir da coluna {coluna_letra(posicao)}; cenário de financiamento não gravado.")
+        linha_para_salvar = linha_para_salvar[:posicao]
 
-    get_aba("oportunidades").append_row(linha_para_salvar)
+    def ao_gravar(resposta):
+        marcar_alteracao("oportunidades")
+        registrar_append("oportunidades", resposta, dados_opp.get("proprietario"))
+        painel.registrar_oportunidade(normalizar_oportunidade(
+            {campo: dados_opp.get(campo) for campo in painel.COLUNAS}
+        ))
+
+    anexar_linha("oportunidades", linha_para_salvar, ao_gravar)
 # -----------------------------------------------------------------
 
 # -----------------------------------------------------------------
@@ -340,8 +1706,7 @@ def atualizar_oportunidade_anexo(email, proprietario, link_arquivo, datacad=None
     Substituída por 'atualizar_oportunidade_anexo_por_id'.
     """
     try:
-        aba = get_aba("oportunidades")
-        valores = aba.get_all_values()
+        valores = ler_valores("oportunidades")
 
         if not valores or len(valores) < 2:
             print("Nenhum registro encontrado para atualização.")
@@ -369,8 +1734,12 @@ def atualizar_oportunidade_anexo(email, proprietario, link_arquivo, datacad=None
                 and owner_registro == owner_busca
                 and (not data_busca or data_registro == data_busca)
             ):
-                aba.update_cell(i, col_link, link_arquivo)
-                aba.update_cell(i, col_estado, "Em análise")
+                def ao_gravar():
+                    marcar_alteracao("oportunidades")
+                    painel.mudar_estado(normalizar_oportunidade(registro), "Em análise")
+
+                atualizar_celulas("oportunidades", i, {col_link: link_arquivo, col_estado: "Em análise"},
+                                  ao_gravar=ao_gravar)
                 print(f"Oportunidade atualizada na linha {i}.")
                 return True
 
@@ -390,15 +1759,20 @@ def atualizar_oportunidade_anexo_por_id(id_opp, link_arquivo):
     Usado no fluxo 'Continuar Oportunidade'.
     """
     try:
-        aba = get_aba("oportunidades")
-        valores = aba.get_all_values()
+        # Ids novos (ULID): localiza a linha por busca binária, sem baixar a aba
+        linha_encontrada, registro = buscar_registro_por_id("oportunidades", id_opp)
+        if linha_encontrada:
+            cabecalho = [h.strip().lower() for h in cabecalho_aba("oportunidades")]
+            linhas = []
+        else:
+            valores = ler_valores("oportunidades")
 
-        if not valores or len(valores) < 2:
-            print("Nenhum registro encontrado para atualização.")
-            return False
+            if not valores or len(valores) < 2:
+                print("Nenhum registro encontrado para atualização.")
+                return False
 
-        cabecalho = [h.strip().lower() for h in valores[0]]
-        linhas = valores[1:]
+            cabecalho = [h.strip().lower() for h in valores[0]]
+            linhas = valores[1:]
 
         # Localiza índices das colunas (0-indexado para listas)
         try:
@@ -410,6 +1784,23 @@ def atualizar_oportunidade_anexo_por_id(id_opp, link_arquivo):
             print(f"Erro: Coluna não encontrada no cabeçalho - {e}")
             return False
 
+        def gravar(i, anterior):
+            def ao_gravar():
+                marcar_alteracao("oportunidades")
+                painel.mudar_estado(normalizar_oportunidade(anterior), "Em análise")
+
+            # Colunas são 1-indexadas: adiciona +1 aos índices 0-indexados
+            atualizar_celulas("oportunidades", i, {
+                col_documento_idx + 1: link_arquivo.get("link_documento"),
+                col_comprovante_idx + 1: link_arquivo.get("link_conta_energia"),
+                col_estado_idx + 1: "Em análise",
+            }, ao_gravar=ao_gravar)
+            print(f"Oportunidade (ID: {id_opp}) atualizada na linha {i}.")
+            return True
+
+        if linha_encontrada:
+            return gravar(linha_encontrada, {(k or "").strip().lower(): v for k, v in registro.items()})
+
         id_busca = str(id_opp).strip()
 
         # Itera pelas linhas de dados (índice 'i' começa em 2 para gspread)
@@ -420,13 +1811,7 @@ def atualizar_oportunidade_anexo_por_id(id_opp, link_arquivo):
             id_registro = linha[col_id_idx].strip() # Pega o ID da linha
 
             if id_registro == id_busca:
-                # Achou! Atualiza as colunas (colunas são 1-indexadas no update_cell)
-                # Adiciona +1 aos índices 0-indexados
-                aba.update_cell(i, col_documento_idx + 1, link_arquivo.get("link_documento"))
-                aba.update_cell(i, col_comprovante_idx + 1, link_arquivo.get("link_conta_energia"))
-                aba.update_cell(i, col_estado_idx + 1, "Em análise")
-                print(f"Oportunidade (ID: {id_opp}) atualizada na linha {i}.")
-                return True
+                return gravar(i, dict(zip(cabecalho, linha)))
 
         print(f"Nenhuma oportunidade com ID {id_opp} encontrada para atualizar.")
         return False
@@ -436,12 +1821,16 @@ def atualizar_oportunidade_anexo_por_id(id_opp, link_arquivo):
         return False
 # -----------------------------------------------------------------
 
-def enviar_arquivo_drive(caminho_local, nome_arquivo, pasta_id=None):
-    service = build("drive", "v3", credentials=creds)
+def criar_arquivo_drive(caminho_local, nome_arquivo, pasta_id=None, propriedades=None):
+    """Sobe o arquivo, deixa visível via link e retorna o id no Drive."""
+    service = get_drive()
 
     metadata = {"name": nome_arquivo}
     if pasta_id:
         metadata["parents"] = [pasta_id]
+    if propriedades:
+        # appProperties: só visíveis para este app, pesquisáveis em files.list
+        metadata["appProperties"] = propriedades
 
     media = MediaFileUpload(caminho_local, resumable=True)
     file = service.files().create(
@@ -458,12 +1847,43 @@ def enviar_arquivo_drive(caminho_local, nome_arquivo, pasta_id=None):
         body={"type": "anyone", "role": "reader"},
     ).execute()
 
+    return file_id
+
+def link_arquivo_drive(file_id):
     return f"https://drive.google.com/file/d/{file_id}/view"
 
+def enviar_arquivo_drive(caminho_local, nome_arquivo, pasta_id=None):
+    return link_arquivo_drive(criar_arquivo_drive(caminho_local, nome_arquivo, pasta_id))
+
+def buscar_arquivo_drive(propriedade, valor, pasta_id=None):
+    """Id de um arquivo não excluído com appProperties[propriedade] == valor (None se não houver)."""
+    consulta = f"appProperties has {{ key='{propriedade}' and value='{valor}' }} and trashed = false"
+    if pasta_id:
+        consulta += f" and '{pasta_id}' in parents"
+    try:
+        arquivos = get_drive().files().list(q=consulta, fields="files(id)", pageSize=1).execute().get("files", [])
+    except Exception as e:
+        print(f"Erro ao consultar arquivo no Drive: {e}")
+        return None
+    return arquivos[0]["id"] if arquivos else None
+
+def arquivo_drive_existe(file_id):
+    """True se o arquivo ainda está no Drive e fora da lixeira."""
+    try:
+        meta = get_drive().files().get(fileId=file_id, fields="id,trashed").execute()
+        return not meta.get("trashed")
+    except Exception as e:
+        print(f"Erro ao conferir arquivo no Drive ({file_id}): {e}")
+        return False
+
 def listar_user_por_id(user_id):
     try:
-        aba = get_aba("usuarios")
-        todos = aba.get_all_records()
+        _, u = buscar_registro_por_id("usuarios", user_id)
+        if u:
+            u.pop("senha", None)
+            return u
+
+        todos = ler_registros("usuarios")
 
         for u in todos:
             if str(u.get("id")) == str(user_id):
@@ -80,10 +80,77 @@ document.addEventListener("DOMContentLoaded", function () {
             buscarCep(cepInput.value);
         });
     }
+
+    // Anexos: fotos são reduzidas no navegador antes do envio (inputs com data-reduzir-imagem)
+    forms.forEach(function (form) {
+        var inputs = form.querySelectorAll('input[type=file][data-reduzir-imagem]');
+        if (!inputs.length) return;
+        form.addEventListener('submit', function (event) {
+            if (form.dataset.reduzido === '1') return;
+            event.preventDefault();
+            mostrarLoading('Preparando anexos...');
+            Promise.all(Array.prototype.map.call(inputs, reduzirInput)).then(function () {
+                form.dataset.reduzido = '1';
+                mostrarLoading('Enviando...');
+                // submit() não dispara o evento de novo nem repete a validação (já feita)
+                form.submit();
+            });
+        });
+    });
 });
 
 /**
- * Busca CEP na API ViaCEP e preenche campos de endereço.
+ * Redução de fotos antes do upload: lado maior limitado a REDUCAO_LADO_MAXIMO,
+ * JPEG recomprimido e sem EXIF (o canvas não copia metadados; a rotação da
+ * câmera é aplicada antes). Em qualquer falha o arquivo original é enviado.
+ */
+var REDUCAO_LADO_MAXIMO = 2000;
+var REDUCAO_QUALIDADE = 0.8;
+var REDUCAO_TAMANHO_MINIMO = 300 * 1024; // fotos menores já são leves
+
+function reduzirImagem(arquivo) {
+    if (!/^image\/(jpeg|png|webp)$/.test(arquivo.type) || arquivo.size < REDUCAO_TAMANHO_MINIMO ||
+        !window.createImageBitmap) {
+        return Promise.resolve(arquivo);
+    }
+    return createImageBitmap(arquivo, { imageOrientation: 'from-image' }).then(function (bitmap) {
+        var escala = Math.min(1, REDUCAO_LADO_MAXIMO / Math.max(bitmap.width, bitmap.height));
+        var canvas = document.createElement('canvas');
+        canvas.width = Math.round(bitmap.width * escala);
+        canvas.height = Math.round(bitmap.height * escala);
+        var ctx = canvas.getContext('2d');
+        // PNG com transparência: fundo branco, como no papel
+        ctx.fillStyle = '#fff';
+        ctx.fillRect(0, 0, canvas.width, canvas.height);
+        ctx.drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+        if (bitmap.close) bitmap.close();
+        return new Promise(function (resolve) {
+            canvas.toBlob(function (blob) {
+                if (!blob || blob.size >= arquivo.size) return resolve(arquivo);
+                var nome = arquivo.name.replace(/\.[^.]+$/, '') + '.jpg';
+                resolve(new File([blob], nome, { type: 'image/jpeg', lastModified: Date.now() }));
+            }, 'image/jpeg', REDUCAO_QUALIDADE);
+        });
+    }).catch(function () {
+        return arquivo;
+    });
+}
+
+function reduzirInput(input) {
+    if (!input.files || !input.files.length || !window.DataTransfer) return Promise.resolve();
+    return Promise.all(Array.prototype.map.call(input.files, reduzirImagem)).then(function (arquivos) {
+        try {
+            var selecao = new DataTransfer();
+            arquivos.forEach(function (arquivo) { selecao.items.add(arquivo); });
+            input.files = selecao.files;
+        } catch (e) {
+            // Navegador sem suporte a trocar os arquivos do input: segue com os originais
+        }
+    });
+}
+
+/**
+ * Busca CEP no portal (/api/cep, com cache local) e preenche campos de endereço.
  * Mostra mensagens inline em #cepError quando há erro.
  */
 function buscarCep(cepRaw) {
@@ -107,9 +174,9 @@ function buscarCep(cepRaw) {
         return;
     }
 
-    var url = 'https://viacep.com.br/ws/' + cep + '/json/';
-    fetch(url).then(function (resp) {
-        if (!resp.ok) throw new Error('Network response was not ok');
+    fetch('/api/cep/' + cep).then(function (resp) {
+        // 404 traz { erro: true } (CEP não encontrado); demais falhas vão para o catch
+        if (!resp.ok && resp.status !== 404) throw new Error('Network response was not ok');
         return resp.json();
     }).then(function (data) {
         if (data.erro) {
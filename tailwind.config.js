@@ -0,0 +1,18 @@
+// tailwind.config.js — usado pelo build (bin/build_css.sh).
+// O tema vem de static/js/tailwind-config.js, o mesmo arquivo que configura o
+// Tailwind da CDN, para que só exista uma fonte de verdade.
+const fs = require("fs");
+const path = require("path");
+const vm = require("vm");
+
+const sandbox = { window: {} };
+vm.runInNewContext(
+  fs.readFileSync(path.join(__dirname, "static/js/tailwind-config.js"), "utf8"),
+  sandbox
+);
+
+module.exports = {
+  ...sandbox.window.tailwind.config,
+  content: ["./templates/**/*.html", "./static/js/**/*.js"],
+  plugins: [require("@tailwindcss/forms"), require("@tailwindcss/typography")],
+};
@@ -0,0 +1,46 @@
+import math
+
+import pytest
+
+import financiamento
+
+
+def formulario(prazo=36, taxa=1.49, entrada=20, sistema="price"):
+    return {"fin_prazo": str(prazo), "fin_taxa": str(taxa), "fin_entrada": str(entrada), "fin_sistema": sistema}
+
+
+def test_cenario_do_formulario_recalcula_sobre_o_preco():
+    escolhido = financiamento.cenario_do_formulario(28000.0, formulario())
+    assert escolhido == financiamento.cenario(28000.0, 36, 1.49, 20, "price")
+    assert escolhido["entrada"] == 5600.0
+    # Price: parcela constante sobre o valor financiado
+    i = 1.49 / 100
+    esperada = 22400.0 * i / (1 - (1 + i) ** -36)
+    assert escolhido["parcela"] == pytest.approx(esperada, abs=0.01)
+
+
+def test_cenario_do_formulario_sac():
+    escolhido = financiamento.cenario_do_formulario(28000, formulario(sistema="sac"))
+    assert escolhido["sistema"] == "sac"
+    assert escolhido["parcela"] == pytest.approx(22400 / 36 + 22400 * 0.0149, abs=0.01)
+
+
+@pytest.mark.parametrize("valor, campos", [
+    (None, formulario()),                          # preço do produto não é número
+    (28000.0, formulario(prazo=37)),               # prazo fora do padrão
+    (28000.0, formulario(taxa=0.5)),               # taxa fora do padrão
+    (28000.0, formulario(entrada=15)),             # entrada fora do padrão
+    (28000.0, formulario(sistema="alemao")),       # sistema desconhecido
+    (28000.0, {"fin_prazo": "x"}),                 # campo não numérico
+    (28000.0, {}),                                 # nenhuma escolha
+    (float("nan"), formulario()),                  # valor não finito
+])
+def test_cenario_do_formulario_rejeita(valor, campos):
+    assert financiamento.cenario_do_formulario(valor, campos) is None
+
+
+def test_validar_rejeita_nao_finitos():
+    with pytest.raises(financiamento.ErroSimulacao):
+        financiamento.simular(math.inf)
+    with pytest.raises(financiamento.ErroSimulacao):
+        financiamento.simular(28000.0, taxas=[float("nan")])